@@ -0,0 +1,274 @@
+# -*- coding: utf-8 -*-
+
+##########################################################
+#
+#        Cloud Radar System (CRS) Curtain Animation
+#
+#        Description: This script sweeps a window of fixed
+#        width along a CRS flight and writes one frame per
+#        step to an animated GIF or a sequence of PNG files.
+#        The figure, its two panels and colorbars are built
+#        once; each frame only pools the rays of its window
+#        into the pixel columns of the panels, replaces the
+#        image data and moves the time axis. The static part
+#        of the figure (colorbars, labels, title) is rendered
+#        once and only the two panels are redrawn over it.
+#
+#        Usage: python CRS_Animation.py DATA_DIR --campaign impacts
+#                   --date 2020-01-18 [--width 600] [--step 60]
+#                   [--fps 10] [--out flight.gif | --out frames/]
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+##########################################################
+
+#Import Python packages and modules
+import argparse
+import os,sys
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+import matplotlib.dates as mdates
+import matplotlib.transforms as mtransforms
+from datetime import datetime, timedelta
+from matplotlib.colors import BoundaryNorm
+from PIL import Image, GifImagePlugin
+
+#Import functions from the CRS recipe files
+from CRS_Recipe_Functions import CRSCurtain, radarCmaps, time_index_range
+from CRS_Catalog import CRSCatalog
+from CRS_Chunked import ColumnReducer
+from CRS_Flight import CRSFlight
+from Time_Decoding import to_datenum, EPOCH_UNITS
+
+EPOCH = datetime(1970,1,1)
+
+VNAMES = {'Ref':"Reflectivity",'DopV':'Doppler Vel.'}
+UNITS  = {'Ref':'[dBZ]',       'DopV':'[m/s]'}
+LEVS   = {'Ref':np.arange(-20,40,2), 'DopV':np.arange(-20,20,2)} #<--Same color scales as plot_CRS2D
+STREAM_GIF = hasattr(GifImagePlugin,'getheader') and hasattr(GifImagePlugin,'getdata') #<--frame-by-frame GIF writing
+
+class CurtainAnimator:
+    """
+    Figure of plot_CRS2D layout that is built once and redrawn for any
+    time window of a CRS source
+    source: CRSCurtain already in memory, or an object with a
+            read(start,end) method returning a CRSCurtain (CRSFlight,
+            CRSPyramid) from which each window is read when it is drawn
+    pool: 'max', 'mean' or 'physical' pooling of the rays into pixel columns
+    """
+    def __init__(self,source,reverseZ=True,pool='max',dpi=100):
+        self.source,self.pool = source,pool
+        first = self.extent()[0]
+        self.range = rng = self.read(first,first).range #<--range gates of the first ray
+
+        self.fig,axs = plt.subplots(nrows=2,ncols=1,figsize=(12,6),dpi=dpi)
+        self.fig.tight_layout()
+        self.fig.subplots_adjust(top=0.9,bottom=0.1,hspace=0.2)
+        self.ncols = max(2,int(axs[0].get_window_extent().width)) #<--one column per pixel
+        self.title = self.fig.suptitle('',fontsize=14,x=0.415)
+
+        self.axes,self.images = axs,{}
+        empty = np.ma.masked_all((len(rng),self.ncols),dtype=np.float32)
+        for iv,vnm in enumerate(VNAMES):
+            ax,lev,cmp = axs[iv],LEVS[vnm],radarCmaps()[vnm]
+            im = ax.imshow(empty,cmap=cmp,norm=BoundaryNorm(lev,cmp.N),aspect='auto',origin='lower',
+                           interpolation='nearest',extent=(0,1,float(rng[0]),float(rng[-1])))
+            self.images[vnm] = im
+            ax.xaxis_date()
+            ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S')) #<--Format times on x-axis to hh:mm:ss
+            ax.set_ylabel('Range from Radar [km]')
+            ax.set_xlabel('Time (UTC)' if iv==1 else '')
+            if(reverseZ):
+                ax.set_ylim(ymin=20,ymax=5)
+                ytpos=4.5
+            else:
+                ax.set_ylim(ymin=5,ymax=20)
+                ytpos=20.6
+            #Panel name centred above the axes whatever the time window
+            ax.text(0.5,ytpos,VNAMES[vnm],{'fontsize':13,'ha':'center'},
+                    transform=mtransforms.blended_transform_factory(ax.transAxes,ax.transData))
+            clb = self.fig.colorbar(im,ax=ax)
+            clb.set_label(UNITS[vnm])
+            ax.set_animated(True) #<--left out of the background, drawn every frame
+        self.width,self.background = None,None
+
+    def extent(self):
+        """Return datetime objects of the first and last ray of the source"""
+        return self.source.start(),self.source.end()
+
+    def read(self,start,end):
+        """
+        Read the window [start,end] (datetime objects) of the source
+        Return CRSCurtain
+        """
+        if(isinstance(self.source,CRSCurtain)):
+            cur = self.source
+            i0,i1 = time_index_range(cur.time,start,end)
+            return CRSCurtain(cur.time[i0:i1],cur.range,cur.Ref[i0:i1],cur.DopV[i0:i1],cur.campaign,cur.fname)
+        if(isinstance(self.source,CRSFlight)):
+            #The time vectors of the flight are read once; every frame reads only its rays, by index
+            i0,i1 = time_index_range(self.source.time,start,end)
+            return self.source.read_index(i0,i1)
+        return self.source.read(start,end)
+
+    def draw(self,start,end):
+        """
+        Show the window [start,end] (datetime objects): pool its rays into
+        the pixel columns, replace the image data and move the time axis
+        Return RGBA array (height,width,4) of the rendered figure
+        """
+        tlo,thi = (start-EPOCH).total_seconds(),(end-EPOCH).total_seconds()
+        cur = self.read(start,end)
+        if(0<len(cur)<self.ncols):
+            #Fewer rays than pixel columns: one column per ray, as a full plot, not stripes of empty columns
+            cols,clo,chi = cur,cur.time[0],cur.time[-1]
+            step = (chi-clo)/(len(cur)-1) if len(cur)>1 else thi-tlo #<--a single ray fills the window
+        else:
+            reducer = ColumnReducer(tlo,thi,self.ncols,self.pool)
+            reducer.add(cur)
+            cols,clo,chi = reducer.result(),tlo,thi
+            step = (thi-tlo)/(self.ncols-1)
+        half = step/2/86400. #<--half a column in days
+        c0,c1 = to_datenum([clo,chi],EPOCH_UNITS)
+        x0,x1 = mdates.date2num(start),mdates.date2num(end)
+        for vnm,ax in zip(VNAMES,self.axes):
+            im = self.images[vnm]
+            if(len(cols)):
+                im.set_data(np.ma.masked_outside(cols[vnm].T,LEVS[vnm][0],LEVS[vnm][-1]))
+            else:
+                im.set_data(np.ma.masked_all((len(self.range),self.ncols),dtype=np.float32))
+            im.set_extent((c0-half,c1+half,float(self.range[0]),float(self.range[-1])))
+            ax.set_xlim(x0,x1)
+            if(self.width!=thi-tlo):
+                #Tick spacing follows the window width; set once for a fixed-width sweep
+                ax.xaxis.set_major_locator(mdates.SecondLocator(interval=max(1,int((thi-tlo)/6))))
+        self.width = thi-tlo
+        title = 'CRS Reflectivity and Doppler Velocity ' + start.strftime("%B %d, %Y")
+        if(start.date()!=end.date()): title += ' - ' + end.strftime("%B %d, %Y")
+        canvas = self.fig.canvas
+        if(self.background is None or title!=self.title.get_text()):
+            #Render everything but the panels once, and again only when the title changes
+            self.title.set_text(title)
+            canvas.draw()
+            self.background = canvas.copy_from_bbox(self.fig.bbox)
+        canvas.restore_region(self.background)
+        for ax in self.axes: self.fig.draw_artist(ax)
+        return np.asarray(canvas.buffer_rgba())
+
+    def frames(self,width,step,start=None,end=None):
+        """
+        Sweep a window of width (timedelta) in steps of step (timedelta)
+        from start to end (datetime objects; default the whole source)
+        Yield (window start, RGBA array) of every frame
+        """
+        first,last = self.extent()
+        start,end = start or first,end or last
+        t = start
+        while True:
+            yield t,self.draw(t,t+width)
+            if(t+width>=end): break
+            t += step
+
+    def close(self):
+        plt.close(self.fig)
+
+def save_frames(frames,out,fps=10):
+    """
+    Write the RGBA frames yielded by CurtainAnimator.frames
+    out: file name ending in '.gif' for an animated GIF, otherwise a
+         directory that receives one PNG file per frame
+    Frames of a GIF are reduced to the palette of the first frame and
+    appended to the file as they are produced, so one frame is held at a time
+    Return number of frames written
+    """
+    if(os.path.dirname(out)): os.makedirs(os.path.dirname(out),exist_ok=True)
+    if(out.lower().endswith('.gif')):
+        palette = []
+        def paletted():
+            for t,rgba in frames:
+                im = Image.fromarray(rgba).convert('RGB')
+                if(not palette): palette.append(im.quantize(colors=256))
+                yield im.quantize(palette=palette[0],dither=Image.Dither.NONE)
+        return write_gif(out,paletted(),int(1000/fps))
+    os.makedirs(out,exist_ok=True)
+    n = 0
+    for t,rgba in frames:
+        Image.fromarray(rgba).save(os.path.join(out,'frame_{:05d}_{}.png'.format(n,t.strftime("%Y%m%dT%H%M%S"))))
+        n += 1
+    return n
+
+def write_gif(out,images,duration):
+    """
+    Write an animated GIF that loops forever frame by frame, so it is not
+    held in memory (PIL's save(append_images=...) collects every frame
+    first); frames are encoded with the GIF helpers of Pillow (getheader and
+    getdata, part of Pillow since version 3), and where a Pillow release
+    lacks them with save(append_images=...) instead
+    images: iterable of 'P' mode images sharing the palette of the first
+    duration: display time of every frame in milliseconds
+    Return number of frames written; no file is written without frames
+    """
+    images = iter(images)
+    first = next(images,None)
+    if(first is None): return 0
+    n = 1
+    if(not STREAM_GIF):
+        def counted():
+            nonlocal n
+            for im in images:
+                n += 1
+                yield im
+        first.save(out,save_all=True,append_images=counted(),duration=duration,loop=0)
+        return n
+    with open(out,'wb') as f:
+        for block in GifImagePlugin.getheader(first,info={'loop':0,'duration':duration})[0]: f.write(block)
+        for block in GifImagePlugin.getdata(first,duration=duration): f.write(block)
+        for im in images:
+            for block in GifImagePlugin.getdata(im,duration=duration): f.write(block)
+            n += 1
+        f.write(b';') #<--GIF trailer
+    return n
+
+def animate(source,out,width=timedelta(minutes=10),step=timedelta(minutes=1),start=None,end=None,
+            fps=10,reverseZ=True,pool='max',dpi=100):
+    """
+    Sweep a window of width along source in steps of step and write the
+    frames to out (see save_frames)
+    source: CRSCurtain, CRSFlight or CRSPyramid
+    Return number of frames written
+    """
+    anim = CurtainAnimator(source,reverseZ=reverseZ,pool=pool,dpi=dpi)
+    try:
+        return save_frames(anim.frames(width,step,start,end),out,fps)
+    finally:
+        anim.close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Animate a window sweeping along a CRS flight.')
+    parser.add_argument('data_dir',help='directory searched recursively for CRS files')
+    parser.add_argument('--campaign',required=True,choices=['impacts','goesrplt','olympex','iphex'])
+    parser.add_argument('--date',required=True,help='flight date in yyyy-mm-dd')
+    parser.add_argument('--width',type=float,default=600,help='window width in seconds (default: 600)')
+    parser.add_argument('--step',type=float,default=60,help='window step in seconds (default: 60)')
+    parser.add_argument('--fps',type=float,default=10,help='frames per second of the GIF (default: 10)')
+    parser.add_argument('--dpi',type=int,default=100,help='frame resolution (default: 100)')
+    parser.add_argument('--pool',default='max',choices=['max','mean','physical'])
+    parser.add_argument('--out',help='GIF file or PNG frame directory (default: <campaign>_CRS_<date>.gif)')
+    args = parser.parse_args(argv)
+
+    with CRSCatalog(args.data_dir) as catalog:
+        if(len(catalog.refresh().granules(args.campaign,args.date))==0):
+            print("%%No {} files found for {}".format(args.campaign,args.date))
+            return 1
+        flight = CRSFlight.from_catalog(catalog,args.campaign,args.date)
+    out = args.out or '{}_CRS_{}.gif'.format(args.campaign,args.date.replace('-',''))
+    n = animate(flight,out,timedelta(seconds=args.width),timedelta(seconds=args.step),
+                fps=args.fps,pool=args.pool,dpi=args.dpi)
+    print("{} frames written to {}".format(n,out))
+    return 0
+
+if __name__ == "__main__":
+    matplotlib.use('Agg') #<--Render without a display
+    sys.exit(main())
@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+
+########################################################################################################
+#
+#        Cloud Radar System (CRS) Batch Quick View Rendering
+#
+#        Description: Non-interactive counterpart of CRS_Recipe_Code.py. This script finds every
+#        IMPACTS, GOES-R PLT, OLYMPEX and IPHEX CRS file under a data directory that matches the
+#        requested campaigns, flight dates and time windows, and renders the reflectivity and
+#        Doppler velocity time-height plot of each one to a PNG file. Files are rendered in
+#        parallel with one worker process per CPU core, and the time taken and any failure are
+#        reported for every file. Within a worker the PNG files are written by a background
+#        writer, so the next window is read while the previous one is encoded; --fast-png keeps
+#        the whole figure instead of cropping it to its tight bounding box. With --export the
+#        rays of every window are also written to a chunked, compressed netCDF-4 file (see CRS_Export.py).
+#        --panels selects the variables plotted, one panel each (spectrum width SpW and LDR where present).
+#
+#        Usage: python CRS_Batch_Render.py DATA_DIR [--campaign impacts olympex]
+#                   [--date 2020-01-18] [--window 2020-01-18T12:00:00 2020-01-18T13:00:00]
+#                   [--outdir images/] [--workers 8] [--max-mem 1G] [--fast-png] [--export]
+#                   [--panels Ref DopV SpW LDR]
+#                   [--config batch.json] [--report report.json] [--profile trace.jsonl]
+#
+#        The same options can be given as keys of a JSON config file (data_dir, campaigns, dates,
+#        windows, outdir, workers, dpi, max_mem, fast_png, export, panels, report, profile); options on the command line take precedence.
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+########################################################################################################
+
+#Import Python packages and modules
+import argparse
+import json
+import os,sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+
+import matplotlib
+matplotlib.use('Agg') #<--Render without a display; must be set before pyplot is imported
+import matplotlib.pyplot as plt
+
+#Import functions from CRS_Recipe_Functions.py file
+from CRS_Recipe_Functions import CRS_PATTERNS, read_CRS_window, plot_curtain, curtain_image_name, FigureWriter, close_CRS_nc
+from CRS_Recipe_Functions import PANELS, OPTIONAL_VARIABLES
+from CRS_Catalog import CRSCatalog
+from CRS_Chunked import reduce_CRS, file_blocks
+from CRS_Export import CurtainStore, export_curtain
+from CRS_Profile import stage, enable
+
+FIG_WIDTH = 12 #<--Width of the plot_CRS2D figure in inches
+
+def find_files(dataDir,campaigns,dates=None):
+    """
+    Find the CRS files of the selected campaigns under dataDir from the
+    granule catalog (refreshed for new or changed files first)
+    dates: list of flight dates in 'yyyy-mm-dd'; None selects every flight
+    Return sorted list of (file path, campaign)
+    """
+    found = []
+    with CRSCatalog(dataDir) as catalog:
+        catalog.refresh()
+        for campaign in campaigns:
+            for fdate in (dates or [None]):
+                found.extend((os.path.normpath(g['path']),campaign) for g in catalog.granules(campaign,fdate))
+    return sorted(set(found))
+
+def render_file(task):
+    """
+    Render the time windows of one CRS file to PNG images
+    task: (file path, campaign, windows, output directory, dpi, max_mem, fast_png, export, panels)
+          where windows is a list of (start,end) pairs of datetime objects, or
+          [None] for the entire flight; with a max_mem budget (e.g. '1G') the file
+          is read in blocks that fit it and reduced to the image width while it is
+          read; fast_png keeps the whole figure uncropped; export also
+          writes the full-resolution rays of the window to a .nc4 file; panels lists
+          the variables to plot (None for the Reflectivity and Doppler velocity plot)
+    Images are handed to a background writer, so the next window is read and
+    plotted while the previous one is encoded and written
+    Return list of dictionaries describing the result of every window
+    """
+    fileCRS,campaign,windows,outdir,dpi,max_mem,fast_png,export,panels = task
+    extra = tuple(vnm for vnm in (panels or ()) if vnm in OPTIONAL_VARIABLES)
+    results,pending = [],[]
+    with FigureWriter(dpi=dpi,tight=not fast_png,workers=1) as writer:
+        for window in windows:
+            result = {'file':fileCRS,'campaign':campaign,
+                      'window':None if window is None else [w.isoformat() for w in window]}
+            results.append(result)
+            tic = time.perf_counter()
+            try:
+                start,end = (None,None) if window is None else window
+                with stage('window',file=fileCRS,window=result['window']):
+                    if(max_mem):
+                        cur = reduce_CRS(fileCRS,int(FIG_WIDTH*dpi),start,end,max_mem=max_mem,extra=extra)
+                    else:
+                        cur = read_CRS_window(fileCRS,campaign,start,end,extra=extra)
+                    if(len(cur)<2):
+                        result.update(status='empty',seconds=time.perf_counter()-tic)
+                        continue
+                    if(panels):
+                        #One worker process per file already; the panels are rasterized in this one
+                        fig = plot_curtain(cur,reverseZ=True,method='parallel',variables=panels,workers=0,show=False)
+                    else:
+                        fig = plot_curtain(cur,reverseZ=True,show=False)
+                image = os.path.join(outdir,curtain_image_name(cur))
+                result.update(image=image,rays=len(cur))
+                if(export):
+                    result['export'] = os.path.splitext(image)[0]+'.nc4'
+                    if(max_mem):
+                        #The plotted curtain is reduced; stream the rays of the window again
+                        with CurtainStore(result['export']) as store:
+                            for block in file_blocks(fileCRS,campaign,start,end,max_mem,extra=extra):
+                                store.append(block)
+                    else:
+                        export_curtain(cur,result['export'])
+                pending.append((result,tic,writer.submit(fig,image)))
+            except Exception as err:
+                plt.close('all')
+                result.update(status='failed',error='{}: {}'.format(type(err).__name__,err),
+                              traceback=traceback.format_exc(),seconds=time.perf_counter()-tic)
+    #The writer has finished: the time of a window runs until its image is written
+    for result,tic,future in pending:
+        try:
+            path,done = future.result()
+            result.update(status='ok',seconds=done-tic)
+        except Exception as err:
+            result.update(status='failed',error='{}: {}'.format(type(err).__name__,err),
+                          traceback=''.join(traceback.format_exception(type(err),err,err.__traceback__)),seconds=time.perf_counter()-tic)
+    close_CRS_nc(fileCRS) #<--a worker renders every file once
+    return results
+
+def parse_args(argv=None):
+    """
+    Merge the command line options with the optional JSON config file
+    Return dictionary of settings
+    """
+    parser = argparse.ArgumentParser(description='Render CRS quick views without user interaction.')
+    parser.add_argument('data_dir',nargs='?',help='directory searched recursively for CRS files')
+    parser.add_argument('--config',help='JSON file with any of the options below')
+    parser.add_argument('--campaign',dest='campaigns',nargs='+',choices=sorted(CRS_PATTERNS),
+                        help='campaign datasets to render (default: all)')
+    parser.add_argument('--date',dest='dates',nargs='+',help='flight dates in yyyy-mm-dd (default: all)')
+    parser.add_argument('--window',dest='windows',nargs=2,action='append',metavar=('START','END'),
+                        help='time window in yyyy-mm-ddThh:mm:ss; may be repeated (default: entire flight)')
+    parser.add_argument('--outdir',help='directory for the PNG images (default: current directory)')
+    parser.add_argument('--workers',type=int,help='number of worker processes (default: one per core)')
+    parser.add_argument('--dpi',type=int,help='image resolution (default: 100)')
+    parser.add_argument('--max-mem',dest='max_mem',help='memory budget per worker for reading, e.g. 1G '
+                        '(default: read the whole window at once)')
+    parser.add_argument('--fast-png',dest='fast_png',action='store_true',default=None,
+                        help="write the whole rendered figure, without cropping it to its tight bounding box")
+    parser.add_argument('--export',action='store_true',default=None,
+                        help='also write the rays of every window to a chunked, compressed netCDF-4 file')
+    parser.add_argument('--panels',nargs='+',choices=list(PANELS),
+                        help='variables to plot, one panel each; SpW and LDR are drawn where present')
+    parser.add_argument('--report',help='write the per-file results to this JSON file')
+    parser.add_argument('--profile',help='append a JSON-lines trace of every stage to this file')
+    args = vars(parser.parse_args(argv))
+
+    settings = {'campaigns':sorted(CRS_PATTERNS),'dates':None,'windows':None,
+                'outdir':'.','workers':os.cpu_count(),'dpi':100,'max_mem':None,'fast_png':False,'export':False,'panels':None,'report':None,'profile':None}
+    if(args['config']):
+        with open(args['config']) as f:
+            settings.update(json.load(f))
+    settings.update({k:v for k,v in args.items() if v is not None and k!='config'})
+    if(not settings.get('data_dir')): parser.error('a data directory is required')
+    return settings
+
+def main(argv=None):
+    settings = parse_args(argv)
+    os.makedirs(settings['outdir'],exist_ok=True)
+    if(settings['profile']): enable(settings['profile']) #<--inherited by the worker processes
+
+    windows = [None]
+    if(settings['windows']):
+        windows = [tuple(datetime.fromisoformat(t) for t in w) for w in settings['windows']]
+
+    files = find_files(settings['data_dir'],settings['campaigns'],settings['dates'])
+    tasks = [(f,c,windows,settings['outdir'],settings['dpi'],settings['max_mem'],settings['fast_png'],
+              settings['export'],settings['panels']) for f,c in files]
+    print("Rendering {} file(s), {} window(s) each with {} worker(s)".format(len(files),len(windows),settings['workers']))
+
+    results = []
+    tic = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=settings['workers']) as pool:
+        futures = [pool.submit(render_file,t) for t in tasks]
+        for future in as_completed(futures):
+            for r in future.result():
+                results.append(r)
+                print("{:7s} {:8.2f}s  {}".format(r['status'],r['seconds'],os.path.basename(r['file'])) +
+                      ("" if r['status']!='failed' else "\n        "+r['error']))
+
+    failed = [r for r in results if r['status']=='failed']
+    print("Done in {:.1f}s: {} rendered, {} empty, {} failed".format(
+        time.perf_counter()-tic,sum(r['status']=='ok' for r in results),
+        sum(r['status']=='empty' for r in results),len(failed)))
+
+    if(settings['report']):
+        with open(settings['report'],'w') as f:
+            json.dump(sorted(results,key=lambda r:r['file']),f,indent=1)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+
+########################################################################################################
+#
+#        Cloud Radar System (CRS) Recipe Benchmark
+#
+#        Description: This script measures the CRS recipe on synthetic granules so that changes to
+#        the code can be compared from one commit to the next. It writes IMPACTS (HDF5) and
+#        GOES-R PLT, OLYMPEX and IPHEX (netCDF-3) CRS files with the layout of the archived
+#        datasets and a configurable number of rays and range gates, then times every stage of
+#        the recipe separately:
+#
+#            catalog   build the granule catalog and select the flight
+#            open      open the file
+#            subset    select a time window with CRSsubset_impacts/CRSsubset/CRSsubset_goesrplt
+#            extract   read the reflectivity and Doppler velocity of the window
+#            plot      draw the time-height plot with plot_CRS2D
+#            save      write the plot to a PNG file
+#
+#        Each campaign is run in a fresh process so that its peak resident memory is its own.
+#        The wall time of every stage (best of --repeat runs) and the peak resident memory of the
+#        process at the end of the stage are written to a JSON file.
+#
+#        Usage: python CRS_Benchmark.py [--campaign impacts olympex] [--rays 20000] [--gates 600]
+#                   [--repeat 3] [--workdir bench/] [--output bench.json] [--compare old.json]
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+########################################################################################################
+
+#Import Python packages and modules
+import argparse
+import json
+import os,sys
+import platform
+import subprocess
+import time
+import numpy as np
+import h5py
+import xarray as xr
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from multiprocessing import get_context
+
+import matplotlib
+matplotlib.use('Agg') #<--Render without a display; must be set before pyplot is imported
+import matplotlib.pyplot as plt
+
+#Import functions from the CRS recipe files
+from CRS_Recipe_Functions import (CRSsubset_impacts, CRSsubset, CRSsubset_goesrplt, read_impacts_window,
+                                  nc_curtain, plot_curtain, curtain_image_name, open_CRS_nc)
+from CRS_Catalog import CRSCatalog, CRS_VARIABLES
+from CRS_Profile import peak_rss_mb
+
+EPOCH = datetime(1970,1,1)
+
+#Flight start of the synthetic granule of each campaign
+FLIGHT_START = {'impacts':datetime(2020,1,18,12),'goesrplt':datetime(2017,3,27,18),
+                'olympex':datetime(2015,12,3,15),'iphex':datetime(2014,5,12,15)}
+
+STAGES = ('catalog','open','subset','extract','plot','save')
+
+def synthetic_name(campaign,start,end):
+    """
+    File name of a synthetic granule covering start to end, following the
+    naming of the archived files of each campaign
+    """
+    if(campaign=='impacts'):
+        return 'IMPACTS_CRS_L1B_RevA_{:%Y%m%dT%H%M%S}_to_{:%Y%m%dT%H%M%S}.h5'.format(start,end)
+    if(campaign=='goesrplt'):
+        return 'GOESR_CRS_L1B_{:%Y%m%d}_v0.nc'.format(start)
+    if(campaign=='olympex'):
+        return 'olympex_CRS_{:%Y%m%d_%H%M%S}-{:%Y%m%d_%H%M%S}_v0.nc'.format(start,end)
+    return 'IPHEX_CRS_L1B_{:%Y%m%d_%H%M%S}-{:%Y%m%d_%H%M%S}_v0.nc'.format(start,end)
+
+def synthetic_fields(nray,ngate,seed=0):
+    """
+    Random reflectivity [dBZ] and Doppler velocity [m/s] of nray rays and ngate gates,
+    with a tenth of the values missing
+    """
+    rs = np.random.default_rng(seed)
+    ref = rs.uniform(-30,40,(nray,ngate)).astype(np.float32)
+    dop = rs.uniform(-10,10,(nray,ngate)).astype(np.float32)
+    ref[rs.random((nray,ngate))<0.1] = np.nan
+    return ref,dop
+
+def write_synthetic(campaign,outdir,nray,ngate,interval=0.5,chunk=256):
+    """
+    Write a synthetic CRS granule of campaign with nray rays every interval
+    seconds and ngate range gates from 0 to 25 km
+    chunk: rays per HDF5 chunk of the IMPACTS data arrays
+    Return path of the file
+    """
+    start = FLIGHT_START[campaign]
+    if(campaign!='impacts' and nray>1):
+        #Hours UTC of the netCDF-3 files count from the flight date: keep the flight within it
+        left = (start.replace(hour=23,minute=59,second=59)-start).total_seconds()
+        interval = min(interval,left/(nray-1))
+    end = start+timedelta(seconds=(nray-1)*interval)
+    path = os.path.join(outdir,synthetic_name(campaign,start,end))
+    secs = np.arange(nray)*interval
+    rng = np.linspace(0,25000,ngate)
+    ref,dop = synthetic_fields(nray,ngate)
+    if(campaign=='impacts'):
+        with h5py.File(path,'w') as f:
+            f['Time/Data/TimeUTC'] = (start-EPOCH).total_seconds()+secs
+            f['Products/Information/Range'] = rng
+            f.create_dataset('Products/Data/dBZe',data=ref,chunks=(min(chunk,nray),ngate))
+            f.create_dataset('Products/Data/Velocity_corrected',data=dop,chunks=(min(chunk,nray),ngate))
+    else:
+        tname,refname,dopname = CRS_VARIABLES[campaign]
+        hours = (start-start.replace(hour=0,minute=0,second=0)).total_seconds()/3600.+secs/3600.
+        ds = xr.Dataset({tname:(('time',),hours),'range':(('range',),rng.astype(np.float32)),
+                         refname:(('time','range'),ref),dopname:(('time','range'),dop)})
+        ds.to_netcdf(path,format='NETCDF3_64BIT')
+    return path
+
+@contextmanager
+def stage(timings,name):
+    """
+    Time the enclosed block and store its wall time and the peak resident
+    memory of the process at its end under timings[name]
+    """
+    tic = time.perf_counter()
+    yield
+    timings[name] = {'seconds':time.perf_counter()-tic,'peak_rss_mb':peak_rss_mb()}
+
+def run_case(task):
+    """
+    Run every stage of the recipe once on the synthetic granule of a campaign
+    task: (campaign, data directory, output directory, fraction) where fraction
+          is the part of the flight, centred on its middle, that is subset
+    Return dictionary of stage timings
+    """
+    campaign,dataDir,outdir,fraction = task
+    dbpath = os.path.join(outdir,'catalog_{}.sqlite'.format(campaign))
+    if(os.path.exists(dbpath)): os.remove(dbpath) #<--Time a catalog built from scratch
+    timings = {}
+    with stage(timings,'catalog'):
+        catalog = CRSCatalog(dataDir,dbpath=dbpath)
+        rows = catalog.refresh().granules(campaign)
+        catalog.close()
+        fileCRS = rows[0]['path']
+        start = EPOCH+timedelta(seconds=rows[0]['start'])
+        end = EPOCH+timedelta(seconds=rows[0]['end'])
+    pad = (end-start)*(1-fraction)/2
+    t1,t2 = start+pad,end-pad
+
+    if(campaign=='impacts'):
+        with stage(timings,'open'):
+            ds = h5py.File(fileCRS,'r')
+        with stage(timings,'subset'):
+            i0,i1 = CRSsubset_impacts(ds,EPOCH,t1.strftime('%H:%M:%S'),t1.date().isoformat(),
+                                      t2.strftime('%H:%M:%S'),t2.date().isoformat())
+        with stage(timings,'extract'):
+            cur = read_impacts_window(ds,i0,i1)
+        ds.close()
+    else:
+        t0 = start.replace(hour=0,minute=0,second=0,microsecond=0)
+        with stage(timings,'open'):
+            ds = open_CRS_nc(fileCRS)
+        with stage(timings,'subset'):
+            subset = CRSsubset_goesrplt if campaign=='goesrplt' else CRSsubset
+            cs = subset(ds,t1.strftime('%H:%M:%S'),t2.strftime('%H:%M:%S'))
+        with stage(timings,'extract'):
+            cur = nc_curtain(cs,campaign,t0,fname=fileCRS)
+        ds.close()
+
+    with stage(timings,'plot'):
+        fig = plot_curtain(cur,reverseZ=True,show=False)
+    with stage(timings,'save'):
+        fig.savefig(os.path.join(outdir,curtain_image_name(cur)),dpi=100,bbox_inches='tight')
+        plt.close(fig)
+    return timings
+
+def git_commit():
+    """Return the commit of the working tree, or None outside a git repository"""
+    try:
+        return subprocess.run(['git','rev-parse','--short','HEAD'],capture_output=True,text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)),check=True).stdout.strip()
+    except (OSError,subprocess.CalledProcessError):
+        return None
+
+def run_benchmark(campaigns,nray,ngate,repeat=3,workdir='crs_benchmark',fraction=0.5):
+    """
+    Write the synthetic granules and run every campaign repeat times,
+    each run in a fresh process
+    Return dictionary of the settings and, per campaign, the best wall time
+    and the largest peak resident memory of every stage
+    """
+    results = {}
+    for campaign in campaigns:
+        dataDir = os.path.join(workdir,campaign)
+        os.makedirs(dataDir,exist_ok=True)
+        for f in os.listdir(dataDir): os.remove(os.path.join(dataDir,f))
+        #The granule is written and every run made in a fresh spawned process: the peak resident
+        #memory of a process carries over to its children, so this one must stay small
+        with ProcessPoolExecutor(max_workers=1,mp_context=get_context('spawn')) as pool:
+            fileCRS = pool.submit(write_synthetic,campaign,dataDir,nray,ngate).result()
+        runs = []
+        for k in range(repeat):
+            with ProcessPoolExecutor(max_workers=1,mp_context=get_context('spawn')) as pool:
+                runs.append(pool.submit(run_case,(campaign,dataDir,workdir,fraction)).result())
+        results[campaign] = {'file':os.path.basename(fileCRS),'size_mb':os.path.getsize(fileCRS)/1024**2,
+                             'stages':{s:{'seconds':min(r[s]['seconds'] for r in runs),
+                                          'peak_rss_mb':max(r[s]['peak_rss_mb'] for r in runs)}
+                                       for s in STAGES}}
+    return {'commit':git_commit(),'date':datetime.now().isoformat(timespec='seconds'),
+            'python':platform.python_version(),'numpy':np.__version__,'machine':platform.machine(),
+            'rays':nray,'gates':ngate,'repeat':repeat,'fraction':fraction,'results':results}
+
+def print_report(bench,baseline=None):
+    """
+    Print the stage timings of a benchmark, with the ratio to a baseline
+    benchmark (e.g. from an earlier commit) when one is given
+    """
+    print("{} rays x {} gates, best of {}{}".format(bench['rays'],bench['gates'],bench['repeat'],
+          "" if baseline is None else ", compared with {}".format(baseline.get('commit'))))
+    for campaign,res in bench['results'].items():
+        print("\n{} ({:.1f} MB)".format(campaign,res['size_mb']))
+        for s in STAGES:
+            r = res['stages'][s]
+            line = "  {:8s} {:9.4f}s {:9.1f} MB".format(s,r['seconds'],r['peak_rss_mb'])
+            old = (baseline or {}).get('results',{}).get(campaign,{}).get('stages',{}).get(s)
+            if(old and old['seconds']>0):
+                line += "   x{:.2f} time  x{:.2f} memory".format(r['seconds']/old['seconds'],
+                                                              r['peak_rss_mb']/old['peak_rss_mb'])
+            print(line)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the CRS recipe on synthetic granules.')
+    parser.add_argument('--campaign',dest='campaigns',nargs='+',default=list(FLIGHT_START),
+                        choices=list(FLIGHT_START),help='campaign datasets to benchmark (default: all)')
+    parser.add_argument('--rays',type=int,default=20000,help='rays per granule (default: 20000)')
+    parser.add_argument('--gates',type=int,default=600,help='range gates per ray (default: 600)')
+    parser.add_argument('--repeat',type=int,default=3,help='runs per campaign; the best is kept (default: 3)')
+    parser.add_argument('--fraction',type=float,default=0.5,help='part of the flight subset (default: 0.5)')
+    parser.add_argument('--workdir',default='crs_benchmark',help='directory for the synthetic granules')
+    parser.add_argument('--output',default='crs_benchmark.json',help='JSON file the results are written to')
+    parser.add_argument('--compare',help='JSON file of an earlier benchmark to compare with')
+    args = parser.parse_args(argv)
+
+    bench = run_benchmark(args.campaigns,args.rays,args.gates,args.repeat,args.workdir,args.fraction)
+    with open(args.output,'w') as f:
+        json.dump(bench,f,indent=1)
+    baseline = None
+    if(args.compare):
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(bench,baseline)
+    print("\nResults written to",args.output)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+
+##########################################################
+#
+#        Cloud Radar System (CRS) Contoured Frequency by
+#        Altitude Diagrams (CFADs)
+#
+#        Description: This script accumulates the 2-D
+#        histograms of range from radar x reflectivity and
+#        range x Doppler velocity of CRS flights in one
+#        pass over the data. Granules are streamed in blocks
+#        that fit a memory budget and every block is binned
+#        at once with bincount, so memory use depends only
+#        on the number of bins. Histograms of granules,
+#        flights and worker processes are merged by adding
+#        them; the result is written per flight and for the
+#        whole campaign as .npz files.
+#
+#        Usage: python CRS_CFAD.py DATA_DIR --campaign impacts
+#                   [--date 2020-01-18 ...] [--outdir cfads/]
+#                   [--workers 8] [--max-mem 1G] [--plot]
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+##########################################################
+
+#Import Python packages and modules
+import argparse
+import os,sys
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+
+#Import functions from the CRS recipe files
+from CRS_Catalog import CRSCatalog
+from CRS_Chunked import file_blocks
+from CRS_Flight import CRSFlight
+from CRS_Recipe_Functions import close_CRS_nc
+
+VARIABLES = ('Ref','DopV')
+UNITS = {'Ref':'[dBZ]','DopV':'[m/s]'}
+
+#Default bins: (first edge, last edge, bin width) of range [km] and of each variable
+RANGE_BINS = (5.,20.,0.25)
+VALUE_BINS = {'Ref':(-30.,40.,1.),'DopV':(-20.,20.,0.5)}
+
+class CFAD:
+    """
+    Histograms of range from radar [km] x value of Ref and DopV
+    range_bins: (first edge, last edge, width) of the range bins
+    value_bins: dictionary of (first edge, last edge, width) per variable
+    Bins are uniform, so a value's bin is found by arithmetic instead of a
+    search; values outside the bins and missing values are not counted
+    """
+    def __init__(self,range_bins=RANGE_BINS,value_bins=VALUE_BINS):
+        self.range_bins = tuple(float(b) for b in range_bins)
+        self.value_bins = {vnm:tuple(float(b) for b in value_bins[vnm]) for vnm in VARIABLES}
+        nr = self.nbins(self.range_bins)
+        self.counts = {vnm:np.zeros((nr,self.nbins(self.value_bins[vnm])),dtype=np.int64) for vnm in VARIABLES}
+        self.rays = 0
+        self.files = []
+
+    @staticmethod
+    def nbins(bins):
+        """Return number of bins of (first edge, last edge, width)"""
+        return int(round((bins[1]-bins[0])/bins[2]))
+
+    @staticmethod
+    def edges(bins):
+        """Return bin edges of (first edge, last edge, width)"""
+        return bins[0]+bins[2]*np.arange(CFAD.nbins(bins)+1)
+
+    @staticmethod
+    def bin_index(values,bins):
+        """
+        Return bin number of every value (int64), -1 outside the bins or missing
+        """
+        k = np.floor((np.asarray(values,dtype=np.float64)-bins[0])/bins[2])
+        k[~((k>=0) & (k<CFAD.nbins(bins)))] = -1 #<--NaN compares False, so it is dropped too
+        return k.astype(np.int64)
+
+    def add(self,cur):
+        """Count the values of one CRSCurtain block"""
+        if(len(cur)==0): return
+        rbin = self.bin_index(cur.range,self.range_bins) #<--one bin per gate, shared by every ray
+        for vnm in VARIABLES:
+            nv = self.counts[vnm].shape[1]
+            vbin = self.bin_index(cur[vnm],self.value_bins[vnm])
+            flat = rbin[None,:]*nv+vbin
+            flat = flat[(vbin>=0) & (rbin[None,:]>=0)]
+            self.counts[vnm] += np.bincount(flat,minlength=self.counts[vnm].size).reshape(self.counts[vnm].shape)
+        self.rays += len(cur)
+
+    def merge(self,other):
+        """
+        Add the counts of another CFAD with the same bins
+        Return self
+        """
+        if(other.range_bins!=self.range_bins or other.value_bins!=self.value_bins):
+            raise ValueError("CFADs with different bins cannot be merged")
+        for vnm in VARIABLES: self.counts[vnm] += other.counts[vnm]
+        self.rays += other.rays
+        self.files += other.files
+        return self
+
+    def frequency(self,vnm):
+        """
+        Return frequency of vnm per unit value at each range bin [1/unit];
+        every range bin with data integrates to 1 over the value bins
+        """
+        c = self.counts[vnm].astype(np.float64)
+        total = c.sum(axis=1,keepdims=True)
+        with np.errstate(invalid='ignore',divide='ignore'):
+            return c/total/self.value_bins[vnm][2]
+
+    def save(self,path):
+        """Write the CFAD to a .npz file"""
+        np.savez_compressed(path,range_bins=self.range_bins,rays=self.rays,files=np.array(self.files,dtype=str),
+                            **{vnm+'_bins':self.value_bins[vnm] for vnm in VARIABLES},
+                            **{vnm+'_counts':self.counts[vnm] for vnm in VARIABLES})
+
+    @classmethod
+    def load(cls,path):
+        """Read a CFAD written by save()"""
+        with np.load(path) as f:
+            cfad = cls(f['range_bins'],{vnm:f[vnm+'_bins'] for vnm in VARIABLES})
+            for vnm in VARIABLES: cfad.counts[vnm][:] = f[vnm+'_counts']
+            cfad.rays,cfad.files = int(f['rays']),[str(p) for p in f['files']]
+        return cfad
+
+    def plot(self,title='',reverseZ=True,show=None):
+        """
+        Contour the frequency of Ref and DopV by range, in the panel layout
+        of plot_CRS2D
+        Return image object "fig" than can be used to save the plot
+        """
+        import matplotlib.pyplot as plt
+        from CRS_Recipe_Functions import headless
+        fig,axs = plt.subplots(nrows=1,ncols=2,figsize=(12,6))
+        rc = 0.5*(self.edges(self.range_bins)[1:]+self.edges(self.range_bins)[:-1])
+        for ax,vnm in zip(axs,VARIABLES):
+            e = self.edges(self.value_bins[vnm])
+            freq = np.ma.masked_invalid(self.frequency(vnm))
+            freq = np.ma.masked_equal(freq,0)
+            if(freq.count()):
+                cp = ax.contourf(0.5*(e[1:]+e[:-1]),rc,freq,levels=12,cmap='gist_ncar')
+                fig.colorbar(cp,ax=ax).set_label('Frequency [1/{}]'.format(UNITS[vnm].strip('[]')))
+            ax.set_xlabel({'Ref':'Reflectivity','DopV':'Doppler Vel.'}[vnm]+' '+UNITS[vnm])
+            ax.set_ylabel('Range from Radar [km]')
+            if(reverseZ): ax.set_ylim(ymin=rc[-1],ymax=rc[0])
+        fig.suptitle('CRS CFAD {} ({} rays)'.format(title,self.rays),fontsize=14)
+        fig.tight_layout(rect=(0,0,1,0.95))
+        if(show is None): show = not headless()
+        if(show): plt.show()
+        return fig
+
+def cfad_window(task):
+    """
+    CFAD of one granule over the part of the flight it contributes
+    task: (file path, campaign, start, end, max_mem, range bins, value bins)
+          where start/end are datetime objects or None
+    Return CFAD
+    """
+    fileCRS,campaign,start,end,max_mem,range_bins,value_bins = task
+    cfad = CFAD(range_bins,value_bins)
+    for cur in file_blocks(fileCRS,campaign,start,end,max_mem,rmin=range_bins[0],rmax=range_bins[1]):
+        cfad.add(cur)
+    cfad.files.append(fileCRS)
+    close_CRS_nc(fileCRS) #<--every granule is a task of its own
+    return cfad
+
+def campaign_cfads(catalog,campaign,dates=None,workers=None,max_mem='1G',range_bins=RANGE_BINS,value_bins=VALUE_BINS):
+    """
+    CFADs of every flight of a campaign in one pass over the granules
+    Granules are split between worker processes; rays repeated in the
+    overlap of consecutive granules of a flight are counted once
+    dates: flight dates ('yyyy-mm-dd') to include; None for every flight
+    Return dictionary of CFAD per flight date and the campaign CFAD
+    """
+    tasks = []
+    for fdate in (dates or catalog.flight_dates(campaign)):
+        if(len(catalog.granules(campaign,fdate))==0): continue
+        flight = CRSFlight.from_catalog(catalog,campaign,fdate)
+        tasks.extend((fdate,(f,campaign,lo,hi,max_mem,range_bins,value_bins)) for f,lo,hi in flight.windows())
+    flights = {}
+    total = CFAD(range_bins,value_bins)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for (fdate,t),cfad in zip(tasks,pool.map(cfad_window,[t for d,t in tasks])):
+            flights.setdefault(fdate,CFAD(range_bins,value_bins)).merge(cfad)
+            total.merge(cfad)
+    return flights,total
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Accumulate CFADs of CRS flights in one pass.')
+    parser.add_argument('data_dir',help='directory searched recursively for CRS files')
+    parser.add_argument('--campaign',required=True,choices=['impacts','goesrplt','olympex','iphex'])
+    parser.add_argument('--date',dest='dates',nargs='+',help='flight dates in yyyy-mm-dd (default: all)')
+    parser.add_argument('--outdir',default='.',help='directory the .npz files are written to')
+    parser.add_argument('--workers',type=int,help='number of worker processes (default: one per core)')
+    parser.add_argument('--max-mem',dest='max_mem',default='256M',help='memory budget per worker (default: 256M)')
+    parser.add_argument('--plot',action='store_true',help='also write a PNG plot of every CFAD')
+    args = parser.parse_args(argv)
+
+    with CRSCatalog(args.data_dir) as catalog:
+        catalog.refresh()
+        flights,total = campaign_cfads(catalog,args.campaign,args.dates,args.workers,args.max_mem)
+    if(not flights):
+        print("%%No {} files found".format(args.campaign))
+        return 1
+
+    os.makedirs(args.outdir,exist_ok=True)
+    outputs = [('{}_CRS_CFAD_{}'.format(args.campaign,d.replace('-','')),d,c) for d,c in sorted(flights.items())]
+    outputs.append(('{}_CRS_CFAD'.format(args.campaign),args.campaign,total))
+    for name,title,cfad in outputs:
+        cfad.save(os.path.join(args.outdir,name+'.npz'))
+        if(args.plot):
+            import matplotlib
+            matplotlib.use('Agg') #<--Render without a display
+            import matplotlib.pyplot as plt
+            fig = cfad.plot(title,show=False)
+            fig.savefig(os.path.join(args.outdir,name+'.png'),dpi=100,bbox_inches='tight')
+            plt.close(fig)
+        print("{}: {} rays from {} granule(s)".format(name,cfad.rays,len(cfad.files)))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
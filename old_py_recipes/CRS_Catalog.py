@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+##########################################################
+#
+#        Cloud Radar System (CRS) Granule Catalog
+#
+#        Description: This script keeps an on-disk SQLite
+#        index of the CRS files under a data directory
+#        (campaign, flight date, start/end time, dimensions
+#        and variable names) so that flights and periods
+#        can be selected without searching the directory
+#        tree each time. The index is refreshed
+#        incrementally: directories whose modification
+#        time has not changed are not listed again, and
+#        only new or changed files are opened.
+#
+#        The index is stored in '.crs_catalog.sqlite' in
+#        the data directory, or in the file named by the
+#        CRS_CATALOG environment variable. Where the data
+#        directory cannot be written (a read-only or shared
+#        mount), the index is kept in the user's cache
+#        directory ($XDG_CACHE_HOME/crs_catalog, default
+#        ~/.cache/crs_catalog), and in memory for the
+#        session if that cannot be written either
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+##########################################################
+
+#Import Python packages and modules
+import re
+import os
+import hashlib
+import json
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from CRS_Profile import stage
+
+#File name pattern of each CRS campaign dataset
+CRS_PATTERNS = {'impacts':'IMPACTS_CRS_L1B_*.h5','goesrplt':'GOESR_CRS_L1B_*.nc',
+                'olympex':'olympex_CRS_*.nc','iphex':'IPHEX_CRS_L1B_*.nc'}
+
+#Names of the (time, reflectivity, Doppler velocity) variables in the netCDF-3 CRS datasets;
+#time is in hours UTC of the flight date
+CRS_VARIABLES = {'goesrplt':('time','ref','dop'),
+                 'olympex':('timed','zku','dopcorr'),
+                 'iphex':('timed','zku','dopcorr')}
+
+def campaign_of(fname):
+    """
+    Identify the CRS campaign dataset from a file name
+    Return name of campaign or None if the file is not a CRS file
+    """
+    for campaign,pattern in CRS_PATTERNS.items():
+        if Path(os.path.basename(fname)).match(pattern): return campaign
+    return None
+
+def flight_date(fname,campaign):
+    """
+    Extract the flight date of a CRS file from its name
+    Return date in 'yyyymmdd'
+    """
+    fname = os.path.basename(fname)
+    if(campaign=='impacts'): return re.split(r'_',fname)[4][:8]
+    if(campaign=='goesrplt'): return re.split(r'_',fname)[3]
+    if(campaign=='olympex'): return re.split(r'_|-',fname)[2]
+    return re.split(r'_|-',fname)[3]
+
+def granule_info(path,campaign):
+    """
+    Open a CRS file and read what the catalog stores about it
+    Return dictionary with start/end (seconds since 1970-01-01 UTC),
+    ntime, nrange and the list of data variable names
+    """
+    if(campaign=='impacts'):
+        import h5py
+        with h5py.File(path,'r') as ds:
+            timeUTC = ds['Time']['Data']['TimeUTC']
+            start,end,ntime = float(timeUTC[0]),float(timeUTC[-1]),len(timeUTC)
+            nrange = len(ds['Products']['Information']['Range'])
+            variables = sorted(ds['Products']['Data'].keys())
+    else:
+        import xarray as xr
+        t0 = datetime.strptime(flight_date(path,campaign),'%Y%m%d').replace(tzinfo=timezone.utc).timestamp()
+        with xr.open_dataset(path,decode_cf=False) as ds:
+            hrs = ds[CRS_VARIABLES[campaign][0]]
+            start,end,ntime = t0+float(hrs[0])*3600.,t0+float(hrs[-1])*3600.,len(hrs)
+            nrange = ds.sizes['range']
+            variables = sorted(ds.data_vars)
+    return {'start':start,'end':end,'ntime':ntime,'nrange':nrange,'variables':variables}
+
+def catalog_paths(root):
+    """
+    Candidate index files of the data directory root: in root itself, then
+    in the per-user cache directory, named after a hash of root
+    Return list of file paths
+    """
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'),'.cache')
+    return [os.path.join(root,'.crs_catalog.sqlite'),
+            os.path.join(cache,'crs_catalog',hashlib.sha1(root.encode()).hexdigest()+'.sqlite')]
+
+class CRSCatalog:
+    """
+    SQLite index of the CRS granules found under dataDir
+    Call refresh() to bring it up to date with the files on disk, then query
+    it with flight_dates() and granules()
+    """
+    def __init__(self,dataDir,dbpath=None):
+        self.root = os.path.abspath(dataDir)
+        dbpath = dbpath or os.environ.get('CRS_CATALOG')
+        for path in ([dbpath] if dbpath else catalog_paths(self.root))+[':memory:']:
+            try:
+                self.db = self._connect(path)
+            except (OSError,sqlite3.Error):
+                continue
+            self.dbpath = path
+            break
+        if(self.dbpath==':memory:'):
+            print("%%The CRS catalog cannot be written; the index is kept in memory for this session")
+
+    @staticmethod
+    def _connect(path):
+        """
+        Open the index file path (':memory:' for an in-memory index) and
+        create its tables
+        Return sqlite3 connection; raise OSError or sqlite3.Error if the file
+        cannot be created or written
+        """
+        if(path!=':memory:'):
+            folder = os.path.dirname(os.path.abspath(path))
+            os.makedirs(folder,exist_ok=True)
+            if(not os.access(folder,os.W_OK) or (os.path.exists(path) and not os.access(path,os.W_OK))):
+                raise PermissionError("{} cannot be written".format(path))
+        db = sqlite3.connect(path)
+        try:
+            db.row_factory = sqlite3.Row
+            db.executescript("""
+                CREATE TABLE IF NOT EXISTS dirs (
+                    path TEXT PRIMARY KEY, mtime REAL, subdirs TEXT);
+                CREATE TABLE IF NOT EXISTS granules (
+                    path TEXT PRIMARY KEY, dir TEXT, campaign TEXT, flight_date TEXT,
+                    start REAL, end REAL, ntime INTEGER, nrange INTEGER, variables TEXT,
+                    size INTEGER, mtime REAL);
+                CREATE INDEX IF NOT EXISTS granules_flight ON granules (campaign, flight_date, start);
+            """)
+        except sqlite3.Error:
+            db.close()
+            raise
+        return db
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def _forget(self,path):
+        """Drop a directory and everything below it from the index"""
+        below = os.path.join(path,'')
+        self.db.execute("DELETE FROM dirs WHERE path=? OR substr(path,1,?)=?",(path,len(below),below))
+        self.db.execute("DELETE FROM granules WHERE dir=? OR substr(dir,1,?)=?",(path,len(below),below))
+
+    def _scan_dir(self,path,mtime):
+        """List a changed directory and update the granules it holds"""
+        subdirs,files = [],{}
+        with os.scandir(path) as entries:
+            for e in entries:
+                if e.is_dir(follow_symlinks=True):
+                    subdirs.append(e.path)
+                elif campaign_of(e.name):
+                    files[e.path] = e.stat()
+
+        old = {r['path']:r for r in self.db.execute(
+            "SELECT path,size,mtime FROM granules WHERE dir=?",(path,))}
+        for gone in set(old)-set(files):
+            self.db.execute("DELETE FROM granules WHERE path=?",(gone,))
+        for fpath,st in files.items():
+            row = old.get(fpath)
+            if(row and row['size']==st.st_size and row['mtime']==st.st_mtime): continue
+            campaign = campaign_of(fpath)
+            try:
+                info = granule_info(fpath,campaign)
+            except Exception as err:
+                print("%%Could not read {}: {}".format(fpath,err))
+                continue
+            fdate = datetime.strptime(flight_date(fpath,campaign),'%Y%m%d').date().isoformat()
+            self.db.execute("INSERT OR REPLACE INTO granules VALUES (?,?,?,?,?,?,?,?,?,?,?)",
+                            (fpath,path,campaign,fdate,info['start'],info['end'],info['ntime'],
+                             info['nrange'],','.join(info['variables']),st.st_size,st.st_mtime))
+
+        row = self.db.execute("SELECT subdirs FROM dirs WHERE path=?",(path,)).fetchone()
+        if(row):
+            for gone in set(json.loads(row['subdirs']))-set(subdirs):
+                self._forget(gone)
+        self.db.execute("INSERT OR REPLACE INTO dirs VALUES (?,?,?)",(path,mtime,json.dumps(subdirs)))
+        return subdirs
+
+    def refresh(self):
+        """
+        Bring the index up to date with the files under the data directory
+        Only directories whose modification time changed are listed again
+        Return self
+        """
+        stack = [self.root]
+        with stage('catalog',root=self.root),self.db:
+            while stack:
+                path = stack.pop()
+                try:
+                    mtime = os.stat(path).st_mtime
+                except OSError:
+                    self._forget(path)
+                    continue
+                row = self.db.execute("SELECT mtime,subdirs FROM dirs WHERE path=?",(path,)).fetchone()
+                if(row and row['mtime']==mtime):
+                    stack.extend(json.loads(row['subdirs']))
+                else:
+                    stack.extend(self._scan_dir(path,mtime))
+        return self
+
+    def flight_dates(self,campaign):
+        """
+        Return sorted list of the flight dates ('yyyy-mm-dd') of a campaign
+        """
+        rows = self.db.execute("SELECT DISTINCT flight_date FROM granules WHERE campaign=? "
+                               "ORDER BY flight_date",(campaign,))
+        return [r['flight_date'] for r in rows]
+
+    def granules(self,campaign=None,fdate=None,start=None,end=None):
+        """
+        Query the granules of a campaign
+        fdate: flight date in 'yyyy-mm-dd'
+        start,end: only granules overlapping this period (seconds since 1970-01-01 UTC)
+        Return list of dictionaries ordered by start time
+        """
+        sql,args = "SELECT * FROM granules WHERE 1=1",[]
+        if(campaign): sql,args = sql+" AND campaign=?",args+[campaign]
+        if(fdate): sql,args = sql+" AND flight_date=?",args+[fdate]
+        if(start is not None): sql,args = sql+" AND end>=?",args+[start]
+        if(end is not None): sql,args = sql+" AND start<=?",args+[end]
+        rows = self.db.execute(sql+" ORDER BY start,path",args)
+        return [dict(r,variables=r['variables'].split(',')) for r in rows]
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+##########################################################
+#
+#        Cloud Radar System (CRS) Memory-Capped Reduction
+#
+#        Description: This script walks a CRS file or a
+#        stitched flight in blocks of rays whose size is
+#        set by a memory budget, and reduces every block
+#        straight into the pixel columns of the plot. Only
+#        one block and the column accumulators are held
+#        in memory at a time, so a whole flight can be
+#        plotted on a machine with little memory. It works
+#        with the h5py reader (IMPACTS) and the memory-
+#        mapped netCDF-3 reader (GOES-R PLT, OLYMPEX and
+#        IPHEX).
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+##########################################################
+
+#Import Python packages and modules
+import re
+import numpy as np
+import h5py
+from datetime import datetime
+
+#Import functions from the CRS recipe files
+from CRS_Recipe_Functions import (CRSCurtain, time_index_range, gate_index_range, chunk_blocks,
+                                  read_impacts_window, nc_curtain, reduce_rays, open_CRS_nc,
+                                  decimation_sums, finish_decimation)
+from CRS_Catalog import CRS_VARIABLES, campaign_of, flight_date
+from CRS_Flight import CRSFlight, read_times
+
+EPOCH = datetime(1970,1,1)
+
+#Bytes held per value of a block while it is read and reduced: the float32
+#value plus the copies made by the reader and the NaN-aware reduction
+BYTES_PER_VALUE = 16
+
+def parse_size(size):
+    """
+    Convert a memory size such as '1G', '512M', '2GB' or a number of bytes
+    Return number of bytes
+    """
+    if(isinstance(size,(int,float))): return int(size)
+    m = re.fullmatch(r'\s*([\d.]+)\s*([KMGT]?)I?B?\s*',size.upper())
+    if(not m): raise ValueError("Invalid memory size: {}".format(size))
+    return int(float(m.group(1))*1024**' KMGT'.index(m.group(2) or ' '))
+
+def rays_per_block(max_mem,ngate,nvar=2):
+    """
+    Return number of rays of ngate gates and nvar variables that fit the memory budget
+    """
+    return max(1,parse_size(max_mem)//(ngate*nvar*BYTES_PER_VALUE))
+
+def index_window(secs,start,end,t0=EPOCH):
+    """
+    Index range of [start,end] (datetime objects, either may be None) in secs
+    """
+    return time_index_range(secs,start or datetime.min,end or datetime.max,t0)
+
+def file_blocks(fileCRS,campaign=None,start=None,end=None,max_mem='1G',rmin=5,rmax=20,extra=()):
+    """
+    Stream the window [start,end] of a CRS file in blocks that fit max_mem
+    IMPACTS blocks are whole multiples of the HDF5 chunk length
+    extra: optional variables to read as well when present, e.g. ('SpW','LDR')
+    Yield CRSCurtain blocks in time order
+    """
+    campaign = campaign or campaign_of(fileCRS)
+    if(campaign=='impacts'):
+        with h5py.File(fileCRS,'r') as ds:
+            i0,i1 = index_window(ds['Time']['Data']['TimeUTC'][:],start,end)
+            g0,g1 = gate_index_range(ds['Products']['Information']['Range'][:]/1000,rmin,rmax)
+            chunk = ds['Products']['Data']['dBZe'].chunks
+            chunk = chunk[0] if chunk else 1
+            nray = rays_per_block(max_mem,g1-g0,2+len(extra))
+            nray = max(chunk,nray-nray%chunk)
+            for a,b in chunk_blocks(i0,i1,nray):
+                yield read_impacts_window(ds,a,b,rmin,rmax,extra)
+    else:
+        tname = CRS_VARIABLES[campaign][0]
+        t0 = datetime.strptime(flight_date(fileCRS,campaign),'%Y%m%d')
+        with open_CRS_nc(fileCRS) as ds:
+            i0,i1 = index_window(ds[tname].values*3600.,start,end,t0)
+            g0,g1 = gate_index_range(ds['range'].values/1000,rmin,rmax)
+            tdim = ds[tname].dims[0]
+            for a,b in chunk_blocks(i0,i1,rays_per_block(max_mem,g1-g0,2+len(extra))):
+                yield nc_curtain(ds.isel({tdim:slice(a,b)}),campaign,t0,rmin,rmax,fileCRS,extra)
+
+def flight_blocks(flight,start=None,end=None,max_mem='1G',rmin=5,rmax=20,extra=()):
+    """
+    Stream the window [start,end] of a stitched CRSFlight in blocks that fit max_mem
+    Yield CRSCurtain blocks in time order
+    """
+    for f,lo,hi in flight.windows(start,end):
+        yield from file_blocks(f,flight.campaign,lo,hi,max_mem,rmin,rmax,extra)
+
+class ColumnReducer:
+    """
+    Accumulate curtain blocks into ncols columns of equal duration whose
+    centres run from tlo to thi (seconds since 1970-01-01 UTC)
+    how: 'max' keeps the strongest value of each column, 'mean' averages,
+         'physical' averages in physical units (see decimation_sums);
+         missing values (NaN) are ignored and columns without rays stay NaN
+    Every variable of the first block (Ref, DopV and any of SpW and LDR) is reduced
+    """
+    def __init__(self,tlo,thi,ncols,how='max'):
+        self.tlo,self.thi,self.ncols,self.how = tlo,thi,ncols,how
+        self.acc = None
+        self.range,self.campaign,self.fname = None,None,None
+
+    def add(self,cur):
+        """Reduce one CRSCurtain block into the columns"""
+        if(len(cur)==0): return
+        if(self.acc is None):
+            self.range,self.campaign,self.fname = cur.range,cur.campaign,cur.fname
+            shape = (self.ncols,len(cur.range))
+            if(self.how=='max'):
+                self.acc = {vnm:np.full(shape,np.nan,dtype=np.float32) for vnm in cur.variables()}
+            elif(self.how=='physical'):
+                self.acc = {} #<--laid out from the sums of the first block below
+            else:
+                self.acc = {vnm:(np.zeros(shape),np.zeros(shape,dtype=np.int64)) for vnm in cur.variables()}
+        span = max(self.thi-self.tlo,1e-9)
+        col = np.rint((cur.time-self.tlo)/span*(self.ncols-1)).astype(np.int64).clip(0,self.ncols-1)
+        starts = np.flatnonzero(np.diff(col,prepend=-1)) #<--rays are sorted, so each column is one run
+        cols = col[starts]
+        if(self.how=='physical'):
+            for vnm,part in decimation_sums(cur,starts).items():
+                if(vnm not in self.acc): self.acc[vnm] = tuple(np.zeros((self.ncols,len(self.range))) for p in part)
+                for total,p in zip(self.acc[vnm],part): total[cols] += p
+            return
+        for vnm in self.acc:
+            if(self.how=='max'):
+                self.acc[vnm][cols] = np.fmax(self.acc[vnm][cols],reduce_rays(cur[vnm],starts,'max'))
+            else:
+                var = cur[vnm]
+                valid = ~np.isnan(var)
+                total,count = self.acc[vnm]
+                total[cols] += np.add.reduceat(np.where(valid,var,0),starts,axis=0,dtype=np.float64)
+                count[cols] += np.add.reduceat(valid,starts,axis=0,dtype=np.int64)
+
+    def result(self):
+        """
+        Return CRSCurtain with one ray per column, timed at the column centres
+        """
+        time = np.linspace(self.tlo,self.thi,self.ncols)
+        if(self.acc is None):
+            empty = np.empty((0,0),dtype=np.float32)
+            return CRSCurtain(time[:0],np.empty(0),empty,empty,self.campaign,self.fname)
+        if(self.how=='max'):
+            data = dict(self.acc) #<--a copy; Ref and DopV are taken out of it below
+        elif(self.how=='physical'):
+            data = finish_decimation(self.acc)
+        else:
+            with np.errstate(invalid='ignore',divide='ignore'):
+                data = {vnm:total/count for vnm,(total,count) in self.acc.items()}
+        return CRSCurtain(time,self.range,data.pop('Ref'),data.pop('DopV'),self.campaign,self.fname,**data)
+
+def reduce_CRS(source,ncols,start=None,end=None,max_mem='1G',how='max',rmin=5,rmax=20,extra=()):
+    """
+    Reduce a CRS file or a stitched CRSFlight (source) to ncols columns
+    spanning [start,end] (datetime objects; None for the entire flight)
+    The data are read in blocks that fit max_mem (e.g. '1G')
+    extra: optional variables to read and reduce as well when present
+    A window of no more rays than ncols is not reduced: every ray is kept,
+    as a full read would, so short windows do not plot as stripes of empty
+    columns
+    Return CRSCurtain with ncols rays (or the rays of the window), ready
+    for plot_curtain
+    """
+    if(isinstance(source,CRSFlight)):
+        secs,blocks = source.time,flight_blocks(source,start,end,max_mem,rmin,rmax,extra)
+    else:
+        secs,blocks = read_times(source,campaign_of(source)),file_blocks(source,None,start,end,max_mem,rmin,rmax,extra)
+    i0,i1 = index_window(secs,start,end)
+    if(i1==i0): return ColumnReducer(0,1,ncols,how).result()
+    if(i1-i0<=ncols): return join_blocks(blocks) #<--at most ncols rays, so within the memory of the result
+    reducer = ColumnReducer(secs[i0],secs[i1-1],ncols,how)
+    for cur in blocks:
+        reducer.add(cur)
+    return reducer.result()
+
+def join_blocks(blocks):
+    """
+    Join CRSCurtain blocks in time order into one curtain; every variable
+    of the first block is kept
+    Return CRSCurtain
+    """
+    blocks = [cur for cur in blocks if len(cur)]
+    if(len(blocks)==0): return ColumnReducer(0,1,1).result()
+    first = blocks[0]
+    data = {vnm:np.concatenate([cur[vnm] for cur in blocks]) for vnm in first.variables()}
+    return CRSCurtain(np.concatenate([cur.time for cur in blocks]),first.range,data.pop('Ref'),data.pop('DopV'),
+                      first.campaign,first.fname,**data)
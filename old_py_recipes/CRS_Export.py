@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+##########################################################
+#
+#        Cloud Radar System (CRS) Curtain Export
+#
+#        Description: This script writes a CRS subset or a
+#        whole stitched flight to a netCDF-4 (HDF5) file in
+#        the unified curtain layout of every campaign:
+#        time (seconds since 1970-01-01 UTC), range [km],
+#        and float32 Ref [dBZ] and DopV [m/s] on
+#        (time,range), with SpW [m/s] and LDR [dB] when the
+#        curtain holds them. The variables are chunked along time
+#        and compressed (shuffle + deflate), so a later
+#        analysis reloads a window by reading and inflating
+#        only the chunks it covers, instead of re-reading
+#        and re-subsetting the original L1B granules.
+#        A flight is written granule by granule, so memory
+#        use does not grow with the length of the flight.
+#        --decimate N averages every N rays into one in
+#        physical units (see decimate_rays) as it writes.
+#
+#        Usage: python CRS_Export.py DATA_DIR --campaign impacts
+#                   --date 2020-01-18 [--window START END]
+#                   [--decimate 10] [--extra SpW LDR]
+#                   [--out impacts_CRS_20200118.nc4]
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+##########################################################
+
+#Import Python packages and modules
+import argparse
+import os,sys
+from datetime import datetime
+import numpy as np
+from netCDF4 import Dataset
+
+#Import functions from the CRS recipe files
+from CRS_Recipe_Functions import CRSCurtain, CURTAIN_VARIABLES, time_index_range, image_name, decimate_curtain
+from CRS_Catalog import CRSCatalog
+from CRS_Flight import CRSFlight
+from CRS_Profile import stage
+from Time_Decoding import EPOCH_UNITS
+
+CHUNK_BYTES = 2**20 #<--about 1 MB of each variable per chunk
+UNITS = {'Ref':'dBZ','DopV':'m/s','SpW':'m/s','LDR':'dB'}
+LONG_NAMES = {'Ref':'radar reflectivity','DopV':'Doppler velocity','SpW':'spectrum width',
+              'LDR':'linear depolarization ratio'}
+
+def chunk_rays(ngates,chunk_bytes=CHUNK_BYTES):
+    """Return number of rays per chunk of a (time,range) float32 variable"""
+    return max(1,chunk_bytes//(4*max(1,ngates)))
+
+class CurtainStore:
+    """
+    netCDF-4 file that CRSCurtain pieces are appended to in time order
+    path: file to create (overwritten if it exists)
+    complevel: deflate level 1-9 (shuffle is always applied)
+    The file is laid out by the first curtain appended: every variable it
+    holds is stored (see CRSCurtain.variables), and a later curtain without
+    one of them stores NaN in its rays; use as a context manager, or call
+    close(), to finish the file
+    """
+    def __init__(self,path,complevel=4):
+        self.path,self.complevel = path,complevel
+        self.nc,self.rays,self.sources = None,0,[]
+
+    def _create(self,cur):
+        if(os.path.dirname(self.path)): os.makedirs(os.path.dirname(self.path),exist_ok=True)
+        nc = self.nc = Dataset(self.path,'w',format='NETCDF4')
+        nc.title = 'CRS radar reflectivity and Doppler velocity curtain'
+        nc.campaign = cur.campaign or ''
+        nc.createDimension('time',None)
+        nc.createDimension('range',len(cur.range))
+        nray = chunk_rays(len(cur.range))
+        t = nc.createVariable('time','f8',('time',),chunksizes=(max(nray,1024),))
+        t.units,t.long_name = EPOCH_UNITS,'time of the ray (UTC)'
+        r = nc.createVariable('range','f4',('range',))
+        r.units,r.long_name = 'km','range from radar/aircraft'
+        r[:] = cur.range
+        self.variables = cur.variables()
+        for vnm in self.variables:
+            v = nc.createVariable(vnm,'f4',('time','range'),zlib=True,complevel=self.complevel,shuffle=True,
+                                  chunksizes=(nray,len(cur.range)),fill_value=False) #<--no prefill; every ray is written
+            v.units,v.long_name = UNITS[vnm],LONG_NAMES[vnm]
+        self.range = cur.range
+
+    def append(self,cur):
+        """Append the rays of a CRSCurtain, later than those already written"""
+        if(len(cur)==0): return
+        if(self.nc is None): self._create(cur)
+        elif(len(cur.range)!=len(self.range)):
+            raise ValueError("Curtains with different range gates cannot be stored together")
+        k,m = self.rays,len(cur)
+        with stage('export',file=self.path,rays=m):
+            self.nc['time'][k:k+m] = cur.time
+            for vnm in self.variables:
+                self.nc[vnm][k:k+m] = cur[vnm] if cur[vnm] is not None else np.full((m,len(self.range)),np.nan,np.float32)
+        self.rays += m
+        if(cur.fname and os.path.basename(cur.fname) not in self.sources):
+            self.sources.append(os.path.basename(cur.fname))
+
+    def close(self):
+        if(self.nc is not None):
+            self.nc.source_files = ' '.join(self.sources)
+            self.nc.close()
+            self.nc = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+def export_curtain(cur,path,complevel=4):
+    """
+    Write a CRSCurtain (e.g. the subset shown by SAVEsubset) to path
+    Return path
+    """
+    with CurtainStore(path,complevel) as store:
+        store.append(cur)
+    return path
+
+def export_flight(flight,path,start=None,end=None,rmin=5,rmax=20,complevel=4,factor=None,extra=()):
+    """
+    Write the window [start,end] (datetime objects; None for the entire
+    flight) of a CRSFlight to path, one granule at a time
+    extra: optional variables to write as well when present, e.g. ('SpW','LDR')
+    factor: average every factor rays into one (see decimate_curtain); the
+            groups start afresh in every granule
+    Return number of rays written
+    """
+    with CurtainStore(path,complevel) as store:
+        for cur in flight.iter_curtains(start,end,rmin,rmax,extra):
+            store.append(decimate_curtain(cur,factor) if factor and factor>1 else cur)
+    return store.rays
+
+def export_name(fname,start,end):
+    """
+    Export file name for CRS file fname covering start to end (date/time
+    strings in 'YYYYMMDDThhmmss'); the image name with a .nc4 extension,
+    which the granule patterns of the catalog do not match
+    """
+    return os.path.splitext(image_name(fname,start,end))[0]+'.nc4'
+
+def load_curtain(path,start=None,end=None):
+    """
+    Read the window [start,end] (datetime objects; None for everything)
+    of a file written by this script; only the chunks covering the window
+    are read; SpW and LDR are read when the file holds them
+    Return CRSCurtain
+    """
+    with stage('load',file=path), Dataset(path) as nc:
+        nc.set_auto_mask(False)
+        time = nc['time'][:]
+        i0,i1 = (0,len(time)) if start is None else time_index_range(time,start,end)
+        sources = nc.source_files.split()
+        fname = os.path.join(os.path.dirname(path),sources[0]) if sources else path #<--keeps image names of the original file
+        data = {vnm:nc[vnm][i0:i1] for vnm in CURTAIN_VARIABLES if vnm in nc.variables}
+        return CRSCurtain(time[i0:i1],nc['range'][:],data.pop('Ref'),data.pop('DopV'),nc.campaign or None,fname,**data)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Export a CRS flight to a chunked, compressed netCDF-4 file.')
+    parser.add_argument('data_dir',help='directory searched recursively for CRS files')
+    parser.add_argument('--campaign',required=True,choices=['impacts','goesrplt','olympex','iphex'])
+    parser.add_argument('--date',required=True,help='flight date in yyyy-mm-dd')
+    parser.add_argument('--window',nargs=2,metavar=('START','END'),
+                        help='time window in yyyy-mm-ddThh:mm:ss (default: entire flight)')
+    parser.add_argument('--complevel',type=int,default=4,help='deflate level 1-9 (default: 4)')
+    parser.add_argument('--decimate',type=int,metavar='N',help='average every N rays into one (default: every ray)')
+    parser.add_argument('--extra',nargs='+',default=(),choices=['SpW','LDR'],
+                        help='optional variables to export as well when present')
+    parser.add_argument('--out',help='output file (default: <campaign>_CRS_<date>.nc4)')
+    args = parser.parse_args(argv)
+
+    with CRSCatalog(args.data_dir) as catalog:
+        if(len(catalog.refresh().granules(args.campaign,args.date))==0):
+            print("%%No {} files found for {}".format(args.campaign,args.date))
+            return 1
+        flight = CRSFlight.from_catalog(catalog,args.campaign,args.date)
+    start,end = (None,None) if args.window is None else (datetime.fromisoformat(t) for t in args.window)
+    out = args.out or '{}_CRS_{}.nc4'.format(args.campaign,args.date.replace('-',''))
+    n = export_flight(flight,out,start,end,complevel=args.complevel,factor=args.decimate,extra=tuple(args.extra))
+    if(n==0):
+        print("%%No rays in the selected window")
+        return 1
+    print("{} rays written to {} ({:.1f} MB)".format(n,out,os.path.getsize(out)/1024**2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
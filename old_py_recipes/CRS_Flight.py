@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+##########################################################
+#
+#        Cloud Radar System (CRS) Flight Stitching
+#
+#        Description: This script joins all the CRS
+#        granules of one flight into a single curtain.
+#        The flight object only knows the time span of
+#        each granule until data are requested; a request
+#        for a time window opens just the granules that
+#        intersect it. Rays repeated in the overlap
+#        between consecutive granules are kept once.
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+##########################################################
+
+#Import Python packages and modules
+import numpy as np
+import h5py
+from datetime import datetime, timedelta
+
+#Import functions from CRS_Recipe_Functions.py and CRS_Catalog.py files
+from CRS_Recipe_Functions import CRSCurtain, CRS_READERS, open_CRS_nc, read_CRS_rows
+from CRS_Catalog import CRS_VARIABLES, campaign_of, flight_date, granule_info
+from Time_Decoding import to_seconds, hours_units
+
+EPOCH = datetime(1970,1,1)
+
+def read_times(fileCRS,campaign):
+    """
+    Read only the time vector of a CRS file
+    Return seconds since 1970-01-01 UTC of every ray
+    """
+    if(campaign=='impacts'):
+        with h5py.File(fileCRS,'r') as ds:
+            return ds['Time']['Data']['TimeUTC'][:].astype(np.float64)
+    t0 = datetime.strptime(flight_date(fileCRS,campaign),'%Y%m%d')
+    with open_CRS_nc(fileCRS) as ds:
+        return to_seconds(ds[CRS_VARIABLES[campaign][0]].values,hours_units(t0))
+
+class CRSFlight:
+    """
+    All granules of one CRS flight, stitched in time order
+    files: paths of the granules
+    extents: optional list of (start,end) seconds since 1970-01-01 UTC of
+             each file, e.g. from the catalog; read from the files otherwise
+    Rays of a granule that are not later than the end of the granules
+    before it are overlap or duplicates and are dropped; the same rule
+    (see after()) selects the rays of time, read_index() and windows()
+    """
+    def __init__(self,files,extents=None):
+        if(extents is None):
+            extents = []
+            for f in files:
+                info = granule_info(f,campaign_of(f))
+                extents.append((info['start'],info['end']))
+        order = sorted(range(len(files)),key=lambda k:extents[k])
+        self.files = [files[k] for k in order]
+        self.extents = [extents[k] for k in order]
+        self.campaign = campaign_of(self.files[0])
+        #Rays of granule k are kept only after the cutoff: the latest end of the granules before it
+        ends = [e for s,e in self.extents]
+        self.cutoffs = [-np.inf]+list(np.maximum.accumulate(ends)[:-1])
+        self._time = self._rows = None
+
+    @classmethod
+    def from_catalog(cls,catalog,campaign,fdate):
+        """
+        Build the flight of campaign on fdate ('yyyy-mm-dd') from a CRSCatalog
+        without opening any file
+        """
+        rows = catalog.granules(campaign,fdate)
+        return cls([r['path'] for r in rows],[(r['start'],r['end']) for r in rows])
+
+    def __len__(self):
+        return len(self.time)
+
+    @property
+    def time(self):
+        """
+        Seconds since 1970-01-01 UTC of every ray of the stitched flight
+        Only the time vectors of the granules are read, once
+        """
+        if(self._time is None):
+            parts,self._rows = [],[]
+            for f,cut in zip(self.files,self.cutoffs):
+                t = read_times(f,self.campaign)
+                after = self.after(cut)
+                first = 0 if after is None else int(np.searchsorted(t,(after-EPOCH).total_seconds(),side='left'))
+                parts.append(t[first:])
+                self._rows.append((f,first,len(t)))
+            self._time = np.concatenate(parts)
+        return self._time
+
+    @staticmethod
+    def after(cut):
+        """
+        First instant kept after the cutoff cut (seconds since 1970-01-01 UTC),
+        to the microsecond as the datetime windows passed to the readers
+        Return datetime object, or None for the first granule (no cutoff)
+        """
+        if(not np.isfinite(cut)): return None
+        return EPOCH+timedelta(seconds=float(cut),microseconds=1)
+
+    def rows(self,i0=0,i1=None):
+        """
+        Split the rays [i0,i1) of the stitched flight (indices into time)
+        over the granules that hold them
+        Yield (file, first ray, end ray) in time order, indices into the file
+        """
+        n = len(self.time)
+        i1 = n if i1 is None else min(i1,n)
+        offset = 0
+        for f,first,end in self._rows:
+            a,b = max(i0,offset),min(i1,offset+end-first)
+            if(b>a): yield f,first+a-offset,first+b-offset
+            offset += end-first
+
+    def start(self):
+        """Return datetime object of the first ray"""
+        return EPOCH+timedelta(seconds=float(self.extents[0][0]))
+
+    def end(self):
+        """Return datetime object of the last ray"""
+        return EPOCH+timedelta(seconds=max(float(e) for s,e in self.extents))
+
+    def granules(self,start=None,end=None):
+        """
+        Granules that intersect the window [start,end] (datetime objects)
+        Return list of (file, cutoff) in time order
+        """
+        lo = -np.inf if start is None else (start-EPOCH).total_seconds()
+        hi = np.inf if end is None else (end-EPOCH).total_seconds()
+        return [(f,cut) for f,(s,e),cut in zip(self.files,self.extents,self.cutoffs)
+                if e>=lo and s<=hi and e>cut]
+
+    def windows(self,start=None,end=None):
+        """
+        Split the window [start,end] (datetime objects) over the granules
+        that intersect it; each granule gets the part of the window that
+        lies after the overlap with the granules before it
+        Yield (file, start, end) in time order; start/end may be None
+        """
+        for f,cut in self.granules(start,end):
+            lo,after = start,self.after(cut)
+            if(after is not None): #<--first instant after the overlap
+                lo = after if lo is None else max(lo,after)
+            hi = self.end() if end is None and lo is not None else end
+            yield f,lo,hi
+
+    def iter_curtains(self,start=None,end=None,rmin=5,rmax=20,extra=()):
+        """
+        Stream the window [start,end] granule by granule; the entire flight
+        (start and end None) is read by ray index, as time
+        Only the intersecting granules are opened, and each is read only over
+        the part of the window it contributes to the stitched flight
+        extra: optional variables to read as well when present, e.g. ('SpW','LDR')
+        Yield CRSCurtain pieces in time order
+        """
+        if(start is None and end is None):
+            yield from self.iter_rows(rmin=rmin,rmax=rmax,extra=extra)
+            return
+        reader = CRS_READERS[self.campaign]
+        for f,lo,hi in self.windows(start,end):
+            cur = reader(f,lo,hi,rmin,rmax,extra)
+            if(len(cur)): yield cur
+
+    def iter_rows(self,i0=0,i1=None,rmin=5,rmax=20,extra=()):
+        """
+        Stream the rays [i0,i1) of the stitched flight (indices into time)
+        granule by granule
+        Yield CRSCurtain pieces in time order
+        """
+        for f,a,b in self.rows(i0,i1):
+            yield read_CRS_rows(f,self.campaign,a,b,rmin,rmax,extra)
+
+    def read(self,start=None,end=None,rmin=5,rmax=20,extra=()):
+        """
+        Read the window [start,end] (datetime objects; None for the entire
+        flight) of the stitched flight
+        extra: optional variables to read as well; kept when every granule has them
+        Return CRSCurtain
+        """
+        return self._join(list(self.iter_curtains(start,end,rmin,rmax,extra)),extra)
+
+    def read_index(self,i0=0,i1=None,rmin=5,rmax=20,extra=()):
+        """
+        Read the rays [i0,i1) of the stitched flight, indices into time (e.g.
+        from CRSsubset_impacts); the rays are selected by index, so none is
+        lost converting their times
+        Return CRSCurtain
+        """
+        return self._join(list(self.iter_rows(i0,i1,rmin,rmax,extra)),extra)
+
+    def _join(self,pieces,extra):
+        """Return CRSCurtain of the pieces of the flight joined in time"""
+        if(len(pieces)==0):
+            empty = np.empty((0,0),dtype=np.float32)
+            return CRSCurtain(np.empty(0),np.empty(0),empty,empty,self.campaign,self.files[0])
+        if(len(set(len(p.range) for p in pieces))>1):
+            raise ValueError("Granules of the flight have different range gates")
+        return CRSCurtain(np.concatenate([p.time for p in pieces]),pieces[0].range,
+                          np.concatenate([p.Ref for p in pieces]),
+                          np.concatenate([p.DopV for p in pieces]),
+                          self.campaign,pieces[0].fname,
+                          **{vnm:np.concatenate([p[vnm] for p in pieces]) for vnm in extra
+                             if all(p[vnm] is not None for p in pieces)})
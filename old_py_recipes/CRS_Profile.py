@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+##########################################################
+#
+#        Cloud Radar System (CRS) Stage Profiling
+#
+#        Description: This script records the wall time,
+#        CPU time and peak resident memory of the stages
+#        of a CRS run (catalog, read, plot, save, prompts)
+#        as JSON lines, one line per stage. Profiling is
+#        off unless the CRS_PROFILE environment variable
+#        names the trace file (or enable() is called);
+#        worker processes inherit it and append to the
+#        same file, so a whole batch render farm can write
+#        to one trace. Run this script on trace files to
+#        print a summary per stage. The time of a stage
+#        includes the stages opened inside it (see the
+#        'parent' field); CPU time is that of the process.
+#
+#        Usage: CRS_PROFILE=trace.jsonl python CRS_Recipe_Code.py ...
+#               python CRS_Batch_Render.py DATA_DIR --profile trace.jsonl
+#               python CRS_Profile.py trace.jsonl [more.jsonl ...]
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+##########################################################
+
+#Import Python packages and modules
+import json
+import os,sys
+import socket
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+try:
+    import resource
+except ImportError: #<--not available on Windows; memory is then not recorded
+    resource = None
+
+_NULL = nullcontext()
+_LOCAL = threading.local() #<--stack of the open stages of each thread
+
+def trace_path():
+    """Return path of the trace file, or None when profiling is off"""
+    return os.environ.get('CRS_PROFILE') or None
+
+def enable(path):
+    """
+    Turn profiling on, appending to the trace file path; processes started
+    afterwards inherit the setting
+    """
+    os.environ['CRS_PROFILE'] = os.path.abspath(path)
+
+def peak_rss_mb():
+    """Return peak resident memory of this process so far in MB (None if unknown)"""
+    if(resource is None): return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak/1024**2 if sys.platform=='darwin' else peak/1024 #<--bytes on macOS, kB on Linux
+
+def stage(name,**fields):
+    """
+    Context manager recording one stage of a run
+    name: stage name, e.g. 'read' or 'plot'
+    fields: extra JSON-serializable values stored with the record (file, rays, ...)
+    Does nothing when profiling is off
+    """
+    path = trace_path()
+    if(path is None): return _NULL
+    return _record(path,name,fields)
+
+@contextmanager
+def _record(path,name,fields):
+    stack = getattr(_LOCAL,'stack',None)
+    if(stack is None): stack = _LOCAL.stack = []
+    parent = stack[-1] if stack else None
+    stack.append(name)
+    t0,c0,m0 = time.perf_counter(),time.process_time(),peak_rss_mb()
+    start = time.time()
+    status = 'ok'
+    try:
+        yield fields #<--the stage can add fields while it runs
+    except BaseException as err:
+        status = type(err).__name__
+        raise
+    finally:
+        stack.pop()
+        m1 = peak_rss_mb()
+        rec = {'stage':name,'parent':parent,'start':start,'wall':time.perf_counter()-t0,
+               'cpu':time.process_time()-c0,'peak_rss_mb':m1,'rss_growth_mb':None if m1 is None else m1-m0,'status':status,
+               'pid':os.getpid(),'thread':threading.current_thread().name,'host':socket.gethostname()}
+        rec.update(fields)
+        with open(path,'a') as f:
+            f.write(json.dumps(rec,default=str)+'\n') #<--one write per line, so processes can share the file
+
+def profiled(name):
+    """Decorator recording every call of a function as a stage"""
+    def wrap(func):
+        @wraps(func)
+        def inner(*args,**kwargs):
+            with stage(name):
+                return func(*args,**kwargs)
+        return inner
+    return wrap
+
+def summarize(paths):
+    """
+    Aggregate the records of trace files per stage
+    Return dictionary of stage -> count, total and max wall time, total CPU
+    time and largest peak resident memory
+    """
+    summary = {}
+    for path in paths:
+        with open(path) as f:
+            for line in f:
+                rec = json.loads(line)
+                s = summary.setdefault(rec['stage'],{'count':0,'wall':0.,'max_wall':0.,'cpu':0.,'peak_rss_mb':0.})
+                s['count'] += 1
+                s['wall'] += rec['wall']
+                s['max_wall'] = max(s['max_wall'],rec['wall'])
+                s['cpu'] += rec['cpu']
+                s['peak_rss_mb'] = max(s['peak_rss_mb'],rec['peak_rss_mb'] or 0.)
+    return summary
+
+def main(argv=None):
+    paths = sys.argv[1:] if argv is None else argv
+    if(not paths):
+        print("Usage: python CRS_Profile.py trace.jsonl [more.jsonl ...]")
+        return 1
+    summary = summarize(paths)
+    print("{:12s} {:>7s} {:>10s} {:>10s} {:>10s} {:>10s}".format('stage','count','wall [s]','max [s]','cpu [s]','peak [MB]'))
+    for name,s in sorted(summary.items(),key=lambda kv:-kv[1]['wall']):
+        print("{:12s} {:7d} {:10.3f} {:10.3f} {:10.3f} {:10.1f}".format(
+            name,s['count'],s['wall'],s['max_wall'],s['cpu'],s['peak_rss_mb']))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+##########################################################
+#
+#        Cloud Radar System (CRS) Quick View Pyramid
+#
+#        Description: This script preprocesses a CRS
+#        flight into a multi-resolution pyramid of
+#        reflectivity and Doppler velocity. Level 0 holds
+#        every ray; each further level pools 'factor'
+#        rays of the level below into one ('physical'
+#        pooling averages the rays of level 0 in linear
+#        units instead, so no level is an average of
+#        averages; see decimate_rays). Every level is
+#        stored as plain .npy files that are memory-mapped
+#        when read, so a zoom request reads only the rays
+#        of the coarsest level that still resolves the
+#        requested window at the plot resolution.
+#
+#        Usage: python CRS_Pyramid.py DATA_DIR --campaign impacts
+#                   --date 2020-01-18 [--outdir pyramids/]
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+##########################################################
+
+#Import Python packages and modules
+import argparse
+import json
+import os,sys
+import numpy as np
+from datetime import datetime
+from numpy.lib.format import open_memmap
+
+#Import functions from the CRS recipe files
+from CRS_Recipe_Functions import CRSCurtain, reduce_rays, decimate_rays, time_index_range, plot_curtain
+from CRS_Catalog import CRSCatalog
+from CRS_Flight import CRSFlight
+
+VARIABLES = ('Ref','DopV')
+
+def build_pyramid(flight,outdir,factor=4,min_rays=2048,pool='max',rmin=5,rmax=20,block=262144):
+    """
+    Write the pyramid of a CRSFlight to the directory outdir
+    factor: number of rays pooled into one from each level to the next
+    min_rays: no level coarser than this number of rays is written
+    pool: 'max' or 'mean' pooling of the rays (see reduce_rays), or
+          'physical' averaging in physical units (see decimate_rays)
+    block: rays processed at once while building the coarser levels; the
+           flight is streamed granule by granule, so memory use is bounded
+    Return path of the pyramid directory
+    """
+    time = flight.time
+    n = len(time)
+    if(n==0): raise ValueError("The flight has no rays to build a pyramid from")
+    os.makedirs(outdir,exist_ok=True)
+
+    #Level 0: every ray of the flight, streamed granule by granule into memory-mapped files
+    level = os.path.join(outdir,'level0')
+    os.makedirs(level,exist_ok=True)
+    np.save(os.path.join(level,'time.npy'),time)
+    arrays,rng,k = {},None,0
+    for cur in flight.iter_curtains(rmin=rmin,rmax=rmax):
+        if(rng is None):
+            rng = cur.range
+            for vnm in VARIABLES:
+                arrays[vnm] = open_memmap(os.path.join(level,vnm+'.npy'),'w+',np.float32,(n,len(rng)))
+        if(k+len(cur)>n):
+            raise ValueError("The granules of the flight hold more rays than its time vector ({})".format(n))
+        for vnm in VARIABLES: arrays[vnm][k:k+len(cur)] = cur[vnm]
+        k += len(cur)
+    if(k!=n): #<--rows left unwritten would read back as reflectivity of 0 dBZ
+        raise ValueError("The granules of the flight hold {} rays, its time vector {}".format(k,n))
+    for vnm in VARIABLES: arrays[vnm].flush()
+    np.save(os.path.join(outdir,'range.npy'),rng)
+    sizes = [n]
+
+    #Coarser levels: pool 'factor' rays of the level below, one block at a time; 'physical'
+    #pooling averages factor**k rays of level 0 for level k, as its averages do not nest
+    level0 = level
+    while sizes[-1]//factor>=min_rays:
+        below,level = level,os.path.join(outdir,'level{}'.format(len(sizes)))
+        os.makedirs(level,exist_ok=True)
+        if(pool=='physical'): below,group = level0,factor**len(sizes)
+        else: group = factor
+        tb = np.load(os.path.join(below,'time.npy'),mmap_mode='r')
+        nb = len(tb)
+        nl = -(-nb//group)
+        step = max(group,block-block%group) #<--blocks hold whole groups
+        starts = np.arange(0,nb,group)
+        counts = np.diff(np.append(starts,nb))
+        np.save(os.path.join(level,'time.npy'),np.add.reduceat(tb,starts)/counts)
+        src = {vnm:np.load(os.path.join(below,vnm+'.npy'),mmap_mode='r') for vnm in VARIABLES}
+        dst = {vnm:open_memmap(os.path.join(level,vnm+'.npy'),'w+',np.float32,(nl,len(rng))) for vnm in VARIABLES}
+        for a in range(0,nb,step):
+            b = min(a+step,nb)
+            if(pool=='physical'):
+                out = decimate_rays({vnm:src[vnm][a:b] for vnm in VARIABLES},np.arange(0,b-a,group))
+            else:
+                out = {vnm:reduce_rays(src[vnm][a:b],np.arange(0,b-a,group),pool) for vnm in VARIABLES}
+            for vnm in VARIABLES: dst[vnm][a//group:-(-b//group)] = out[vnm]
+        for vnm in VARIABLES: dst[vnm].flush()
+        sizes.append(nl)
+
+    meta = {'campaign':flight.campaign,'fname':flight.files[0],'files':flight.files,
+            'factor':factor,'pool':pool,'sizes':sizes}
+    with open(os.path.join(outdir,'pyramid.json'),'w') as f:
+        json.dump(meta,f,indent=1)
+    return outdir
+
+class CRSPyramid:
+    """
+    Read-only view of a pyramid written by build_pyramid
+    All levels are memory-mapped; nothing is read until a window is requested
+    """
+    def __init__(self,path):
+        self.path = path
+        with open(os.path.join(path,'pyramid.json')) as f:
+            self.meta = json.load(f)
+        self.range = np.load(os.path.join(path,'range.npy'))
+        self.levels = []
+        for k in range(len(self.meta['sizes'])):
+            level = os.path.join(path,'level{}'.format(k))
+            self.levels.append({nm:np.load(os.path.join(level,nm+'.npy'),mmap_mode='r')
+                                for nm in ('time',)+VARIABLES})
+
+    def select_level(self,start,end,ncols):
+        """
+        Find the coarsest level that still has at least ncols rays in the
+        window [start,end] (datetime objects)
+        Return level number and the index range (i0,i1) of the window in it
+        """
+        for k in range(len(self.levels)-1,-1,-1):
+            i0,i1 = time_index_range(self.levels[k]['time'],start,end)
+            if(i1-i0>=ncols or k==0): return k,(i0,i1)
+
+    def read(self,start=None,end=None,ncols=1200):
+        """
+        Read the window [start,end] (datetime objects; None for the entire
+        flight) at the coarsest level that resolves it with ncols columns
+        Return CRSCurtain
+        """
+        start = start or datetime(1970,1,1)
+        end = end or datetime.max
+        k,(i0,i1) = self.select_level(start,end,ncols)
+        lev = self.levels[k]
+        return CRSCurtain(lev['time'][i0:i1],self.range,lev['Ref'][i0:i1],lev['DopV'][i0:i1],
+                          self.meta['campaign'],self.meta['fname'])
+
+    def plot(self,start=None,end=None,ncols=1200,reverseZ=True,show=True):
+        """
+        Plot the window [start,end] from the pyramid with plot_curtain
+        Return image object "fig"
+        """
+        return plot_curtain(self.read(start,end,ncols),reverseZ=reverseZ,pool=self.meta['pool'],show=show)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build the quick view pyramid of a CRS flight.')
+    parser.add_argument('data_dir',help='directory searched recursively for CRS files')
+    parser.add_argument('--campaign',required=True,choices=['impacts','goesrplt','olympex','iphex'])
+    parser.add_argument('--date',required=True,help='flight date in yyyy-mm-dd')
+    parser.add_argument('--outdir',default='.',help='directory where the pyramid is written')
+    parser.add_argument('--factor',type=int,default=4,help='rays pooled per level (default: 4)')
+    parser.add_argument('--pool',default='max',choices=['max','mean','physical'])
+    args = parser.parse_args(argv)
+
+    with CRSCatalog(args.data_dir) as catalog:
+        if(len(catalog.refresh().granules(args.campaign,args.date))==0):
+            print("%%No {} files found for {}".format(args.campaign,args.date))
+            return 1
+        flight = CRSFlight.from_catalog(catalog,args.campaign,args.date)
+    outdir = os.path.join(args.outdir,'{}_CRS_{}.pyr'.format(args.campaign,args.date.replace('-','')))
+    build_pyramid(flight,outdir,factor=args.factor,pool=args.pool)
+    print("Pyramid written to",outdir)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -20,14 +20,28 @@
 #Import Python packages and modules
 import re
 import sys
+import warnings
 import numpy as np
 import os
+import time
+import multiprocessing
+import h5py
+import xarray as xr
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 from datetime import datetime, timedelta 
-from matplotlib.colors import ListedColormap
+from matplotlib.colors import ListedColormap, BoundaryNorm
+from matplotlib.cm import ScalarMappable
 from matplotlib import cm 
 from pathlib import Path
+from collections import OrderedDict
+from scipy.io import netcdf_file
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from PIL import Image
+from CRS_Catalog import CRSCatalog, CRS_PATTERNS, CRS_VARIABLES, campaign_of, flight_date
+from CRS_Profile import stage, profiled
+from Time_Decoding import to_seconds, to_datetime64, to_datenum, hours_units, EPOCH_UNITS
 
 def select_campaign():
     """
@@ -62,24 +76,16 @@ def select_flight_impacts(dataDir):
     Return date in 'yyyymmdd' of the selected flight
     """
         
-    impacts_files = [path for path in Path(dataDir).rglob('IMPACTS_CRS_L1B_*.h5')]
-    impacts_files = [os.path.normpath(i) for i in impacts_files]
+    catalog = CRSCatalog(dataDir).refresh() #<--Index of the CRS files, updated for new/changed files only
+    flight_dates = catalog.flight_dates('impacts')
     
     #Check whether impacts files were found in the directory. Return 'None' if no
     #files were found. Continue through the code if files were found.
-    if len(impacts_files)==0:
+    if len(flight_dates)==0:
         print("%%There are no impacts data files in the currect directory. Try again%%")
         return None
     else: 
         pass
-    
-    flight_dates = [] 
-    
-    for i in impacts_files:
-        fname_split = re.split(r'_', os.path.basename(i))
-        start_date = fname_split[4]
-        
-        flight_dates.append(datetime.strptime(start_date[:8], '%Y%m%d').date().isoformat())
    
     print('Flight Dates:')
     for i in flight_dates:
@@ -109,8 +115,8 @@ def select_flight_impacts(dataDir):
             except ValueError:
                 print('\n%%Invalid flight date format%% \nTry again.\n')
                 
-    selected_files = [path for path in Path(dataDir).rglob('IMPACTS_CRS_L1B_*'+fdate.replace('-','')+'*.h5')]
-    selected_files = [os.path.normpath(i) for i in selected_files]
+    selected_files = [os.path.normpath(g['path']) for g in catalog.granules('impacts',fdate)]
+    catalog.close()
     return selected_files
 
 def select_time_impacts(selected_files):
@@ -159,25 +165,17 @@ def select_flight_goesrplt(dataDir):
     User selects among the available flights from the files on their computer 
     Return date in 'yyyymmdd' of the selected flight
     """
-    goesrplt_files = [path for path in Path(dataDir).rglob('GOESR_CRS_L1B_*.nc')]
-    goesrplt_files = [os.path.normpath(i) for i in goesrplt_files]         
+    catalog = CRSCatalog(dataDir).refresh() #<--Index of the CRS files, updated for new/changed files only
+    flight_dates = catalog.flight_dates('goesrplt')
     
     #Check whether goesrplt files were found in the directory. Return 'None' if no
     #files were found. Continue through the code if files were found.
-    if len(goesrplt_files)==0:
+    if len(flight_dates)==0:
         print("%%There are no goesrplt data files in the currect directory. Try again%%")
         return None, None
     else: 
         pass
     
-    flight_dates = [] 
-    
-    for i in goesrplt_files:
-        fname_split = re.split(r'_', os.path.basename(i))
-        start_date = fname_split[3]
-        
-        flight_dates.append(datetime.strptime(start_date, '%Y%m%d').date().isoformat())
-   
     print('Flight Dates:')
     for i in flight_dates:
         print('{}'.format(i))
@@ -206,8 +204,8 @@ def select_flight_goesrplt(dataDir):
             except ValueError:
                 print('\n%%Invalid flight date format%% \nTry again.\n')
                 
-    selected_files = [path for path in Path(dataDir).rglob('GOESR_CRS_L1B_*'+fdate.replace('-','')+'*.nc')]
-    selected_files = [os.path.normpath(i) for i in selected_files]
+    selected_files = [os.path.normpath(g['path']) for g in catalog.granules('goesrplt',fdate)]
+    catalog.close()
     return os.path.basename(selected_files[0]), fdate.replace('-','') 
 
 
@@ -217,25 +215,17 @@ def select_flight_olympex(dataDir):
     Returns the date in 'yyyymmdd' of the selected flight
     """
         
-    olympex_files = [path for path in Path(dataDir).rglob('olympex_CRS_*.nc')] 
-    olympex_files = [os.path.normpath(i) for i in olympex_files]
+    catalog = CRSCatalog(dataDir).refresh() #<--Index of the CRS files, updated for new/changed files only
+    flight_dates = catalog.flight_dates('olympex')
     
     #Check whether olympex files were found in the directory. Return 'None' if no
     #files were found. Continue through the code if files were found.
-    if len(olympex_files)==0:
+    if len(flight_dates)==0:
         print("%%There are no olympex data files in the currect directory. Try again%%")
         return None, None
     else: 
         pass
     
-    flight_dates = [] 
-    
-    for i in olympex_files:
-        fname_split = re.split(r'_|-', os.path.basename(i))
-        start_date = fname_split[2]
-        
-        flight_dates.append(datetime.strptime(start_date, '%Y%m%d').date().isoformat())
-   
     print('Flight Dates:')
     for i in flight_dates:
         print('{}'.format(i))
@@ -264,8 +254,8 @@ def select_flight_olympex(dataDir):
             except ValueError:
                 print('\n%%Invalid flight date format%% \nTry again.\n')
                 
-    selected_files = [path for path in Path(dataDir).rglob('olympex_CRS_'+fdate.replace('-','')+'*.nc')]
-    selected_files = [os.path.normpath(i) for i in selected_files]
+    selected_files = [os.path.normpath(g['path']) for g in catalog.granules('olympex',fdate)]
+    catalog.close()
     return selected_files,fdate.replace('-','')
 
 
@@ -315,25 +305,17 @@ def select_flight_iphex(dataDir):
     Return date in 'yyyymmdd' of the selected flight
     """
         
-    iphex_files = [path for path in Path(dataDir).rglob('IPHEX_CRS_L1B_*.nc')]
-    iphex_files = [os.path.normpath(i) for i in iphex_files]
+    catalog = CRSCatalog(dataDir).refresh() #<--Index of the CRS files, updated for new/changed files only
+    flight_dates = catalog.flight_dates('iphex')
     
     #Check whether iphex files were found in the directory. Return 'None' if no
     #files were found. Continue through the code if files were found.
-    if len(iphex_files)==0:
+    if len(flight_dates)==0:
         print("%%There are no iphex data files in the currect directory. Try again%%")
         return None, None
     else: 
         pass
     
-    flight_dates = [] 
-    
-    for i in iphex_files:
-        fname_split = re.split(r'_|-', os.path.basename(i))
-        start_date = fname_split[3]
-        
-        flight_dates.append(datetime.strptime(start_date, '%Y%m%d').date().isoformat())
-   
     print('Flight Dates:')
     for i in flight_dates:
         print('{}'.format(i))
@@ -362,8 +344,8 @@ def select_flight_iphex(dataDir):
             except ValueError:
                 print('\n%%Invalid flight date format%% \nTry again.\n')
                 
-    selected_files = [path for path in Path(dataDir).rglob('IPHEX_CRS_L1B_'+fdate.replace('-','')+'*.nc')]
-    selected_files = [os.path.normpath(i) for i in selected_files]
+    selected_files = [os.path.normpath(g['path']) for g in catalog.granules('iphex',fdate)]
+    catalog.close()
     return selected_files,fdate.replace('-','')
 
     
@@ -447,7 +429,7 @@ def CRSsubset(ds,t1=None,t2=None):
     if(t1 and t2):
         t1=totime(t1)
         t2=totime(t2)
-        return ds.where((ds.timed>=t1) & (ds.timed<=t2),drop=True)
+        return isel_hours(ds,'timed',t1,t2)
 
     while True:
         inp=input("\n*Select subset starting in [hh:mm:ss] UTC"+
@@ -470,7 +452,7 @@ def CRSsubset(ds,t1=None,t2=None):
             break
 
     #--Make sure selected period within flight timeframe
-    cs=ds.where((ds.timed>=t1) & (ds.timed<=t2),drop=True)
+    cs=isel_hours(ds,'timed',t1,t2)
     if(len(cs.timed)==0): print("%%No data found in selected period."+
                                "\n  Data missing or selection beyond data range.")
     return cs
@@ -492,7 +474,7 @@ def CRSsubset_goesrplt(ds,t1=None,t2=None):
     if(t1 and t2):
         t1=totime(t1)
         t2=totime(t2)
-        return ds.where((ds.time>=t1) & (ds.time<=t2),drop=True)
+        return isel_hours(ds,'time',t1,t2)
 
     while True:
         inp=input("\n*Select subset starting in [hh:mm:ss] UTC"+
@@ -515,11 +497,37 @@ def CRSsubset_goesrplt(ds,t1=None,t2=None):
             break
 
     #--Make sure selected period within flight timeframe
-    cs=ds.where((ds.time>=t1) & (ds.time<=t2),drop=True)
+    cs=isel_hours(ds,'time',t1,t2)
     if(len(cs.time)==0): print("%%No data found in selected period."+
                                "\n  Data missing or selection beyond data range.")
     return cs
 
+def time_index_range(timeUTC,start,end,t0=datetime(1970,1,1)):
+    """
+    Locate the rays of a monotonic time vector that fall in [start,end]
+    timeUTC: seconds since t0 of every ray (1-D, sorted ascending)
+    start,end: interval limits as datetime objects or seconds since t0
+    Both ends are found by binary search, so the cost does not grow with
+    the length of the flight
+    Return half-open index range (i0,i1); timeUTC[i0:i1] is the subset
+    """
+    if isinstance(start,datetime): start=(start-t0).total_seconds()
+    if isinstance(end,datetime): end=(end-t0).total_seconds()
+    i0 = int(np.searchsorted(timeUTC,start,side='left'))
+    i1 = int(np.searchsorted(timeUTC,end,side='right'))
+    return i0,max(i0,i1)
+
+def isel_hours(ds,tname,t1,t2):
+    """
+    Subset a GOES-R PLT, OLYMPEX or IPHEX CRS dataset (ds) to the rays whose
+    time (tname, hours UTC, sorted ascending) is in [t1,t2]
+    The rays are located by binary search and selected by index, so the data
+    variables stay lazy and only the selected rays are read when used
+    Return CRS subset of the interval
+    """
+    i0,i1 = time_index_range(ds[tname].values,float(t1),float(t2))
+    return ds.isel({ds[tname].dims[0]:slice(i0,i1)})
+
 def CRSsubset_impacts(ds,t0,t1=None, d1=None, t2=None, d2=None):
     """
     Subset CRS dataset with selected time and date interval [t1,d1,t2,d2] 
@@ -535,19 +543,22 @@ def CRSsubset_impacts(ds,t0,t1=None, d1=None, t2=None, d2=None):
       4. Enter for interval end date d2
          in YYYY-MM-DD
     If user enters subset into function directly, t1,d1,t2,and d2 must be strings
-    Input CRS fullset datase (ds)
-    Return CRS subset (cs) of selected interval
+    Input CRS fullset datase (ds), an open IMPACTS file or a stitched CRSFlight
+    Return index range (i0,i1) of the subset; the selected rays are [i0:i1]
+    of the TimeUTC, dBZe and Velocity_corrected arrays (or of the flight time)
     """
-    time_data = ds['Time']['Data']['TimeUTC']
-    time_utc = [(t0+timedelta(seconds=float(s))) for s in time_data] #datetime objects
-    str_times = [x.strftime("%H:%M:%S") for x in time_utc]
-    time_dates = [x.strftime("%Y-%m-%d") for x in time_utc]
+    if hasattr(ds,'time'): time_data = ds.time #<--stitched flight, seconds since epoch
+    else: time_data = ds['Time']['Data']['TimeUTC'][:] #<--seconds since epoch
     
     if(t1 and t2):
         start=totime_impacts(t1,d1)
         end=totime_impacts(t2,d2)
-        subset = [num for num in time_utc if num >=start and num <=end]
-        return subset
+        return time_index_range(time_data,start,end)
+
+    #--Only the first and last rays are converted; they bound the valid dates
+    st = t0+timedelta(seconds=float(time_data[0]))
+    et = t0+timedelta(seconds=float(time_data[-1]))
+    time_dates = [(st.date()+timedelta(days=n)).isoformat() for n in range((et.date()-st.date()).days+1)]
 
     while True:
         inp=input("\n*Select subset starting time in [hh:mm:ss] UTC"+
@@ -555,9 +566,8 @@ def CRSsubset_impacts(ds,t0,t1=None, d1=None, t2=None, d2=None):
                   "\n or Q to quit: \n")
         if(inp=='Q'): return sys.exit("User selected 'quit'")
         elif(inp=='ALL'):
-            subset = time_utc
-            return subset
-        elif inp in str_times:
+            return 0,len(time_data)
+        elif totime(inp) is not None:
             t1=inp
             break
         else:
@@ -573,7 +583,7 @@ def CRSsubset_impacts(ds,t0,t1=None, d1=None, t2=None, d2=None):
     while True:
         inp3=input("\n*Select subset ending time in [hh:mm:ss] UTC or Q to quit: ")
         if(inp3=='Q'): return sys.exit("User selected 'quit'")
-        elif inp3 in str_times:
+        elif totime(inp3) is not None:
             t2=inp3
             break
         else:
@@ -587,38 +597,459 @@ def CRSsubset_impacts(ds,t0,t1=None, d1=None, t2=None, d2=None):
         else:
             print(inp4,"is not a valid flight date and/or format. Try again.")
         
-    start=totime_impacts(inp,inp2)
-    end=totime_impacts(inp3,inp4)
-    subset = [num for num in time_utc if num >=start and num <=end]
+    start=totime_impacts(t1,d1)
+    end=totime_impacts(t2,d2)
+    i0,i1 = time_index_range(time_data,start,end)
     
     #--Make sure selected period within flight timeframe
-    if(len(subset)==0): print("%%No data found in selected period."+
-                               "\n  Data missing or selection beyond data range.")
-    return subset 
+    if(i1==i0): print("%%No data found in selected period."+
+                      "\n  Data missing or selection beyond data range.")
+    return i0,i1 
+
+def gate_index_range(rng,rmin=5,rmax=20):
+    """
+    Locate the contiguous block of range gates inside [rmin,rmax] km
+    rng: range from radar of every gate in [km]
+    Return half-open gate index range (g0,g1)
+    """
+    inside = np.flatnonzero((rng>=rmin) & (rng<=rmax))
+    if(len(inside)==0): return 0,0
+    return int(inside[0]),int(inside[-1])+1
+
+def chunk_blocks(i0,i1,chunk):
+    """
+    Split the index range [i0,i1) into blocks aligned to the dataset chunk
+    length so that every HDF5 chunk is read and decompressed only once
+    Return list of (a,b) block limits
+    """
+    if(not chunk): return [(i0,i1)] if i1>i0 else []
+    edges = list(range((i0//chunk+1)*chunk,i1,chunk))
+    return list(zip([i0]+edges,edges+[i1]))
+
+def as_float32(a):
+    """
+    Return a as a float32 array; float32 data of either byte order (e.g.
+    big-endian views of a memory-mapped netCDF-3 file) are not copied
+    """
+    a = np.asarray(a)
+    if(a.dtype.kind=='f' and a.dtype.itemsize==4): return a
+    return a.astype(np.float32)
+
+#Variables a curtain can hold; Ref and DopV are always read
+CURTAIN_VARIABLES = ('Ref','DopV','SpW','LDR')
+
+#Names the optional variables are stored under in the CRS files, tried in order;
+#they are read only when asked for (extra=...) and present in the file
+OPTIONAL_VARIABLES = {'SpW':('SpectrumWidth','Spectrum_Width','spw','sw','swku'),
+                      'LDR':('LDR','ldr','ldrku')}
+
+def optional_name(names,vnm):
+    """
+    Return the name optional variable vnm is stored under among names (the
+    variables of a file), or None when the file does not have it
+    """
+    return next((n for n in OPTIONAL_VARIABLES[vnm] if n in names),None)
+
+class CRSCurtain:
+    """
+    Time-height curtain of CRS data, shared by every campaign reader and
+    consumed by the plot and export functions
+      time:  seconds since 1970-01-01 UTC of every ray, float64 (ray,)
+      range: range from radar/aircraft of every gate in [km], float32 (gate,)
+      Ref:   radar reflectivity in [dBZ], float32 of either byte order (ray,gate)
+      DopV:  Doppler velocity in [m/s], float32 of either byte order (ray,gate)
+      campaign: name of the campaign dataset
+      fname: path of the CRS file the curtain was read from
+      SpW, LDR: optional spectrum width in [m/s] and linear depolarization
+             ratio in [dB] (ray,gate); None unless read (see OPTIONAL_VARIABLES)
+    curtain['Ref'] and curtain['DopV'] also work, so a curtain can be passed
+    where a datap dictionary is expected
+    """
+    __slots__ = ('time','range','Ref','DopV','SpW','LDR','campaign','fname')
+
+    def __init__(self,time,rng,Ref,DopV,campaign=None,fname=None,SpW=None,LDR=None):
+        self.time = np.asarray(time,dtype=np.float64)
+        self.range = np.asarray(rng,dtype=np.float32)
+        self.Ref = as_float32(Ref)
+        self.DopV = as_float32(DopV)
+        self.SpW = None if SpW is None else as_float32(SpW)
+        self.LDR = None if LDR is None else as_float32(LDR)
+        self.campaign,self.fname = campaign,fname
+
+    def __len__(self):
+        return len(self.time)
+
+    def __getitem__(self,vnm):
+        return getattr(self,vnm)
+
+    def variables(self):
+        """Return names of the variables the curtain holds"""
+        return [vnm for vnm in CURTAIN_VARIABLES if getattr(self,vnm) is not None]
+
+    def datetimes(self):
+        """Return ray times as a datetime64[us] array"""
+        return to_datetime64(self.time,EPOCH_UNITS)
+
+    def start(self):
+        """Return datetime object of the first ray"""
+        return datetime(1970,1,1)+timedelta(seconds=float(self.time[0]))
+
+    def end(self):
+        """Return datetime object of the last ray"""
+        return datetime(1970,1,1)+timedelta(seconds=float(self.time[-1]))
+
+def read_impacts_window(ds,i0,i1,rmin=5,rmax=20,extra=()):
+    """
+    Read only the selected rays [i0,i1) and the range gates within
+    [rmin,rmax] km from an open IMPACTS CRS HDF5 file (ds)
+    dBZe and Velocity_corrected are read hyperslab by hyperslab, one block
+    per HDF5 chunk along time, directly into preallocated float32 arrays;
+    memory use follows the requested window, not the size of the granule
+    extra: optional variables to read as well when present, e.g. ('SpW','LDR')
+    Return CRSCurtain of the window
+    """
+    with stage('read',file=ds.filename,rays=i1-i0):
+        timeUTC = ds['Time']['Data']['TimeUTC'][i0:i1]
+        rng = ds['Products']['Information']['Range'][:]/1000 #<--[m] to [km]
+        g0,g1 = gate_index_range(rng,rmin,rmax)
+
+        datap = {}
+        names = [('Ref','dBZe'),('DopV','Velocity_corrected')]
+        names += [(vnm,optional_name(ds['Products']['Data'],vnm)) for vnm in extra]
+        for vnm,h5nm in names:
+            if(h5nm is None): continue #<--optional variable not in this file
+            dset = ds['Products']['Data'][h5nm]
+            buf = np.empty((i1-i0,g1-g0),dtype=np.float32)
+            chunk = dset.chunks[0] if dset.chunks else None
+            for a,b in chunk_blocks(i0,i1,chunk):
+                dset.read_direct(buf,source_sel=np.s_[a:b,g0:g1],dest_sel=np.s_[a-i0:b-i0,:])
+            datap[vnm] = buf
+    return CRSCurtain(timeUTC,rng[g0:g1],datap.pop('Ref'),datap.pop('DopV'),'impacts',ds.filename,**datap)
+
+def nc_curtain(ds,campaign,t0,rmin=5,rmax=20,fname=None,extra=()):
+    """
+    Build a curtain from an open (or subset) GOES-R PLT, OLYMPEX or IPHEX
+    CRS dataset (ds); only the range gates within [rmin,rmax] km are read
+    t0: datetime object of the flight date the hours UTC count from
+    extra: optional variables to read as well when present, e.g. ('SpW','LDR')
+    Return CRSCurtain
+    """
+    tname,refname,dopname = CRS_VARIABLES[campaign]
+    with stage('read',file=fname,rays=ds.sizes[ds[tname].dims[0]]):
+        rng = ds['range'].values/1000 #<--[m] to [km]
+        g0,g1 = gate_index_range(rng,rmin,rmax)
+        secs = to_seconds(ds[tname].values,hours_units(t0))
+        opt = {vnm:optional_name(ds.variables,vnm) for vnm in extra}
+        return CRSCurtain(secs,rng[g0:g1],ds[refname][:,g0:g1].values,
+                          ds[dopname][:,g0:g1].values,campaign,fname,
+                          **{vnm:ds[n][:,g0:g1].values for vnm,n in opt.items() if n})
+
+def read_curtain_impacts(fileCRS,start=None,end=None,rmin=5,rmax=20,extra=()):
+    """
+    Read an IMPACTS CRS file without user interaction
+    start,end: datetime limits of the subset; None reads the entire flight
+    extra: optional variables to read as well when present
+    Return CRSCurtain
+    """
+    with h5py.File(fileCRS,'r') as ds:
+        timeUTC = ds['Time']['Data']['TimeUTC'][:]
+        i0,i1 = (0,len(timeUTC)) if start is None else time_index_range(timeUTC,start,end)
+        return read_impacts_window(ds,i0,i1,rmin,rmax,extra)
+
+#Memory-mapped netCDF-3 CRS files by path, least recently used first: (size and mtime, dataset)
+_NC3_FILES = OrderedDict()
+MAX_NC3_FILES = 8 #<--files kept mapped at once
+
+#Attributes of the netCDF-3 variables and files kept in the datasets of open_CRS_nc
+NC3_ATTRIBUTES = ('units','long_name','standard_name','_FillValue','missing_value','scale_factor','add_offset',
+                  'valid_min','valid_max','valid_range','title','institution','source','history','Conventions')
+
+def nc3_attributes(obj):
+    """Return dictionary of the NC3_ATTRIBUTES that a scipy netcdf_file or netcdf_variable has"""
+    attrs = {}
+    for nm in NC3_ATTRIBUTES:
+        value = getattr(obj,nm,None)
+        if(value is not None): attrs[nm] = value.decode() if isinstance(value,bytes) else value
+    return attrs
+
+def open_CRS_nc(fileCRS):
+    """
+    Open a GOES-R PLT, OLYMPEX or IPHEX CRS file (netCDF-3 classic) by
+    memory-mapping it; use in place of xr.open_dataset(fileCRS,decode_cf=False)
+    The variables of the dataset are views of the mapped file, stored
+    big-endian as in the file, so opening parses only the header and no data
+    are copied; values are read from the page cache when they are used
+    The datasets of the MAX_NC3_FILES files used last are kept and reused
+    while the file size and modification time do not change, so repeated
+    renders of a flight do not open it again; older ones are dropped (see
+    close_CRS_nc). A file replaced by a new one is mapped again; one rewritten
+    in place changes under the arrays that view it, as with any mapping
+    Return xarray Dataset
+    """
+    path = os.path.abspath(fileCRS)
+    st = os.stat(path)
+    key = (st.st_size,st.st_mtime_ns)
+    if(path in _NC3_FILES):
+        if(_NC3_FILES[path][0]==key):
+            _NC3_FILES.move_to_end(path)
+            return _NC3_FILES[path][1]
+        close_CRS_nc(path) #<--the file changed since it was mapped
+    with stage('open',file=path):
+        nc = netcdf_file(path,'r',mmap=True)
+        ds = xr.Dataset({nm:(var.dimensions,var.data,nc3_attributes(var)) for nm,var in nc.variables.items()},
+                        attrs=nc3_attributes(nc))
+        #The file handle is closed now; the mapping itself lives as long as the arrays that view it
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore',RuntimeWarning)
+            nc.close()
+    _NC3_FILES[path] = (key,ds)
+    while(len(_NC3_FILES)>MAX_NC3_FILES):
+        close_CRS_nc(next(iter(_NC3_FILES)))
+    return ds
+
+def close_CRS_nc(fileCRS=None):
+    """
+    Drop a file (None: every file) from the datasets kept by open_CRS_nc;
+    its mapping is unmapped once no array in use (e.g. a curtain read from
+    it) views it any more
+    """
+    paths = list(_NC3_FILES) if fileCRS is None else [os.path.abspath(fileCRS)]
+    for path in paths:
+        _NC3_FILES.pop(path,None)
+
+def read_curtain_nc(fileCRS,start=None,end=None,rmin=5,rmax=20,extra=()):
+    """
+    Read a GOES-R PLT, OLYMPEX or IPHEX CRS file without user interaction
+    start,end: datetime limits of the subset; None reads the entire flight
+    extra: optional variables to read as well when present
+    Return CRSCurtain
+    """
+    campaign = campaign_of(fileCRS)
+    t0 = datetime.strptime(flight_date(fileCRS,campaign),'%Y%m%d') #<--Base date of the hours UTC
+    with open_CRS_nc(fileCRS) as ds:
+        secs = ds[CRS_VARIABLES[campaign][0]].values*3600.
+        i0,i1 = (0,len(secs)) if start is None else time_index_range(secs,start,end,t0)
+        return nc_curtain(ds.isel({ds[CRS_VARIABLES[campaign][0]].dims[0]:slice(i0,i1)}),
+                          campaign,t0,rmin,rmax,fileCRS,extra)
+
+#Reader of each campaign dataset; a new campaign plugs in by adding its reader here
+CRS_READERS = {'impacts':read_curtain_impacts,'goesrplt':read_curtain_nc,
+               'olympex':read_curtain_nc,'iphex':read_curtain_nc}
+
+def read_CRS_window(fileCRS,campaign,start=None,end=None,rmin=5,rmax=20,extra=()):
+    """
+    Read a CRS file of any campaign without user interaction
+    fileCRS: path of the CRS file
+    campaign: 'impacts', 'goesrplt', 'olympex' or 'iphex'
+    start,end: datetime limits of the subset; None reads the entire flight
+    rmin,rmax: range gates [km] to read
+    extra: optional variables to read as well when present, e.g. ('SpW','LDR')
+    Return CRSCurtain
+    """
+    return CRS_READERS[campaign](fileCRS,start,end,rmin,rmax,extra)
+
+def read_CRS_rows(fileCRS,campaign,i0=0,i1=None,rmin=5,rmax=20,extra=()):
+    """
+    Read the rays [i0,i1) of a CRS file of any campaign by index, so no ray
+    is lost converting its time to a datetime and back; i1=None reads to
+    the last ray
+    Return CRSCurtain
+    """
+    if(campaign=='impacts'):
+        with h5py.File(fileCRS,'r') as ds:
+            n = len(ds['Time']['Data']['TimeUTC'])
+            return read_impacts_window(ds,i0,n if i1 is None else min(i1,n),rmin,rmax,extra)
+    tname = CRS_VARIABLES[campaign][0]
+    t0 = datetime.strptime(flight_date(fileCRS,campaign),'%Y%m%d') #<--Base date of the hours UTC
+    with open_CRS_nc(fileCRS) as ds:
+        return nc_curtain(ds.isel({ds[tname].dims[0]:slice(i0,i1)}),campaign,t0,rmin,rmax,fileCRS,extra)
 
 def radarCmaps():
     """
-    Make Color maps for radar Ref and DopV
+    Make Color maps for radar Ref and DopV (and SpW and LDR)
     User can use predefined color maps in cmaps
     Return color maps
     """
-    basecmp = cm.get_cmap('gist_ncar', 256)
+    basecmp = plt.get_cmap('gist_ncar', 256)
     newcols = basecmp(np.linspace(0, 1, 200))
-    topoff  = cm.get_cmap('gray', 128)
+    topoff  = plt.get_cmap('gray', 128)
     combo   = np.vstack((newcols[:180,:],topoff(np.linspace(0.7, 1, 20))))
     aerocmp = ListedColormap(combo, name='aerocmp')
-    cmaps  ={'Ref':aerocmp,'DopV':cm.gist_ncar}
+    cmaps  ={'Ref':aerocmp,'DopV':cm.gist_ncar,'SpW':cm.gist_ncar,'LDR':cm.gist_ncar}
     return cmaps
 
-def plot_CRS2D(datap,xvar,ZB,plot_start,plot_end,reverseZ=True):
+def cell_edges(c):
+    """
+    Cell edges for a vector of cell centres c (midpoints between neighbours,
+    with the outer edges extrapolated by half a cell)
+    Return array of len(c)+1 edges
+    """
+    c = np.asarray(c,dtype=np.float64)
+    if(len(c)<2): return np.array([c[0]-0.5,c[0]+0.5]) if len(c) else c
+    mid = 0.5*(c[1:]+c[:-1])
+    return np.concatenate(([2*c[0]-mid[0]],mid,[2*c[-1]-mid[-1]]))
+
+def pool_time(var,xe,ncols,how='max'):
+    """
+    Reduce a curtain along time to at most ncols columns
+    var: data of shape (ray,gate)
+    xe: time edges of the rays, len(var)+1 values
+    ncols: target number of columns, e.g. the axis width in pixels
+    how: 'max' keeps the strongest echo of each column, 'mean' averages;
+         missing values (NaN) are ignored either way
+    Return pooled data (column,gate) and the time edges of the columns
+    """
+    nray = len(var)
+    if(nray<=ncols): return np.asarray(var,dtype=np.float32),np.asarray(xe)
+    starts = group_starts(nray,nrays=ncols)
+    return reduce_rays(var,starts,how),np.asarray(xe)[np.append(starts,nray)]
+
+def group_starts(nray,factor=None,nrays=None):
+    """
+    Split nray rays into consecutive groups of factor rays, or into at most
+    nrays groups of (nearly) equal size
+    Return index of the first ray of every group
+    """
+    if(factor): return np.arange(0,nray,int(factor))
+    return np.unique(np.linspace(0,nray,min(nrays,nray)+1).astype(int))[:-1]
+
+def reduce_rays(var,starts,how='max'):
+    """
+    Reduce consecutive groups of rays of var (ray,gate); group k holds rays
+    starts[k] to starts[k+1]-1 and the last group runs to the end
+    how: 'max' or 'mean'; missing values (NaN) are ignored
+    Return float32 array (group,gate)
+    """
+    var = np.asarray(var,dtype=np.float32)
+    if(how=='max'):
+        return np.fmax.reduceat(var,starts,axis=0)
+    valid = ~np.isnan(var)
+    total = np.add.reduceat(np.where(valid,var,0),starts,axis=0)
+    count = np.add.reduceat(valid,starts,axis=0,dtype=np.int32)
+    with np.errstate(invalid='ignore',divide='ignore'):
+        return (total/count).astype(np.float32)
+
+#Along-track averaging of decimate_rays; every variable is averaged in the units it adds up in:
+#  Ref, LDR: mean of the linear values (Z in mm^6/m^3, depolarization ratio), returned in dB
+#  DopV: reflectivity-weighted mean (echo power weighted, as in a longer dwell), or plain mean
+#  SpW:  width of the combined Doppler spectrum: square root of the weighted mean of
+#        SpW^2+DopV^2 about the combined mean velocity
+def decimation_sums(datap,starts,dop='weighted',fill=None):
+    """
+    Sums over consecutive groups of rays (group k runs from starts[k] to
+    starts[k+1]-1, the last to the end) from which decimate_rays forms its
+    averages; sums of the same groups from different blocks can be added
+    before they are finished with finish_decimation
+    datap: CRSCurtain or dictionary with Ref and any of DopV, SpW and LDR
+    dop: 'weighted' (by linear Z; rays without reflectivity get no weight)
+         or 'mean'
+    fill: value marking missing data besides NaN and +-inf
+    Return dictionary of variable -> tuple of float64 sums (group,gate)
+    """
+    nray = len(datap['Ref'])
+    sizes = np.diff(np.append(starts,nray))
+    step = sizes[0] if len(sizes) and starts[0]==0 and (sizes[:-1]==sizes[0]).all() and sizes[-1]<=sizes[0] else None
+    def valid(vnm):
+        var = np.asarray(datap[vnm],dtype=np.float32)
+        ok = np.isfinite(var) if fill is None else np.isfinite(var) & (var!=fill)
+        return np.where(ok,var,np.float32(0)),ok
+    def gsum(a):
+        if(step is None): return np.add.reduceat(a,starts,axis=0,dtype=np.float64)
+        #Groups of equal size (but the last): summing a reshaped view is several times faster
+        m = (nray//step)*step
+        head = a[:m].reshape((-1,step)+a.shape[1:]).sum(axis=1,dtype=np.float64)
+        if(m==nray): return head
+        return np.concatenate((head,a[m:].sum(axis=0,dtype=np.float64,keepdims=True)))
+    def has(vnm):
+        return (datap[vnm] if isinstance(datap,CRSCurtain) else datap.get(vnm)) is not None
+    def linear(db):
+        return np.exp(db*np.float32(np.log(10)/10)) #<--10**(dB/10)
+
+    sums = {}
+    ref,ok = valid('Ref')
+    z = np.where(ok,linear(ref),np.float32(0))
+    sums['Ref'] = (gsum(z),gsum(ok))
+    if(has('DopV')):
+        v,ok = valid('DopV')
+        w = np.where(ok,z if dop=='weighted' else np.float32(1),np.float32(0))
+        sums['DopV'] = (gsum(w*v),gsum(w))
+        if(has('SpW')):
+            sw,ok = valid('SpW')
+            w = np.where(ok,w,np.float32(0))
+            sums['SpW'] = (gsum(w*(sw*sw+v*v)),gsum(w*v),gsum(w))
+    if(has('LDR')):
+        ldr,ok = valid('LDR')
+        sums['LDR'] = (gsum(np.where(ok,linear(ldr),np.float32(0))),gsum(ok))
+    return sums
+
+def finish_decimation(sums):
+    """
+    Form the averages from the sums of decimation_sums; groups without
+    valid values are NaN
+    Return dictionary of variable -> float32 array (group,gate)
+    """
+    out = {}
+    with np.errstate(invalid='ignore',divide='ignore'):
+        for vnm,part in sums.items():
+            if(vnm in ('Ref','LDR')):
+                val = 10*np.log10(part[0]/part[1])
+            elif(vnm=='SpW'):
+                m1 = part[1]/part[2]
+                val = np.sqrt(np.maximum(part[0]/part[2]-m1*m1,0))
+            else:
+                val = part[0]/part[1]
+            out[vnm] = val.astype(np.float32)
+    return out
+
+#Variables each decimated variable is formed from
+DECIMATION_INPUTS = {'Ref':('Ref',),'DopV':('Ref','DopV'),'SpW':('Ref','DopV','SpW'),'LDR':('Ref','LDR')}
+
+def decimate_rays(datap,starts,dop='weighted',fill=None):
+    """
+    Average consecutive groups of rays of every variable of datap in
+    physical units (see decimation_sums for the arguments)
+    Return dictionary of variable -> float32 array (group,gate)
+    """
+    return finish_decimation(decimation_sums(datap,starts,dop,fill))
+
+def decimate_curtain(cur,factor=None,nrays=None,dop='weighted',fill=None):
+    """
+    Shrink a CRSCurtain along track by averaging groups of factor rays, or
+    to at most nrays rays, with the physically consistent averages of
+    decimate_rays; use before plotting or exporting a long flight
+    Return CRSCurtain timed at the mean time of every group
+    """
+    if(len(cur)==0): return cur
+    starts = group_starts(len(cur),factor,nrays)
+    out = decimate_rays(cur,starts,dop,fill)
+    time = np.add.reduceat(cur.time,starts)/np.diff(np.append(starts,len(cur)))
+    return CRSCurtain(time,cur.range,out.pop('Ref'),out.pop('DopV'),cur.campaign,cur.fname,**out)
+
+def headless():
+    """
+    Return True when matplotlib renders without a display (Agg or a file
+    backend), where plt.show() has nothing to show
+    """
+    return plt.get_backend().lower() in ('agg','cairo','pdf','pgf','ps','svg','template')
+
+@profiled('plot')
+def plot_CRS2D(datap,xvar,ZB,plot_start,plot_end,reverseZ=True,method='raster',pool='max',show=None):
     """
     datap: Variables to be plotted, reflectivity and Doppler velocity
-    xvar: Horizontal coord., we use [time]
+           (dictionary or CRSCurtain)
+    xvar: Horizontal coord., we use [time] as datetime objects or datetime64
     ZB: Vertical coord., we use radar [range]
         ZB=0 means at radar/airccraft location/altitude;
         ZB largest means near the ground
     plot_start: Plot start date/time object for plot title
     plot_end: Plot end date/time object for plot title
+    method: 'raster' pools the curtain to the pixel columns of the axes and
+         draws it with one pcolormesh per panel; 'contour' uses contourf
+    pool: 'max' or 'mean' pooling along time for the raster method, or
+         'physical' for the averages of decimate_rays (Ref in linear Z,
+         DopV weighted by Z); 'physical' needs Ref in datap
+    show: display the figure; by default only when there is a display to
+         show it on (see headless)
     Note that reverseZ=True would have data away from radar (large ZB) plotted
          at bottom, and near radar range plotted at top.
     Return image object "fig" than can be used to save the plot
@@ -627,28 +1058,42 @@ def plot_CRS2D(datap,xvar,ZB,plot_start,plot_end,reverseZ=True):
     units  ={'Ref':'[dBZ]',       'DopV':'[m/s]'}
     levs   ={'Ref':np.arange(-20,40,2), 'DopV':np.arange(-20,20,2)} #User can adjust colorscale range and intervals
     
+    xnum = mdates.date2num(xvar) #<--Time as matplotlib date numbers
+    
     fig, axs = plt.subplots(nrows=2, ncols=1, figsize=(12, 6))
     fig.tight_layout()
     fig.subplots_adjust(top=0.9,bottom=0.1,hspace=0.2)
 
+    xe = cell_edges(xnum)
+    ncols = max(1,int(axs[0].get_window_extent().width))
+    if(method=='raster' and pool=='physical' and len(xnum)>ncols):
+        #Average the variables together, in physical units, down to the pixel columns of the axes
+        starts = group_starts(len(xnum),nrays=ncols)
+        datap = decimate_rays({vnm:datap[vnm] for vnm in vnames},starts)
+        xe = xe[np.append(starts,len(xnum))]
+
     for iv,vnm in enumerate(vnames):
         ax,lev,unit,cmp = axs[iv],levs[vnm],units[vnm],radarCmaps()[vnm]
-        var=np.array([*zip(*datap[vnm])]) #<--move time to col dim (x), and altitude/range to row(y)
         xlab='Time (UTC)' if iv==1 else ''
         
-        #Divide the flight period into multiple segments and plot separately 
-        #for more efficient memory usage
-        div =int(len(xvar)/9)
-        
-        cp = ax.contourf(xvar[:div], ZB, var[:,:div],lev,cmap=cmp)
-        cp = ax.contourf(xvar[:div*2], ZB, var[:,:div*2],lev,cmap=cmp)
-        cp = ax.contourf(xvar[div*2:div*3], ZB, var[:,div*2:div*3],lev,cmap=cmp)
-        cp = ax.contourf(xvar[div*3:div*4], ZB, var[:,div*3:div*4],lev,cmap=cmp)
-        cp = ax.contourf(xvar[div*4:div*5], ZB, var[:,div*4:div*5],lev,cmap=cmp)
-        cp = ax.contourf(xvar[div*5:div*6], ZB, var[:,div*5:div*6],lev,cmap=cmp)
-        cp = ax.contourf(xvar[div*6:div*7], ZB, var[:,div*6:div*7],lev,cmap=cmp)
-        cp = ax.contourf(xvar[div*7:div*8], ZB, var[:,div*7:div*8],lev,cmap=cmp)
-        cp = ax.contourf(xvar[div*8:], ZB, var[:,div*8:],lev,cmap=cmp)
+        if(method=='raster'):
+            #Pool the rays into the pixel columns of the axes, then draw the pooled curtain
+            #once; values outside the level range are left blank as contourf does
+            ncols = max(1,int(ax.get_window_extent().width))
+            var,vxe = pool_time(datap[vnm],xe,ncols,how=pool)
+            var = np.ma.masked_outside(var.T,lev[0],lev[-1]) #<--move time to col dim (x), and altitude/range to row(y)
+            cp = ax.pcolormesh(vxe,cell_edges(ZB),var,cmap=cmp,norm=BoundaryNorm(lev,cmp.N),shading='flat')
+            ax.xaxis_date()
+        else:
+            var=np.asarray(datap[vnm]).T #<--move time to col dim (x), and altitude/range to row(y)
+            
+            #Divide the flight period into multiple segments and plot separately 
+            #for more efficient memory usage; neighbouring segments share one ray
+            div =max(1,int(len(xnum)/9))
+            for a in range(0,len(xnum)-1,div):
+                b = min(a+div+1,len(xnum))
+                cp = ax.contourf(xnum[a:b], ZB, var[:,a:b],lev,cmap=cmp)
+            ax.xaxis_date()
         
         ax.set_ylabel('Range from Radar [km]')
         ax.set_xlabel(xlab)
@@ -659,15 +1104,15 @@ def plot_CRS2D(datap,xvar,ZB,plot_start,plot_end,reverseZ=True):
             ax.set_ylim(ymin=5,ymax=20)
             ytpos=20.6
 
-        ax.text(xvar[int(len(xvar)*.5)],ytpos,vnames[vnm],
+        ax.text(xnum[int(len(xnum)*.5)],ytpos,vnames[vnm],
                {'fontsize':13,'ha':'center'})
         
         #Extract the number of seconds over the entire flight period
-        period_sec = (xvar[-1] - xvar[0]).seconds 
+        period_sec = (xnum[-1] - xnum[0])*86400 
         
         #Place time ticks on the x-axis of plot based on flight period length
         # User can manually change this value to preferred number of ticks by replacing the "6" value
-        ax.xaxis.set_major_locator(mdates.SecondLocator(interval=int(period_sec/6))) 
+        ax.xaxis.set_major_locator(mdates.SecondLocator(interval=max(1,int(period_sec/6)))) 
         ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S')) #<--Format times on x-axis to hh:mm:ss
         
         #Create plot title based on file dates; a different title is given based on whether the data
@@ -684,29 +1129,256 @@ def plot_CRS2D(datap,xvar,ZB,plot_start,plot_end,reverseZ=True):
         clb.set_label(unit)
         print("Fig.{} is done for {}".format(iv, vnm))
 
-    plt.show()
+    if(show is None): show = not headless()
+    if(show):
+        with stage('show'): #<--waits for the user to close the window
+            plt.show()
+    return fig
+
+#Panel label, name in the title, units and color levels of every variable plot_panels can draw
+PANELS = {'Ref': ("Reflectivity",'Reflectivity','[dBZ]',np.arange(-20,40,2)),
+          'DopV':('Doppler Vel.','Doppler Velocity','[m/s]',np.arange(-20,20,2)),
+          'SpW': ('Spectrum Width','Spectrum Width','[m/s]',np.arange(0,4.2,0.2)),
+          'LDR': ('LDR','LDR','[dB]',np.arange(-40,2,2))}
+
+_PANEL_CURTAIN = None #<--curtain that forked rasterizing workers inherit instead of receiving a copy
+
+def rasterize_panel(task):
+    """
+    Rasterize one variable of a curtain to the pixels of its panel; run in a
+    worker process by plot_panels
+    task: (variable name, None or dictionary of the data (ray,gate) the panel
+           is formed from, time edges of the rays, range of the gates [km],
+           (width,height) of the panel in pixels, x limits, (bottom,top) y
+           limits, color levels, colormap, 'max', 'mean' or 'physical' pooling)
+    With None the data are taken from the curtain the worker was forked with
+    The rays are pooled into the pixel columns as the 'raster' method of
+    plot_CRS2D does, and every pixel row takes the gate under its centre
+    Return RGBA array (height,width,4) of uint8; blank where there is no data
+    or the value is outside the levels
+    """
+    vnm,data,xe,rng,(w,h),(x0,x1),(yb,yt),lev,cmp,how = task
+    if(data is None): data = _PANEL_CURTAIN
+    if(how=='physical' and len(xe)-1>w):
+        starts = group_starts(len(xe)-1,nrays=w)
+        pooled = decimate_rays({v:data[v] for v in DECIMATION_INPUTS[vnm]},starts)[vnm]
+        pe = np.asarray(xe)[np.append(starts,len(xe)-1)]
+    else:
+        pooled,pe = pool_time(data[vnm],xe,w,how='mean' if how=='physical' else how)
+    col = np.searchsorted(pe,x0+(np.arange(w)+0.5)*(x1-x0)/w,side='right')-1 #<--column under each pixel centre
+    row = np.searchsorted(cell_edges(rng),yt+(np.arange(h)+0.5)*(yb-yt)/h,side='right')-1 #<--top row first
+    cin,rin = (col>=0) & (col<len(pooled)),(row>=0) & (row<len(rng))
+    img = np.full((h,w),np.nan,dtype=np.float32)
+    img[np.ix_(rin,cin)] = pooled[np.ix_(col[cin],row[rin])].T
+    img = np.ma.masked_outside(np.ma.masked_invalid(img),lev[0],lev[-1])
+    return cmp(BoundaryNorm(lev,cmp.N)(img),bytes=True)
+
+@profiled('plot')
+def plot_panels(cur,variables=None,reverseZ=True,pool='max',workers=None,show=None):
+    """
+    Plot variables of a CRSCurtain (default every one it holds: Ref, DopV
+    and SpW and LDR when read) in stacked panels, one per variable
+    The figure, axes and colorbars are laid out first; every panel is then
+    rasterized to the pixels of its axes in its own worker process (see
+    rasterize_panel) and the images are composited into the figure, so wall
+    time stays close to that of one panel as panels are added
+    workers: number of worker processes (default one per panel); 0 rasterizes
+             the panels in this process, e.g. inside a batch worker
+    Return image object "fig" than can be used to save the plot
+    """
+    global _PANEL_CURTAIN
+    variables = [vnm for vnm in (variables or cur.variables()) if cur[vnm] is not None]
+    n = len(variables)
+    fig,axs = plt.subplots(nrows=n,ncols=1,figsize=(12,3*n),squeeze=False)
+    axs = axs[:,0]
+    fig.tight_layout()
+    fig.subplots_adjust(top=1-0.2/n,bottom=0.2/n,hspace=0.2) #<--the plot_CRS2D layout for two panels
+
+    xnum = to_datenum(cur.time,EPOCH_UNITS) #<--Time as matplotlib date numbers
+    xe = cell_edges(xnum)
+    ylim,ytpos = ((20,5),4.5) if reverseZ else ((5,20),20.6)
+    cmaps = radarCmaps()
+    for iv,(vnm,ax) in enumerate(zip(variables,axs)):
+        label,name,unit,lev = PANELS[vnm]
+        clb = fig.colorbar(ScalarMappable(norm=BoundaryNorm(lev,cmaps[vnm].N),cmap=cmaps[vnm]),ax=ax)
+        clb.set_label(unit)
+        ax.set_xlim(xe[0],xe[-1])
+        ax.set_ylim(*ylim)
+        ax.xaxis_date()
+        ax.xaxis.set_major_locator(mdates.SecondLocator(interval=max(1,int((xnum[-1]-xnum[0])*86400/6))))
+        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S')) #<--Format times on x-axis to hh:mm:ss
+        ax.set_ylabel('Range from Radar [km]')
+        ax.set_xlabel('Time (UTC)' if iv==n-1 else '')
+        ax.text(xnum[int(len(xnum)*.5)],ytpos,label,{'fontsize':13,'ha':'center'})
+
+    names = [PANELS[vnm][1] for vnm in variables]
+    title = 'CRS ' + (names[0] if n==1 else ', '.join(names[:-1])+' and '+names[-1]) + ' ' + cur.start().strftime("%B %d, %Y")
+    if(cur.start().date()!=cur.end().date()): title += ' - ' + cur.end().strftime("%B %d, %Y")
+    fig.suptitle(title,fontsize=14,x=0.415,y=1-0.12/(3*n)) #<--same distance from the top as in plot_CRS2D
+
+    #The axes are final once the colorbars are placed: rasterize every panel at its size in pixels
+    forked = (workers!=0 and n>1 and 'fork' in multiprocessing.get_all_start_methods())
+    tasks = []
+    for vnm,ax in zip(variables,axs):
+        bb = ax.get_window_extent()
+        inputs = DECIMATION_INPUTS[vnm] if pool=='physical' else (vnm,)
+        tasks.append((vnm,None if forked else {v:cur[v] for v in inputs},xe,cur.range,(max(1,int(round(bb.width))),max(1,int(round(bb.height)))),
+                      (xe[0],xe[-1]),ylim,PANELS[vnm][3],cmaps[vnm],pool))
+    if(workers==0 or n==1):
+        images = [rasterize_panel(t) for t in tasks]
+    else:
+        _PANEL_CURTAIN = cur #<--forked workers see the curtain without it being pickled
+        try:
+            ctx = multiprocessing.get_context('fork') if forked else None
+            with ProcessPoolExecutor(max_workers=workers or n,mp_context=ctx) as ex:
+                images = list(ex.map(rasterize_panel,tasks))
+        finally:
+            _PANEL_CURTAIN = None
+    for ax,img in zip(axs,images):
+        ax.imshow(img,extent=(xe[0],xe[-1],ylim[0],ylim[1]),aspect='auto',interpolation='nearest',origin='upper')
+        ax.set_xlim(xe[0],xe[-1])
+        ax.set_ylim(*ylim)
+
+    if(show is None): show = not headless()
+    if(show):
+        with stage('show'): #<--waits for the user to close the window
+            plt.show()
     return fig
 
-def SAVEsubset(cs,fig,fname,dirpath,start,end):
+def plot_curtain(cur,reverseZ=True,method='raster',pool='max',show=None,variables=None,workers=None):
+    """
+    Plot a CRSCurtain with plot_CRS2D, or for method='parallel' with
+    plot_panels: one panel per variable (Ref, DopV and any of SpW and LDR),
+    rasterized in parallel by worker processes
+    Return image object "fig" than can be used to save the plot
+    """
+    if(method=='parallel'):
+        return plot_panels(cur,variables,reverseZ,pool,workers,show)
+    return plot_CRS2D(cur,cur.datetimes(),cur.range,cur.start(),cur.end(),
+                      reverseZ=reverseZ,method=method,pool=pool,show=show)
+
+def curtain_image_name(cur):
     """
-    User selects whether to save the plot image
-    cs:  selected subset dataset
+    Image file name for a plot of CRSCurtain cur
+    """
+    return image_name(cur.fname,cur.start().strftime("%Y%m%dT%H%M%S"),cur.end().strftime("%Y%m%dT%H%M%S"))
+
+def image_name(fname,start,end):
+    """
+    Image file name for a plot of CRS file fname covering start to end
+    (date/time strings in 'YYYYMMDDThhmmss')
+    """
+    fname=os.path.basename(fname)
+    campaign=fname.split('_')[0]
+    instr=fname.split('_')[1]
+    return campaign+ '_'+instr+ '_'+start+ '_'+end+'.png'
+
+class FigureWriter:
+    """
+    Background pool that writes finished figures to PNG files, so that the
+    encoding and writing of one plot overlap with reading the next
+    Figures are always rendered by Agg in the calling thread (matplotlib is
+    not thread-safe); only PNG encoding and I/O are left to the pool
+    tight: crop the image to the tight bounding box of the figure plus
+           savefig.pad_inches, as bbox_inches='tight' in SAVEsubset; False
+           keeps the whole figure
+    workers: number of writer threads
+    Use as a context manager, or call close(), to wait for pending writes;
+    images that could not be written are then reported
+    """
+    def __init__(self,dpi=100,tight=True,workers=2):
+        self.dpi,self.tight = dpi,tight
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.failed = [] #<--(path, exception) of every image that could not be written
+
+    def submit(self,fig,path):
+        """
+        Render a finished figure and hand the image over to be written to
+        path; the figure is closed and must not be used afterwards
+        Return future whose result is (path, time.perf_counter() when written)
+        """
+        rgba = self.render(fig,path)
+        future = self.pool.submit(self._write_rgba,rgba,path)
+        future.add_done_callback(lambda f: f.exception() and self.failed.append((path,f.exception())))
+        return future
+
+    def render(self,fig,path=None):
+        """
+        Draw fig with Agg and close it
+        Return RGBA image (rows,columns,4), cropped when tight
+        """
+        with stage('render',file=path):
+            fig.set_dpi(self.dpi)
+            canvas = FigureCanvasAgg(fig)
+            canvas.draw()
+            rgba = np.asarray(canvas.buffer_rgba())
+            if(self.tight):
+                #Tight bounding box of the drawn artists, in pixels from the lower left corner
+                pad = plt.rcParams['savefig.pad_inches']*self.dpi
+                box = fig.get_tightbbox(canvas.get_renderer()).transformed(fig.dpi_scale_trans)
+                nrow,ncol = rgba.shape[:2]
+                x0,x1 = max(0,int(np.floor(box.x0-pad))),min(ncol,int(np.ceil(box.x1+pad)))
+                y0,y1 = max(0,int(np.floor(nrow-box.y1-pad))),min(nrow,int(np.ceil(nrow-box.y0+pad)))
+                rgba = rgba[y0:y1,x0:x1]
+            rgba = np.array(rgba) #<--copy, so the figure can be freed
+        plt.close(fig)
+        return rgba
+
+    @staticmethod
+    def _write_rgba(rgba,path):
+        with stage('save',file=path):
+            Image.fromarray(rgba).save(path,format='PNG')
+        return path,time.perf_counter()
+
+    def close(self):
+        """
+        Wait for all pending writes and stop the pool
+        Return list of (path, exception) of the images that could not be written
+        """
+        self.pool.shutdown(wait=True)
+        for path,err in self.failed:
+            print("%%Could not save {}: {}".format(path,err))
+        return self.failed
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+def SAVEsubset(cs,fig,fname,dirpath,start,end,writer=None):
+    """
+    User selects whether to save the plot image, and whether to export the
+    subset data to a chunked, compressed netCDF-4 file (see CRS_Export.py)
+    that later analyses can reload without re-reading the original file
+    cs:  selected subset dataset (CRSCurtain)
     fig: radar image of cs 
     fname: original CRS file name
     dirpath: where saved image will be located
     start: start date/time of plot
     end: end date/time of plot 
+    writer: optional FigureWriter; the image is then written in the
+            background and the function returns at once
     """
     Save=input("\n*Save plot(y/n)?")
     if(Save.lower()=='y'):
-        campaign=fname.split('_')[0]
-        instr=fname.split('_')[1]
-        test = os.path.join(campaign+ '_'+instr+ '_'+start+ '_'+end+'.png')
+        test = image_name(fname,start,end)
         print(test)
-        fig.savefig(os.path.join(campaign+ '_'+instr+ '_'+start+ '_'+end+'.png'),dpi=100,bbox_inches='tight')
-        plt.close(fig)
-        print("Image saved to ", dirpath+campaign+ '_'+instr+ '_'+start+ '_'+end+'.png\n') 
+        if(writer):
+            writer.submit(fig,test)
+            print("Image being saved to ", dirpath+test+'\n')
+        else:
+            with stage('save',file=test):
+                fig.savefig(test,dpi=100,bbox_inches='tight')
+            plt.close(fig)
+            print("Image saved to ", dirpath+test+'\n') 
     else: 
+        plt.close(fig)
         print("No image was saved.\n")         
+    if(isinstance(cs,CRSCurtain) and input("*Export subset data (y/n)?").lower()=='y'):
+        from CRS_Export import export_curtain, export_name #<--imported here; CRS_Export imports this file
+        out = export_name(fname,start,end)
+        export_curtain(cs,out)
+        print("Subset data exported to ", dirpath+out+'\n')
 
 
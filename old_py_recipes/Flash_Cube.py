@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+
+##########################################################
+#
+#        Lightning Flash Count Cube
+#
+#        Description: This script accumulates ISS LIS or OTD
+#        flashes into a space-time cube of flash counts on
+#        disk: one count per time bin (hour or day) and
+#        latitude/longitude cell (see Flash_Grid.py). The
+#        cube is a memory-mapped file with a JSON sidecar
+#        describing its grid and time axis and listing the
+#        granules already added, so months of granules can
+#        be added over several runs, and a run that is
+#        interrupted can be repeated without counting any
+#        granule twice. Granules are added in batches; the
+#        new counts of a batch are first written to a
+#        journal, which is replayed if the run stops before
+#        the batch is complete. The time axis grows as
+#        later granules are added. The map of any period
+#        (or the flash counts of every time bin) is read
+#        from the cube without opening the granules again.
+#
+#        Usage: python Flash_Cube.py CUBE_DIR --add DATA_DIR [--source lis]
+#                   [--start 2022-08-01] [--step day] [--res 1.0]
+#               python Flash_Cube.py CUBE_DIR --map 2022-08-01 2022-09-01
+#                   --out flash_counts.png (or .tif)
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+##########################################################
+
+#Import Python packages and modules
+import argparse
+import json
+import os,sys
+import numpy as np
+
+#Import functions from the lightning recipe files
+from Flash_Granules import lis_files, otd_files, read_lis_granule, read_otd_granule, decode_pool
+from Flash_Grid import FlashGrid, GLOBAL, write_image, write_geotiff
+from Time_Decoding import to_seconds, to_datetime64, EPOCH_UNITS
+
+STEPS = {'hour':3600,'day':86400} #<--length of a time bin in seconds
+SOURCES = {'lis':(lis_files,read_lis_granule),'otd':(otd_files,read_otd_granule)}
+COUNT_DTYPE = np.uint32
+
+def epoch_seconds(t):
+    """Return seconds since 1970-01-01 UTC of a datetime object or 'yyyy-mm-dd[Thh:mm:ss]' string"""
+    return float(to_seconds(0,'seconds since '+(t if isinstance(t,str) else t.isoformat())))
+
+class FlashCube:
+    """
+    Flash count cube (time bin, latitude, longitude) stored in the directory
+    path: counts.dat holds the uint32 counts, cube.json the grid, time axis
+    and added granules, and journal.npz the batch being added, if any
+    Create a cube with FlashCube.create(); opening one completes a batch
+    that an interrupted run left in the journal
+    """
+    def __init__(self,path):
+        self.path = path
+        with open(os.path.join(path,'cube.json')) as f:
+            self.meta = json.load(f)
+        self.grid = FlashGrid(self.meta['res'],self.meta['extent'])
+        self.step,self.t0 = STEPS[self.meta['step']],self.meta['t0']
+        self._map()
+        if(os.path.exists(self._journal())): self._replay()
+
+    @classmethod
+    def create(cls,path,start,step='day',res=1.0,extent=GLOBAL):
+        """
+        Create an empty cube in the directory path
+        start: start of the first time bin (datetime object or 'yyyy-mm-dd')
+        step: 'hour' or 'day' time bins
+        res, extent: the latitude/longitude grid (see FlashGrid)
+        Return FlashCube
+        """
+        if(step not in STEPS): raise ValueError("step must be one of {}".format(', '.join(STEPS)))
+        os.makedirs(path,exist_ok=True)
+        if(os.path.exists(os.path.join(path,'cube.json'))):
+            raise FileExistsError("A flash cube already exists in {}".format(path))
+        open(os.path.join(path,'counts.dat'),'wb').close()
+        meta = {'res':float(res),'extent':[float(x) for x in extent],'step':step,
+                't0':epoch_seconds(start),'ntime':0,'granules':{}}
+        _write_json(os.path.join(path,'cube.json'),meta)
+        return cls(path)
+
+    def _journal(self):
+        return os.path.join(self.path,'journal.npz')
+
+    def _map(self):
+        """Memory-map the counts of the ntime time bins"""
+        ntime = self.meta['ntime']
+        self.counts = None if ntime==0 else np.memmap(os.path.join(self.path,'counts.dat'),COUNT_DTYPE,'r+',
+                                                       shape=(ntime,)+self.grid.shape)
+
+    def _grow(self,ntime):
+        """Extend the time axis to ntime bins; the new bins are zero (sparse on most file systems)"""
+        if(ntime<=self.meta['ntime']): return
+        if(self.counts is not None): self.counts.flush()
+        self.counts = None
+        with open(os.path.join(self.path,'counts.dat'),'r+b') as f:
+            f.truncate(ntime*self.grid.nlat*self.grid.nlon*np.dtype(COUNT_DTYPE).itemsize)
+        self.meta['ntime'] = ntime
+        self._save()
+        self._map()
+
+    def _save(self):
+        _write_json(os.path.join(self.path,'cube.json'),self.meta)
+
+    def _apply(self,index,values,granules):
+        """
+        Set the counts at flat index to values and record the granules as
+        added; setting (rather than adding) makes a replay harmless
+        """
+        if(len(index)):
+            flat = self.counts.reshape(-1)
+            flat[index] = values
+            self.counts.flush()
+        self.meta['granules'].update(granules)
+        self._save()
+        os.remove(self._journal())
+
+    def _replay(self):
+        """Complete the batch of an interrupted run from the journal"""
+        with np.load(self._journal()) as j:
+            index,values = j['index'],j['values']
+            granules = json.loads(str(j['granules']))
+            ntime = int(j['ntime'])
+        self._grow(ntime)
+        self._apply(index,values,granules)
+
+    def pending(self,files):
+        """
+        Return files not yet added to the cube; files changed since they were
+        added are reported and skipped, as their old counts cannot be removed
+        """
+        todo = []
+        for f in files:
+            st,key = os.stat(f),os.path.abspath(f)
+            done = self.meta['granules'].get(key)
+            if(done is None):
+                todo.append(f)
+            elif(done!=[st.st_size,st.st_mtime]):
+                print("%%{} changed since it was added to the cube; rebuild the cube to count it again".format(f))
+        return todo
+
+    def add(self,granules):
+        """
+        Add a batch of granules read by read_lis_granule/read_otd_granule
+        granules: dictionary of file path -> granule dictionary
+        Return number of flashes counted (flashes before the start of the
+        cube or outside the grid are not counted)
+        """
+        ncell = self.grid.nlat*self.grid.nlon
+        flat = []
+        for g in granules.values():
+            if(len(g['time'])==0): continue
+            tbin = np.floor((np.asarray(g['time'])-self.t0)/self.step).astype(np.int64)
+            cell = self.grid.cells(g['lon'],g['lat'])
+            keep = (cell>=0) & (tbin>=0)
+            flat.append(tbin[keep]*ncell+cell[keep])
+        flat = np.concatenate(flat) if flat else np.empty(0,dtype=np.int64)
+        index,count = np.unique(flat,return_counts=True)
+        ntime = max(self.meta['ntime'],int(index[-1]//ncell)+1 if len(index) else 0)
+        self._grow(ntime)
+
+        #Journal the new counts of the batch before they are written to the cube
+        keys = {}
+        for f in granules:
+            st = os.stat(f)
+            keys[os.path.abspath(f)] = [st.st_size,st.st_mtime]
+        values = (self.counts.reshape(-1)[index] if len(index) else np.empty(0,COUNT_DTYPE))+count.astype(COUNT_DTYPE)
+        np.savez(self._journal()+'.tmp.npz',index=index,values=values,granules=json.dumps(keys),ntime=ntime)
+        os.replace(self._journal()+'.tmp.npz',self._journal())
+        self._apply(index,values,keys)
+        return len(flat)
+
+    def ingest(self,files,source='lis',workers=None,batch=64):
+        """
+        Add the granules among files that are not in the cube yet, batch
+        granules at a time, decoded by a pool of processes (see decode_pool in
+        Flash_Granules.py)
+        source: 'lis' for ISS LIS NetCDF files, 'otd' for OTD HDF files
+        Return number of granules added
+        """
+        reader = SOURCES[source][1]
+        todo = self.pending(files)
+        with decode_pool(workers) as pool:
+            for a in range(0,len(todo),batch):
+                part = todo[a:a+batch]
+                self.add(dict(zip(part,pool.map(reader,part))))
+        return len(todo)
+
+    def times(self):
+        """Return start of every time bin (datetime64)"""
+        return to_datetime64(self.t0+np.arange(self.meta['ntime'])*float(self.step),EPOCH_UNITS)
+
+    def bins(self,start=None,end=None):
+        """Return range (i0,i1) of the time bins that start in [start,end)"""
+        ntime = self.meta['ntime']
+        i0 = 0 if start is None else int(np.clip(np.ceil((epoch_seconds(start)-self.t0)/self.step),0,ntime))
+        i1 = ntime if end is None else int(np.clip(np.ceil((epoch_seconds(end)-self.t0)/self.step),i0,ntime))
+        return i0,i1
+
+    def map(self,start=None,end=None):
+        """
+        Sum the flash counts of the time bins that start in [start,end)
+        (datetime objects or 'yyyy-mm-dd[Thh:mm:ss]'; None for the whole cube)
+        Return int64 array of counts (nlat,nlon), row 0 in the south
+        """
+        i0,i1 = self.bins(start,end)
+        if(i1==i0): return np.zeros(self.grid.shape,dtype=np.int64)
+        return self.counts[i0:i1].sum(axis=0,dtype=np.int64)
+
+    def series(self,start=None,end=None):
+        """
+        Return start times (datetime64) and total flash counts of the time
+        bins that start in [start,end)
+        """
+        i0,i1 = self.bins(start,end)
+        if(i1==i0): return self.times()[:0],np.zeros(0,dtype=np.int64)
+        return self.times()[i0:i1],self.counts[i0:i1].reshape(i1-i0,-1).sum(axis=1,dtype=np.int64)
+
+def _write_json(path,meta):
+    """Replace a JSON file in one step, so it is never left half written"""
+    with open(path+'.tmp','w') as f:
+        json.dump(meta,f)
+    os.replace(path+'.tmp',path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Accumulate lightning flashes into a space-time count cube.')
+    parser.add_argument('cube_dir',help='directory of the cube (created by the first --add)')
+    parser.add_argument('--add',metavar='DATA_DIR',help='add the granules in DATA_DIR that are not in the cube yet')
+    parser.add_argument('--source',default='lis',choices=sorted(SOURCES),help='granule type (default: lis)')
+    parser.add_argument('--start',help='start of a new cube in yyyy-mm-dd (default: day of the first flash)')
+    parser.add_argument('--step',default='day',choices=list(STEPS),help='time bin of a new cube (default: day)')
+    parser.add_argument('--res',type=float,default=1.0,help='cell size of a new cube in degrees (default: 1.0)')
+    parser.add_argument('--map',nargs=2,metavar=('START','END'),help='write the flash counts of [START,END)')
+    parser.add_argument('--out',help='map file: .png image or .tif GeoTIFF (default: flash_counts_<START>_<END>.png)')
+    args = parser.parse_args(argv)
+
+    if(args.add):
+        files = SOURCES[args.source][0](args.add)
+        if(len(files)==0):
+            print("%%No {} files found in {}".format(args.source,args.add))
+            return 1
+        if(not os.path.exists(os.path.join(args.cube_dir,'cube.json'))):
+            start = args.start
+            if(start is None): #<--midnight before the first flash of the first granule
+                first = SOURCES[args.source][1](files[0])
+                start = str(to_datetime64([first['start']],EPOCH_UNITS)[0])[:10]
+            FlashCube.create(args.cube_dir,start,args.step,args.res)
+        cube = FlashCube(args.cube_dir)
+        n = cube.ingest(files,args.source)
+        print("{} granule(s) added; the cube holds {} {} bins from {}".format(
+            n,cube.meta['ntime'],cube.meta['step'],np.datetime_as_string(to_datetime64(cube.t0,EPOCH_UNITS),unit='s')))
+    if(args.map):
+        cube = FlashCube(args.cube_dir)
+        counts = cube.map(*args.map)
+        out = args.out or 'flash_counts_{}_{}.png'.format(*(t.replace('-','') for t in args.map))
+        (write_geotiff if out.lower().endswith(('.tif','.tiff')) else write_image)(out,cube.grid,counts)
+        print("{} flashes from {} to {} written to {}".format(int(counts.sum()),args.map[0],args.map[1],out))
+    if(not (args.add or args.map)): parser.error('nothing to do: give --add and/or --map')
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+##########################################################
+#
+#        Lightning Flash Location Export
+#
+#        Description: This script writes tables of flash
+#        locations (e.g. flash_lat and flash_lon of the ISS
+#        LIS and OTD recipes) to CSV, .npz or Parquet files.
+#        The CSV writer formats blocks of rows with one
+#        string operation per block instead of one per
+#        value, and writes the same text as csv.writer
+#        (the header row, then one row of repr() values
+#        per flash, ending in '\r\n'). With a number of
+#        decimals the numbers are rounded and rendered to
+#        digits with numpy array arithmetic, so writing
+#        millions of flashes is limited by the disk.
+#        The .npz and Parquet files keep the typed columns
+#        and are loaded back in a single read.
+#
+#        Usage: from Flash_Export import export_flashes
+#               export_flashes('flashes.csv',{'flash_lat':lat,'flash_lon':lon})
+#               export_flashes('flashes.npz',{'flash_lat':lat,'flash_lon':lon})
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+##########################################################
+
+#Import Python packages and modules
+import os
+from itertools import chain
+import numpy as np
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: #<--Parquet files cannot be written or read without pyarrow
+    pa = pq = None
+
+CHUNK_ROWS = 65536 #<--rows formatted at once
+FORMATS = ('csv','npz','parquet')
+
+def format_rows(columns,decimals=None):
+    """
+    Format rows of the 1-D arrays in columns as CSV text
+    decimals: None for the repr() of every value (as Python floats or
+              ints), as csv.writer writes them; otherwise the number of
+              decimals to round to
+    Return str of the rows, each ending in '\\r\\n'
+    """
+    if(decimals is None):
+        values = tuple(chain.from_iterable(zip(*[np.asarray(c).tolist() for c in columns]))) #<--row by row
+        return (','.join(['%r']*len(columns))+'\r\n')*(len(values)//max(1,len(columns))) % values
+    values = [np.asarray(c,dtype=np.float64) for c in columns]
+    if(any((np.abs(v[np.isfinite(v)])>=9e15/10.**decimals).any() for v in values)):
+        #Too large to round in int64: format these rows with the '%f' format
+        flat = tuple(chain.from_iterable(zip(*[v.tolist() for v in values])))
+        return (','.join(['%.{}f'.format(decimals)]*len(values))+'\r\n')*len(values[0]) % flat
+    cells = [fixed_bytes(v,decimals) for v in values]
+    n = len(cells[0][0])
+    parts,keep = [],[]
+    for k,(text,mask) in enumerate(cells):
+        sep = b',' if k<len(cells)-1 else b'\r\n'
+        parts += [text,np.broadcast_to(np.frombuffer(sep,dtype=np.uint8),(n,len(sep)))]
+        keep += [mask,np.ones((n,len(sep)),dtype=bool)]
+    return np.hstack(parts)[np.hstack(keep)].tobytes().decode('ascii') #<--row by row, the kept bytes only
+
+def fixed_bytes(values,decimals):
+    """
+    Render values rounded to decimals as right-aligned ASCII digits; the
+    rounded values must fit in int64 (see format_rows)
+    Return uint8 array (value,width) of characters and bool array of the
+    same shape marking the characters of every value ('-', digits, '.',
+    or 'nan'/'inf'/'-inf')
+    """
+    values = np.asarray(values,dtype=np.float64)
+    finite = np.isfinite(values)
+    q = np.rint(np.abs(np.where(finite,values,0))*10.**decimals).astype(np.int64)
+    ndig = np.maximum(np.floor(np.log10(np.maximum(q,1))).astype(int)+1,decimals+1) #<--at least '0.' before the decimals
+    width = max(int(ndig.max(initial=1)),3)
+    power = 10**np.arange(width-1,-1,-1,dtype=np.int64)
+    digits = (q[:,None]//power)%10+ord('0')
+    keep = np.arange(width-1,-1,-1)<ndig[:,None]
+    if(decimals>0): #<--split the integer digits from the decimals with a point
+        digits = np.insert(digits,width-decimals,ord('.'),axis=1)
+        keep = np.insert(keep,width-decimals,True,axis=1)
+    sign = (values<0) & ((q>0) | ~finite)
+    text = np.hstack((np.where(sign,ord('-'),ord(' '))[:,None],digits)).astype(np.uint8)
+    keep = np.hstack((sign[:,None],keep))
+    if(not finite.all()):
+        for k in np.flatnonzero(~finite):
+            word = b'nan' if np.isnan(values[k]) else b'inf'
+            text[k,-3:] = np.frombuffer(word,dtype=np.uint8)
+            text[k,-4] = ord('-')
+            keep[k] = False
+            keep[k,-3:] = True
+            keep[k,-4] = bool(sign[k])
+    return text,keep
+
+def write_csv(path,columns,decimals=None,chunk_rows=CHUNK_ROWS):
+    """
+    Write columns (dictionary of header -> 1-D array) to a CSV file, chunk_rows
+    rows at a time; decimals as in format_rows
+    Return path
+    """
+    names = list(columns)
+    arrays = [np.asarray(columns[nm]) for nm in names]
+    n = len(arrays[0]) if arrays else 0
+    with open(path,'w',newline='') as myfile:
+        myfile.write(','.join(names)+'\r\n')
+        for a in range(0,n,chunk_rows):
+            myfile.write(format_rows([c[a:a+chunk_rows] for c in arrays],decimals))
+    return path
+
+def write_npz(path,columns,compressed=False):
+    """
+    Write columns to a NumPy .npz file, one array per column with its type
+    Return path
+    """
+    (np.savez_compressed if compressed else np.savez)(path,**{nm:np.asarray(c) for nm,c in columns.items()})
+    return path
+
+def write_parquet(path,columns):
+    """
+    Write columns to a Parquet file (requires pyarrow)
+    Return path
+    """
+    if(pa is None): raise ImportError("Writing Parquet files requires the pyarrow package")
+    pq.write_table(pa.table({nm:np.asarray(c) for nm,c in columns.items()}),path)
+    return path
+
+def export_flashes(path,columns,fmt=None,decimals=None):
+    """
+    Write a table of flash locations to path
+    columns: dictionary of column name -> 1-D array, e.g.
+             {'flash_lat':flash_lat,'flash_lon':flash_lon}
+    fmt: 'csv', 'npz' or 'parquet' (default: from the file extension)
+    decimals: rounding of the CSV values (see format_rows)
+    Return path
+    """
+    fmt = fmt or os.path.splitext(path)[1].lstrip('.').lower()
+    if(fmt=='csv'): return write_csv(path,columns,decimals)
+    if(fmt=='npz'): return write_npz(path,columns)
+    if(fmt=='parquet'): return write_parquet(path,columns)
+    raise ValueError("Unknown flash table format {!r}; use one of {}".format(fmt,', '.join(FORMATS)))
+
+def load_flashes(path):
+    """
+    Read a table of flash locations written by export_flashes
+    Return dictionary of column name -> 1-D array
+    """
+    fmt = os.path.splitext(path)[1].lstrip('.').lower()
+    if(fmt=='npz'):
+        with np.load(path) as npz:
+            return {nm:npz[nm] for nm in npz.files}
+    if(fmt=='parquet'):
+        if(pq is None): raise ImportError("Reading Parquet files requires the pyarrow package")
+        table = pq.read_table(path)
+        return {nm:table[nm].to_numpy() for nm in table.column_names}
+    with open(path) as f:
+        names = f.readline().strip().split(',')
+    data = np.loadtxt(path,delimiter=',',skiprows=1,ndmin=2)
+    return {nm:data[:,k] for k,nm in enumerate(names)}
@@ -0,0 +1,285 @@
+# -*- coding: utf-8 -*-
+
+##########################################################
+#
+#        ISS LIS Flash Granule Reader
+#
+#        Description: This script reads the orbit times
+#        and lightning flash locations of a directory of
+#        ISS LIS NetCDF granules in a single pass: every
+#        granule is opened once, by a pool of worker
+#        processes, and closed again. The netCDF library is
+#        not thread-safe, so the granules are decoded in
+#        separate processes (one per CPU by default), each
+#        with its own copy of the library; every granule is
+#        also asked to be read ahead (posix_fadvise). With
+#        one worker the granules are decoded one after the
+#        other in this process. The flash coordinates of all granules are
+#        copied once into arrays sized from the granule
+#        dimensions, and the orbit times are decoded in one
+#        vectorized call.
+#
+#        With a LISCache, the flashes of every granule
+#        (lat, lon and time) are also kept in a compact
+#        .npy file, indexed by path, size and modification
+#        time in an SQLite file, so a rerun over a growing
+#        directory only opens the new or changed granules
+#        and memory-maps the others. The cache is kept in
+#        '.lis_cache' in the data directory, or in the
+#        directory named by the LIS_CACHE environment
+#        variable.
+#
+#        read_otd_granule reads the flashes of one OTD HDF
+#        file (untarred and decompressed as in the OTD
+#        recipes) into the same arrays, so both datasets can
+#        be accumulated alike (see Flash_Cube.py).
+#
+#        Usage: from Flash_Granules import lis_files, read_lis_flashes, LISCache
+#               lat,lon,begin,end = read_lis_flashes(lis_files(dataDir))
+#               with LISCache(dataDir) as cache:
+#                   lat,lon,begin,end = read_lis_flashes(files,cache=cache,days=30)
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+##########################################################
+
+#Import Python packages and modules
+import glob
+import os
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import numpy as np
+from netCDF4 import Dataset
+try:
+    from pyhdf.HDF import HDF, HC
+    import pyhdf.VS
+except ImportError: #<--OTD files cannot be read without pyhdf
+    HDF = None
+
+from Time_Decoding import to_seconds, to_datetime64, EPOCH_UNITS, TAI93_UNITS
+
+LIS_PATTERN = 'ISS_LIS_*.nc'
+OTD_PATTERN = 'mlab.otd.1_1.*'
+FLASH_DTYPE = np.dtype([('lat','f4'),('lon','f4'),('time','f8')]) #<--one cached flash; time in seconds since 1970
+NC_LOCK = threading.Lock() #<--the netCDF-C/HDF5 (and HDF4) libraries must not be entered by two threads of a process at once
+
+def lis_files(dataDir):
+    """Return sorted list of the ISS LIS NetCDF files in dataDir"""
+    return sorted(os.path.normpath(f) for f in glob.glob(os.path.join(dataDir,LIS_PATTERN)))
+
+def otd_files(dataDir):
+    """Return sorted list of the decompressed OTD HDF files in dataDir"""
+    return sorted(os.path.normpath(f) for f in glob.glob(os.path.join(dataDir,OTD_PATTERN)) if not f.endswith('.Z'))
+
+def prefetch(path):
+    """
+    Ask the operating system to start reading path into the page cache, so
+    the read overlaps the decoding of other granules (no-op where
+    posix_fadvise is not available)
+    """
+    if(not hasattr(os,'posix_fadvise')): return
+    fd = os.open(path,os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd,0,0,os.POSIX_FADV_WILLNEED)
+    finally:
+        os.close(fd)
+
+def decode_pool(workers=None):
+    """
+    Return executor to decode granules with: a pool of workers processes
+    (default: one per CPU), since a process enters the netCDF/HDF libraries
+    from one thread at a time (NC_LOCK), or a single thread of this process
+    when workers is 1
+    """
+    workers = workers or os.cpu_count() or 1
+    return ProcessPoolExecutor(max_workers=workers) if workers>1 else ThreadPoolExecutor(max_workers=1)
+
+def read_lis_granule(path):
+    """
+    Read the orbit start/end times and flash locations of one ISS LIS granule
+    Return dictionary with 'start' and 'end' (seconds since 1970-01-01 UTC),
+    'lat' and 'lon' (float32 arrays) and 'time' (seconds since 1970-01-01 UTC)
+    """
+    prefetch(path)
+    with NC_LOCK, Dataset(path,'r') as datafile:
+        datafile.set_auto_mask(False)
+        var = datafile.variables
+        start,end = var['orbit_summary_TAI93_start'],var['orbit_summary_TAI93_end']
+        start,end = to_seconds(start[:],start.units),to_seconds(end[:],end.units)
+        dim = datafile.dimensions.get('lightning_flash')
+        if(dim is None or len(dim)==0): #<--no flashes in this orbit
+            lat = lon = np.empty(0,dtype=np.float32)
+            time = np.empty(0)
+        else:
+            lat,lon = var['lightning_flash_lat'][:],var['lightning_flash_lon'][:]
+            time = var['lightning_flash_TAI93_time']
+            time = to_seconds(time[:],time.units)
+    return {'start':start.min(),'end':end.max(),'lat':lat,'lon':lon,'time':time}
+
+def read_otd_granule(path):
+    """
+    Read the flash records of one OTD HDF file (Vdata reference number 14,
+    as in the OTD recipes)
+    Return dictionary as read_lis_granule, with the times of the first and
+    last flash as 'start' and 'end'
+    """
+    if(HDF is None): raise ImportError("Reading OTD files requires the pyhdf package")
+    prefetch(path)
+    with NC_LOCK:
+        hdf = HDF(path,HC.READ)
+        vs_file = hdf.vstart()
+        try:
+            flash_flash = vs_file.attach(14)
+            record_count = flash_flash.inquire()[0]
+            flash_records = flash_flash.read(record_count) if record_count else []
+            flash_flash.detach()
+        finally:
+            vs_file.end()
+            hdf.close()
+    #Field 1 of a record is the flash time (TAI93 seconds), field 8 its (lat,lon) location
+    time = to_seconds(np.array([r[1] for r in flash_records],dtype=np.float64),TAI93_UNITS)
+    loc = np.array([r[8] for r in flash_records],dtype=np.float32).reshape(-1,2)
+    start,end = (time.min(),time.max()) if len(time) else (np.nan,np.nan)
+    return {'start':start,'end':end,'lat':loc[:,0],'lon':loc[:,1],'time':time}
+
+def read_lis_flashes(files,workers=None,cache=None,days=None):
+    """
+    Read the flash locations and orbit times of ISS LIS granules, each
+    granule once, decoded by a pool of processes (see decode_pool)
+    workers: number of decoding processes (default: one per CPU)
+    cache: LISCache; only granules that are new or changed since they were
+           cached are opened, the others are memory-mapped from the cache
+    days: keep only the flashes of the last days days before the end of the
+          latest orbit (a rolling window; default: every flash)
+    Return flash latitudes and longitudes (float64 arrays, in the order of
+    files) and the earliest orbit start and latest orbit end (datetime
+    objects) of the period read
+    """
+    if(len(files)==0): raise ValueError("No ISS LIS files to read")
+    if(cache is not None):
+        cache.update(files,workers)
+        granules = cache.granules(files)
+    else:
+        with decode_pool(workers) as pool:
+            granules = list(pool.map(read_lis_granule,files))
+    return gather_flashes(granules,days)
+
+def gather_flashes(granules,days=None):
+    """
+    Join the flashes of granules (dictionaries of read_lis_granule or
+    LISCache.granules) into single arrays, filled in place
+    days: keep only the last days days before the end of the latest orbit
+    Return as read_lis_flashes
+    """
+    begin,end = min(g['start'] for g in granules),max(g['end'] for g in granules)
+    if(days is not None):
+        begin = max(begin,end-days*86400.)
+        granules = [g for g in granules if g['end']>=begin]
+    pieces = []
+    for g in granules:
+        if(g['start']>=begin or len(g['lat'])==0):
+            pieces.append((g['lat'],g['lon']))
+        else: #<--the granule at the start of the window
+            keep = np.asarray(g['time'])>=begin
+            pieces.append((g['lat'][keep],g['lon'][keep]))
+
+    counts = np.array([len(lat) for lat,lon in pieces])
+    offsets = np.concatenate(([0],np.cumsum(counts)))
+    flash_lat = np.empty(offsets[-1],dtype=np.float64)
+    flash_lon = np.empty(offsets[-1],dtype=np.float64)
+    for k,(lat,lon) in enumerate(pieces):
+        flash_lat[offsets[k]:offsets[k+1]] = lat
+        flash_lon[offsets[k]:offsets[k+1]] = lon
+
+    begin,end = to_datetime64([begin,end],EPOCH_UNITS).tolist()
+    return flash_lat,flash_lon,begin,end
+
+def store_granule(path,root):
+    """
+    Read one granule and write its flashes to a .npy file in root; run by the
+    decoding processes of LISCache.update
+    Return index row of the granule
+    """
+    st = os.stat(path)
+    g = read_lis_granule(path)
+    flashes = np.empty(len(g['lat']),dtype=FLASH_DTYPE)
+    flashes['lat'],flashes['lon'],flashes['time'] = g['lat'],g['lon'],g['time']
+    npy = os.path.join(root,os.path.basename(path)+'.npy')
+    np.save(npy+'.tmp.npy',flashes)
+    os.replace(npy+'.tmp.npy',npy) #<--a cache file is either complete or absent
+    return (os.path.abspath(path),st.st_size,st.st_mtime,g['start'],g['end'],len(flashes),npy)
+
+class LISCache:
+    """
+    Persistent per-granule cache of ISS LIS flashes under cacheDir
+    Call update() with the granule files to cache the new or changed ones,
+    then granules() to get their flashes as memory-mapped arrays
+    """
+    def __init__(self,dataDir,cacheDir=None):
+        self.root = cacheDir or os.environ.get('LIS_CACHE') or os.path.join(os.path.abspath(dataDir),'.lis_cache')
+        os.makedirs(self.root,exist_ok=True)
+        self.db = sqlite3.connect(os.path.join(self.root,'index.sqlite'))
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS granules (
+                path TEXT PRIMARY KEY, size INTEGER, mtime REAL,
+                start REAL, end REAL, nflash INTEGER, npy TEXT)""")
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*exc):
+        self.close()
+
+    def update(self,files,workers=None):
+        """
+        Cache the granules among files that are not cached yet, or whose size
+        or modification time changed since
+        Return number of granules read
+        """
+        cached = {r['path']:r for r in self.db.execute("SELECT path,size,mtime,npy FROM granules")}
+        stale = []
+        for f in files:
+            st,row = os.stat(f),cached.get(os.path.abspath(f))
+            if(row is None or row['size']!=st.st_size or row['mtime']!=st.st_mtime or not os.path.exists(row['npy'])):
+                stale.append(f)
+        if(stale):
+            with decode_pool(workers) as pool:
+                rows = list(pool.map(store_granule,stale,[self.root]*len(stale)))
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO granules VALUES (?,?,?,?,?,?,?)",rows)
+        return len(stale)
+
+    def granules(self,files):
+        """
+        Return list of dictionaries with 'start', 'end', 'lat', 'lon' and 'time'
+        of files (as read_lis_granule), the flashes memory-mapped from the cache
+        """
+        rows = {r['path']:r for r in self.db.execute("SELECT * FROM granules")}
+        granules = []
+        for f in files:
+            row = rows[os.path.abspath(f)]
+            if(row['nflash']):
+                flashes = np.load(row['npy'],mmap_mode='r')
+            else:
+                flashes = np.empty(0,dtype=FLASH_DTYPE) #<--an empty array cannot be memory-mapped
+            granules.append({'start':row['start'],'end':row['end'],
+                             'lat':flashes['lat'],'lon':flashes['lon'],'time':flashes['time']})
+        return granules
+
+    def prune(self):
+        """
+        Drop the granules whose files no longer exist from the cache
+        Return number of granules dropped
+        """
+        gone = [r for r in self.db.execute("SELECT path,npy FROM granules") if not os.path.exists(r['path'])]
+        with self.db:
+            for r in gone:
+                self.db.execute("DELETE FROM granules WHERE path=?",(r['path'],))
+                if(os.path.exists(r['npy'])): os.remove(r['npy'])
+        return len(gone)
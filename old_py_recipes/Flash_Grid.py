@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+##########################################################
+#
+#        Lightning Flash Density Grid
+#
+#        Description: This script counts lightning flashes
+#        (e.g. of the ISS LIS and OTD recipes) in the cells
+#        of a regular latitude/longitude grid. The cell of
+#        every flash is computed with array arithmetic and
+#        the flashes are counted with one numpy bincount per
+#        block of flashes, so millions of flashes are
+#        gridded in a fraction of a second. The counts can
+#        be drawn on a map (an image with a logarithmic
+#        color scale, as the hexbin maps of the recipes),
+#        saved as a PNG image, or written to a GeoTIFF file
+#        (requires GDAL) for use in GIS software.
+#
+#        Usage: from Flash_Grid import FlashGrid, plot_counts, write_geotiff
+#               grid = FlashGrid(res=0.5)
+#               counts = grid.count(flash_lon,flash_lat)
+#               write_geotiff('flash_counts.tif',grid,counts)
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+##########################################################
+
+#Import Python packages and modules
+import numpy as np
+import matplotlib.pyplot as plt
+from matplotlib.colors import LogNorm
+try:
+    from osgeo import gdal, osr
+except ImportError: #<--GeoTIFF files cannot be written without GDAL
+    gdal = osr = None
+
+GLOBAL = (-180.,180.,-90.,90.) #<--(west,east,south,north) in degrees
+CHUNK_FLASHES = 2**22 #<--flashes binned at once
+
+class FlashGrid:
+    """
+    Regular latitude/longitude grid of res degree cells covering extent
+    (west,east,south,north); row 0 is the southernmost row
+    """
+    def __init__(self,res=1.0,extent=GLOBAL):
+        self.res = float(res)
+        self.extent = tuple(float(x) for x in extent)
+        west,east,south,north = self.extent
+        self.nlon = int(round((east-west)/self.res))
+        self.nlat = int(round((north-south)/self.res))
+
+    @property
+    def shape(self):
+        return (self.nlat,self.nlon)
+
+    def edges(self):
+        """Return longitude and latitude edges of the cells"""
+        west,east,south,north = self.extent
+        return west+np.arange(self.nlon+1)*self.res,south+np.arange(self.nlat+1)*self.res
+
+    def cells(self,lon,lat):
+        """
+        Find the cell of every flash; flashes on the east or north edge
+        belong to the last column or row
+        Return flat cell index (row*nlon+column), -1 outside the grid or
+        where the location is missing
+        """
+        west,east,south,north = self.extent
+        lon,lat = np.asarray(lon,dtype=np.float64),np.asarray(lat,dtype=np.float64)
+        inside = (lon>=west) & (lon<=east) & (lat>=south) & (lat<=north) #<--False for NaN
+        col = np.minimum((np.where(inside,lon-west,0)/self.res).astype(np.intp),self.nlon-1) #<--truncation is floor inside
+        row = np.minimum((np.where(inside,lat-south,0)/self.res).astype(np.intp),self.nlat-1)
+        return np.where(inside,row*self.nlon+col,-1)
+
+    def count(self,lon,lat,chunk=CHUNK_FLASHES):
+        """
+        Count the flashes at lon/lat in every cell, chunk flashes at a time
+        Return int64 array of counts (nlat,nlon)
+        """
+        counts = np.zeros(self.nlat*self.nlon,dtype=np.int64)
+        for a in range(0,len(lon),chunk):
+            cell = self.cells(lon[a:a+chunk],lat[a:a+chunk])
+            counts += np.bincount(cell[cell>=0],minlength=counts.size)
+        return counts.reshape(self.shape)
+
+def plot_counts(ax,grid,counts,cmap='jet',**kwargs):
+    """
+    Draw flash counts on the axes ax with a logarithmic color scale; cells
+    without flashes are left blank (as hexbin with mincnt=1)
+    kwargs: passed to imshow, e.g. transform=ccrs.PlateCarree() and zorder
+            on a cartopy map
+    Return image object "im" for the colorbar
+    """
+    west,east,south,north = grid.extent
+    data = np.ma.masked_less(counts,1)
+    norm = LogNorm(vmin=1,vmax=max(int(data.max() or 1),2))
+    return ax.imshow(data,origin='lower',extent=(west,east,south,north),cmap=cmap,norm=norm,
+                     interpolation='nearest',**kwargs)
+
+def write_image(path,grid,counts,cmap='jet'):
+    """
+    Save flash counts as an image of one pixel per cell (north up), colored
+    on a logarithmic scale; cells without flashes are transparent
+    Return path
+    """
+    data = np.ma.masked_less(counts,1)
+    norm = LogNorm(vmin=1,vmax=max(int(data.max() or 1),2))
+    plt.imsave(path,plt.get_cmap(cmap)(norm(data))[::-1])
+    return path
+
+def write_geotiff(path,grid,counts):
+    """
+    Write flash counts to a GeoTIFF file in geographic coordinates (WGS 84),
+    one cell per pixel with the north row first
+    Return path
+    """
+    if(gdal is None): raise ImportError("Writing GeoTIFF files requires GDAL (osgeo)")
+    west,east,south,north = grid.extent
+    drv = gdal.GetDriverByName("GTiff")
+    dsOut = drv.Create(path,grid.nlon,grid.nlat,1,gdal.GDT_UInt32,options=['COMPRESS=DEFLATE'])
+    #geotransform = [upper left longitude, x resolution, x skew, upper left latitude, y skew, y resolution (negative)]
+    dsOut.SetGeoTransform([west,grid.res,0,north,0,-grid.res])
+    srs = osr.SpatialReference()
+    srs.ImportFromEPSG(4326)
+    dsOut.SetProjection(srs.ExportToWkt())
+    band = dsOut.GetRasterBand(1)
+    band.WriteArray(np.ascontiguousarray(np.minimum(counts,np.iinfo(np.uint32).max).astype(np.uint32)[::-1]))
+    band.SetDescription('flash count')
+    dsOut.FlushCache()
+    dsOut = band = None #<--closes the file
+    return path
@@ -35,18 +35,16 @@ from scipy import ndimage
 import matplotlib 
 import matplotlib.pyplot as plt
 import matplotlib.cm as cm
-from datetime import datetime, timedelta
+from datetime import datetime
 from datetime import date
 import matplotlib.dates as mdates
 import matplotlib.ticker as mticker
 from mpmath import *
+from Time_Decoding import to_datenum, julian_day_units
 
 
-#Define date-time format and set up empty arrays for plotting
-datetime_format = '%Y-%m-%d %H:%M:%S'
+#Define date format of the 'Date' variable
 date_format = '%d%b%y'
-timearray=[]
-x_lims = []
 
 
 ##### This section extracts the parameters from the datafile ####
@@ -55,19 +53,12 @@ x_lims = []
 Bin_Alt = datafile['Bin_Alt'][:]
 
 
-#The date information is in seconds since the start of the year the CPL profile was collected.
-#This portion extracts those values and converts them to a standard date format
-time_format = '%H:%M:%S'
-reference_time = datetime((datetime.strptime(str(datafile['Date'][0]), date_format)).year - 1, 12, 31)
-Var_Time = datafile['Dec_JDay'][:]
-
-
-#Extracting the reference time, calculating the offset, converting to standard 
-#HH:MM:SS format
-for i in range(0 , (Var_Time.size)):
-       timearray.append((reference_time + (timedelta(days = Var_Time[i]))).time())
-timearray = np.array(timearray)
-Var_Time = np.array(Var_Time)
+#The time information is in decimal Julian days (1.0 = January 1 00:00 UTC) of the year the CPL
+#profile was collected. This portion extracts those values and converts them all at once to
+#matplotlib date numbers (UTC) for the x-axis
+my_day = datetime.strptime(str(datafile['Date'][0]), date_format)
+Var_Time = np.array(datafile['Dec_JDay'][:])
+x_lims = to_datenum(Var_Time, julian_day_units(my_day.year))
 nrows =  Var_Time.size
 ncols = datafile['NumBins'][:]
 
@@ -77,16 +68,6 @@ ncols = datafile['NumBins'][:]
 var_ATB = datafile['ATB_532'][:,:] #Change values after "ATB_" to desired wavelength 
 grid = var_ATB.reshape((nrows, ncols)) #Convert to a 2-D array format
 
-my_day =datetime.strptime(datafile['Date'][0], date_format)
-
-
-#Formatting the x-axis parameters according to the requirements of matplotlib
-#Setting up time bins and x_limits for the plot
-for i in range(0, timearray.size): 
-    x_lims.append(datetime.combine(my_day, timearray[i]))
-x_lims = [matplotlib.dates.date2num(i) for i in x_lims]
-
-
 ##### This portion of the code creates the plot of the CPL data #####
 
 Bin_index = np.where((Bin_Alt[:] >= 0)) #Removing values sampled below 0 km altitude
@@ -25,7 +25,7 @@ import matplotlib.pyplot as plt
 import matplotlib.cm as cm
 from matplotlib import rc
 from mpl_toolkits.axes_grid1 import make_axes_locatable
-from datetime import date, datetime, timedelta
+from Time_Decoding import to_datenum
 
 
 ##Set Parameters (OPeNDAP path, font and label size)
@@ -39,27 +39,13 @@ pltlbl_size = 12
 matplotlib.rcParams.update({'font.size': 10})
 
 
-##Convert the time format to UTC
-datetime_format = '%Y-%m-%d%H:%M:%S'
-date_format = '%d%b%y'
-time_format = '%H:%M:%S'
-unit_string = datafile['time'].units.replace("seconds since ","").replace("T", "").replace("Z", "")
-reference_time =  datetime.strptime(unit_string, datetime_format)
-reference_date =  reference_time.date()
-
 #Extract the range and time information from the datafile
 var_range = datafile['range'][:] #range
 var_time = datafile['time'][:] #time
-
-timearray=[] #Empty list of converted time information
-#Extracting the time from the  time data variable
-for i in range(0 , (var_time.size - 1)):
-       time_value = var_time[i].item()
-       timearray.append((reference_time + (timedelta(seconds = time_value))).time())
+time_units = datafile['time'].units #Time units, e.g. 'seconds since 2013-09-15T00:00:00Z'
 
 
 ##Format time and range information for creating a 2 panel plot
-timearray = np.array(timearray) #Convert extracted time variables to a numpy array
 var_time = np.array(var_time) #Convert to numpy array
 var_range = np.array(var_range) #Convert to numypy array
 nrows =  var_time.size/2
@@ -83,12 +69,9 @@ else:
     var_dBZ_second = np.array(var_dBZ_second) #Convert to numpy array
     grid_second = var_dBZ_second.reshape((nrows+1, ncols)) #Grid array
          
-#Format the x-axis parameter according to the requirements of matplotlib
-x_lims = []  #Create empty array for formatted x-axis information
-  
-for i in range(0, timearray.size): 
-    x_lims.append(datetime.combine(reference_date, timearray[i]))
-x_lims = [matplotlib.dates.date2num(i) for i in x_lims]
+#Format the x-axis parameter according to the requirements of matplotlib:
+#every time is converted to a matplotlib date number (UTC) in one call
+x_lims = to_datenum(var_time, time_units)
 
 
 ## Create a stacked 2 panel time-height plot of dBZ
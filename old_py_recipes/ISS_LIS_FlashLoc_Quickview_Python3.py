@@ -9,7 +9,13 @@
 #        from a directory, extracts the flash coordinates from 
 #        the files and generates a flash heat map plot. This code 
 #        also compiles all lightning flash locations into a single 
-#        CSV file, so they may be plotted using other software
+#        CSV file, so they may be plotted using other software.
+#        The flashes of every file are cached (see Flash_Granules.py),
+#        so a rerun over a growing directory only reads the new files.
+#        An optional number of days limits the map and CSV file to
+#        the last days of data, e.g. a rolling 30-day flash map:
+#
+#        Usage: python ISS_LIS_FlashLoc_Quickview_Python3.py DATA_DIR [DAYS]
 # 
 #        Authors: Amanda Markert and Essence Raphael
 #        Information and Technology Systems Center (ITSC)
@@ -22,52 +28,36 @@
 #### Import Python packages ####
 import sys
 import os
-import glob
-from netCDF4 import Dataset, num2date
 import numpy as np
-import csv
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
 import matplotlib.ticker as mticker
 from cartopy.mpl.gridliner import LONGITUDE_FORMATTER, LATITUDE_FORMATTER
+from Flash_Granules import lis_files, read_lis_flashes, LISCache
+from Flash_Export import export_flashes
+from Flash_Grid import FlashGrid, plot_counts, write_geotiff
 
 #Initial file path. It can be changed by passing a different path as an argument
 #to the main() function
 file_path = 'test_files/iss_lis'
 
-def main(file_path):
+def main(file_path, days=None, fmt='csv', res=1.0, geotiff=False, decimals=5):
   
     #Define the directory of the files
     dataDir = os.path.join(file_path, '') 
     
     #Identify all the ISS LIS NetCDF files in the directory and their paths
-    raw_files = glob.glob(dataDir+'ISS_LIS_*.nc')
-    files = [os.path.normpath(i) for i in raw_files]    
-    
-    #Extract the dates for the files
-    #Create empty lists to hold the orbit start and end times
-    orbit_start = []
-    orbit_end = []
-    
-    #Loop through the NetCDF files and for each file, extract the start and end time of the ISS LIS
-    #orbit, adding them to the respective empty list (orbit_start and orbit_end)
-    for i in files:
-        datafile = Dataset(i,'r')
-    
-        start_value = datafile.variables['orbit_summary_TAI93_start'][:].data.tolist()
-        start_value_units = datafile.variables['orbit_summary_TAI93_start']
-        end_value = datafile.variables['orbit_summary_TAI93_end'][:].data.tolist()
-        end_value_units = datafile.variables['orbit_summary_TAI93_end']
-        orbit_start.append(start_value)
-        orbit_end.append(end_value)
+    files = lis_files(dataDir)
+    if len(files) == 0:
+        print("No ISS LIS files found in " + dataDir)
+        return
 
-    #From the start and end times, calculate the minimum and maximum date of the files
-    start_dates = num2date(orbit_start[:], units=start_value_units.units)
-    stop_dates = num2date(orbit_end[:], units=end_value_units.units)
-
-    begin_date_value = min(start_dates)
-    end_date_value = max(stop_dates)
+    #Read the lightning flash latitude and longitude of all files (of the last "days" days only
+    #if given), and the earliest start and latest end time of the ISS LIS orbits they cover;
+    #files read by an earlier run are taken from the cache
+    with LISCache(dataDir) as cache:
+        flash_lat, flash_lon, begin_date_value, end_date_value = read_lis_flashes(files, cache=cache, days=days)
 
     #Create text and numerical dates to use in file names and plot title
     begin_date = begin_date_value.strftime("%B %d, %Y")
@@ -75,33 +65,26 @@ def main(file_path):
     begin_int = begin_date_value.strftime("%Y%m%d")
     end_int = end_date_value.strftime("%Y%m%d")
     
-    #Create CSV file and destination
-    csvfile = os.path.join(dataDir, 'isslis_flashloc_'+ begin_int + '_' + end_int +'.csv')
+    #Create flash location file name and destination; fmt selects a CSV file, or a typed
+    #binary 'npz' or 'parquet' file that loads faster (see Flash_Export.py)
+    flashfile = os.path.join(dataDir, 'isslis_flashloc_'+ begin_int + '_' + end_int + '.' + fmt)
       
-    #Extract lightning flash locations
-    #Create empty arrays to populate lightning flash location coordinates 
-    flash_lat = np.array([]) #latitude
-    flash_lon = np.array([]) #longitude
+    #Write the populated flash_lat/lon arrays to the flash location file, one column each; a CSV
+    #file gets "decimals" decimals per value (None writes the full precision, which is slower)
+    export_flashes(flashfile, {'flash_lat': flash_lat, 'flash_lon': flash_lon}, decimals=decimals)
 
-    #Loop through list of NetCDF files and for each file, extract the lightning flash latidude
-    #and longitude, adding them to the respective empty array (flash_lat and flash_lon)
-    for i in files:
-        datafile = Dataset(i)
-    
-        flash_lat = np.concatenate([flash_lat,datafile.variables['lightning_flash_lat'][:]]) #add to array
-        flash_lon = np.concatenate([flash_lon,datafile.variables['lightning_flash_lon'][:]]) #add to array
-    
-    #Create CSV files of values from the populated flash_lat/lon arrays  
-    with open(csvfile, 'w', newline='') as myfile:
-        writer = csv.writer(myfile)
-        writer.writerows(zip(["flash_lat"], ["flash_lon"])) #Define headers in row (zip creates columns)
-        writer.writerows(zip(flash_lat,flash_lon)) #Define data rows (zip creates columns)
+    #Count the flashes in the cells of a regular latitude/longitude grid of "res" degrees; the counts
+    #can also be written to a GeoTIFF file (requires GDAL) for GIS software
+    grid = FlashGrid(res)
+    counts = grid.count(flash_lon, flash_lat)
+    if geotiff:
+        write_geotiff(os.path.splitext(flashfile)[0] + '_counts.tif', grid, counts)
 
     #Create plot of lightning flash location heat map
     plt.figure(figsize=((20,20))) #Set plot dimensions
     map = plt.axes(projection=ccrs.PlateCarree(central_longitude=0.0))
     gl = map.gridlines(crs=ccrs.PlateCarree(central_longitude=0.0), draw_labels=True, linewidth=0.8, alpha=0.5, color='white', linestyle='--')
-    lightning = map.hexbin(flash_lon, flash_lat, gridsize=300, bins='log',cmap='jet', mincnt=1 ,zorder=10) #Bin flash counts into hexbins using a gridsize of your choice
+    lightning = plot_counts(map, grid, counts, cmap='jet', transform=ccrs.PlateCarree(), zorder=10) #Flash counts on a log color scale; choose the cell size with "res"
 
     #Draw geographic boundaries and meridians/parallels
     map.set_extent([-180, 180,-90, 90])
@@ -131,7 +114,9 @@ def main(file_path):
     plt.savefig(os.path.join(dataDir, 'isslis_flashloc_'+ begin_int + '_' + end_int +'_plot.png'), bbox_inches='tight')
         
 if __name__ == "__main__":
-    if len(sys.argv) > 1:
+    if len(sys.argv) > 2:
+        main(sys.argv[1], float(sys.argv[2]))
+    elif len(sys.argv) > 1:
         file_path = sys.argv[1]
         main(file_path)
     else:
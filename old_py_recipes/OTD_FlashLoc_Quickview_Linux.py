@@ -31,7 +31,9 @@ from pyhdf.HDF import *
 from pyhdf.VS import *
 import numpy as np
 import datetime
-import csv
+from Time_Decoding import to_datetime64, TAI93_UNITS
+from Flash_Export import export_flashes
+from Flash_Grid import FlashGrid, plot_counts, write_geotiff
 import matplotlib.pyplot as plt
 import cartopy.crs as ccrs
 import cartopy.feature as cfeature
@@ -42,7 +44,7 @@ from cartopy.mpl.gridliner import LONGITUDE_FORMATTER, LATITUDE_FORMATTER
 #to the main() function
 file_path = 'test_files/otd/'
 
-def main(file_path):
+def main(file_path, fmt='csv', res=1.0, geotiff=False, decimals=5):
 
     #Define the data directoy and identify the .tar files inside the data directory
     dataDir = os.path.join(file_path, '')
@@ -119,9 +121,7 @@ def main(file_path):
 
     #Define the units for the start and end times then convert these times 
     #(seconds since 1993-01-01 00:00:00.000) to dates
-    x = datetime.datetime(1993,1,1)
-    start_date = x + datetime.timedelta(seconds=start_seconds)
-    end_date = x + datetime.timedelta(seconds=end_seconds)
+    start_date, end_date = to_datetime64([start_seconds, end_seconds], TAI93_UNITS).astype(datetime.datetime)
 
     #Create numerical and text date & time strings to use in filenames and the flash heat map title
     start_date_txt = start_date.strftime("%B %d, %Y")
@@ -131,23 +131,29 @@ def main(file_path):
     start_time = start_date.strftime("%X")
     end_time = end_date.strftime("%X")
 
-    #Create CSV file and destination
+    #Create flash location file and destination; fmt selects a CSV file, or a typed
+    #binary 'npz' or 'parquet' file that loads faster (see Flash_Export.py)
     if start_int != end_int:
-        csvfile = os.path.join(dataDir, 'otd_'+ start_int + '_' + end_int + '_flashloc.csv')
+        flashfile = os.path.join(dataDir, 'otd_'+ start_int + '_' + end_int + '_flashloc.' + fmt)
     else:
-        csvfile = os.path.join(dataDir, 'otd_'+ start_int + '_flashloc.csv')
+        flashfile = os.path.join(dataDir, 'otd_'+ start_int + '_flashloc.' + fmt)
 
-    #Create csv file
-    with open(csvfile, 'w', newline='') as myfile:
-        writer = csv.writer(myfile)
-        writer.writerows(zip(["flash_lat"], ["flash_lon"])) #Define headers in row (zip creates columns)
-        writer.writerows(zip(flash_lats,flash_lons)) #Define data rows (zip creates columns)
+    #Write the flash latitudes and longitudes to the flash location file, one column each; a CSV
+    #file gets "decimals" decimals per value (None writes the full precision, which is slower)
+    export_flashes(flashfile, {'flash_lat': flash_lats, 'flash_lon': flash_lons}, decimals=decimals)
+
+    #Count the flashes in the cells of a regular latitude/longitude grid of "res" degrees; the counts
+    #can also be written to a GeoTIFF file (requires GDAL) for GIS software
+    grid = FlashGrid(res)
+    counts = grid.count(flash_lons, flash_lats)
+    if geotiff:
+        write_geotiff(os.path.splitext(flashfile)[0] + '_counts.tif', grid, counts)
 
     #Create plot of lightning flash location heat map
     plt.figure(figsize=((20,20))) #Set plot dimensions
     map = plt.axes(projection=ccrs.PlateCarree(central_longitude=0.0))
     gl = map.gridlines(crs=ccrs.PlateCarree(central_longitude=0.0), draw_labels=True, linewidth=0.8, alpha=0.5, color='white', linestyle='--')
-    lightning = map.hexbin(flash_lons, flash_lats, gridsize=300, bins='log',cmap='jet', mincnt=1 ,zorder=10) #Bin flash counts into hexbins using a gridsize of your choice
+    lightning = plot_counts(map, grid, counts, cmap='jet', transform=ccrs.PlateCarree(), zorder=10) #Flash counts on a log color scale; choose the cell size with "res"
 
     #Draw geographic boundaries and meridians/parallels
     map.set_extent([-180, 180,-90, 90])
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+
+##########################################################
+#
+#        Time Axis Decoding for the Airborne and Lightning
+#        Recipes
+#
+#        Description: This script converts the time
+#        variables of the recipe data sets (seconds since
+#        1970, decimal hours UTC of a flight date, decimal
+#        Julian days, TAI93 seconds since 1993) into numpy
+#        datetime64 values, seconds since 1970-01-01 or
+#        matplotlib date numbers in one vectorized call,
+#        instead of adding a timedelta to a reference time
+#        ray by ray. Times are described by CF style unit
+#        strings ('<unit> since <reference time>'); the
+#        parsed unit strings are cached, so decoding many
+#        granules with the same units parses them once.
+#
+#        Usage: from Time_Decoding import to_datenum, hours_units
+#               x = to_datenum(ds['time'][:],hours_units(flight_date))
+#
+#        Information and Technology Systems Center (ITSC)
+#        University of Alabama in Huntsville
+#
+##########################################################
+
+#Import Python packages and modules
+import re
+from datetime import datetime
+from functools import lru_cache
+import numpy as np
+import matplotlib.dates as mdates
+
+EPOCH_UNITS = 'seconds since 1970-01-01 00:00:00'
+TAI93_UNITS = 'seconds since 1993-01-01 00:00:00' #<--as in the OTD/LIS files; leap seconds are not applied
+
+#Seconds in one of each time unit
+SECONDS = {'second':1.,'sec':1.,'s':1.,'minute':60.,'min':60.,'hour':3600.,'hr':3600.,'h':3600.,'day':86400.,'d':86400.}
+
+@lru_cache(maxsize=128)
+def parse_units(units):
+    """
+    Parse a time unit string such as 'seconds since 2013-09-15T00:00:00Z'
+    Return (seconds per unit, reference time in seconds since 1970-01-01)
+    """
+    m = re.match(r'\s*([A-Za-z]+?)s?\s+since\s+(.+?)\s*$',units)
+    if(m is None or m.group(1).lower() not in SECONDS):
+        raise ValueError("Not a '<unit> since <time>' string: {!r}".format(units))
+    ref = re.sub(r'\s*(Z|UTC|GMT)$','',m.group(2).strip()) #<--the reference times are UTC
+    ref = re.sub(r'^(\d{4}-\d{2}-\d{2})[ T]?(?=\d)',r'\1T',ref) #<--'2013-09-1500:00:00' and '2013-09-15 00:00:00'
+    ref = (np.datetime64(datetime.fromisoformat(ref),'us')-np.datetime64(0,'us'))/np.timedelta64(1,'s')
+    return SECONDS[m.group(1).lower()],float(ref)
+
+def hours_units(day):
+    """Return unit string of decimal hours UTC from 00:00 of day (date/datetime or 'yyyy-mm-dd')"""
+    return 'hours since {}'.format(str(day)[:10])
+
+def julian_day_units(year):
+    """
+    Return unit string of decimal Julian days of year, where 1.0 is
+    January 1 00:00 UTC (the day count starts from December 31 of the
+    year before)
+    """
+    return 'days since {}-12-31'.format(int(year)-1)
+
+def to_seconds(values,units):
+    """
+    Convert time values in units to seconds since 1970-01-01 UTC
+    Return float64 array
+    """
+    scale,ref = parse_units(units)
+    return ref+np.asarray(values,dtype=np.float64)*scale
+
+def to_datetime64(values,units):
+    """
+    Convert time values in units to numpy datetime64[us]
+    Return datetime64 array; .astype(datetime) gives datetime objects
+    """
+    return np.rint(to_seconds(values,units)*1e6).astype('int64').astype('datetime64[us]')
+
+def to_datenum(values,units):
+    """
+    Convert time values in units to matplotlib date numbers (days since the
+    matplotlib epoch), the values date2num returns for the same times
+    Return float64 array
+    """
+    return (to_seconds(values,units)-_mpl_epoch())/86400.
+
+@lru_cache(maxsize=None)
+def _mpl_epoch_of(epoch):
+    return parse_units('seconds since '+epoch)[1]
+
+def _mpl_epoch():
+    """Return the matplotlib date epoch in seconds since 1970-01-01"""
+    return _mpl_epoch_of(mdates.get_epoch()) #<--'1970-01-01T00:00:00' unless changed by the user
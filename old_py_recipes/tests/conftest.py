@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+#Shared helpers of the recipe tests: the recipe modules are imported from the
+#directory above, and small synthetic CRS and ISS LIS granules are written the
+#way CRS_Benchmark.py writes its synthetic granules
+
+import os,sys
+import numpy as np
+import h5py
+import matplotlib
+from netCDF4 import Dataset
+
+matplotlib.use('Agg') #<--no display while testing
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from CRS_Benchmark import synthetic_fields
+from Time_Decoding import TAI93_UNITS
+
+def write_impacts(path,times,ngate=40,seed=0):
+    """
+    Write an IMPACTS CRS granule with rays at times (seconds since 1970) and
+    ngate range gates from 0 to 25 km
+    Return path, reflectivity and Doppler velocity written
+    """
+    ref,dop = synthetic_fields(len(times),ngate,seed)
+    with h5py.File(path,'w') as f:
+        f['Time/Data/TimeUTC'] = np.asarray(times,dtype=np.float64)
+        f['Products/Information/Range'] = np.linspace(0,25000,ngate)
+        f.create_dataset('Products/Data/dBZe',data=ref,chunks=(min(16,len(times)),ngate))
+        f.create_dataset('Products/Data/Velocity_corrected',data=dop,chunks=(min(16,len(times)),ngate))
+    return path,ref,dop
+
+def write_lis(path,start,lat=(),lon=(),time=()):
+    """
+    Write an ISS LIS granule of one orbit starting at start (TAI93 seconds)
+    with flashes at lat/lon and time (seconds after start)
+    Return path
+    """
+    n = len(lat)
+    with Dataset(path,'w') as nc:
+        nc.createDimension('orbit_summary',1)
+        nc.createDimension('lightning_flash',n)
+        for nm,v in (('orbit_summary_TAI93_start',start),('orbit_summary_TAI93_end',start+5580.)):
+            x = nc.createVariable(nm,'f8',('orbit_summary',))
+            x.units = TAI93_UNITS
+            x[:] = v
+        nc.createVariable('lightning_flash_lat','f4',('lightning_flash',))[:] = np.asarray(lat,dtype=np.float32)
+        nc.createVariable('lightning_flash_lon','f4',('lightning_flash',))[:] = np.asarray(lon,dtype=np.float32)
+        x = nc.createVariable('lightning_flash_TAI93_time','f8',('lightning_flash',))
+        x.units = TAI93_UNITS
+        x[:] = start+np.asarray(time,dtype=np.float64)
+    return path
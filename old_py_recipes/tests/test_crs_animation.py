@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the frame-by-frame GIF writer of CRS_Animation.py
+
+import os
+import numpy as np
+import pytest
+from PIL import Image
+
+import CRS_Animation
+from CRS_Animation import write_gif
+
+def frames(n,shape=(30,40)):
+    """Return n 'P' mode images sharing one palette, every frame different"""
+    palette = Image.new('P',(1,1))
+    palette.putpalette(np.arange(256*3,dtype=np.uint8).tolist())
+    rs = np.random.default_rng(0)
+    images = []
+    for k in range(n):
+        im = Image.fromarray(rs.integers(0,256,shape).astype(np.uint8),'P')
+        im.putpalette(palette.getpalette())
+        images.append(im)
+    return images
+
+@pytest.mark.parametrize('stream',[True,False])
+def test_gif_frames(tmp_path,monkeypatch,stream):
+    if(stream and not CRS_Animation.STREAM_GIF): pytest.skip('Pillow without the GIF helpers')
+    monkeypatch.setattr(CRS_Animation,'STREAM_GIF',stream)
+    images = frames(5)
+    out = os.path.join(tmp_path,'curtain.gif')
+    assert write_gif(out,(im for im in images),duration=100)==5
+    with Image.open(out) as gif:
+        assert gif.n_frames==5
+        assert gif.info['loop']==0
+        for k,im in enumerate(images):
+            gif.seek(k)
+            assert gif.info['duration']==100
+            np.testing.assert_array_equal(np.asarray(gif.convert('RGB')),np.asarray(im.convert('RGB')))
+
+def test_no_frames(tmp_path):
+    out = os.path.join(tmp_path,'curtain.gif')
+    assert write_gif(out,iter(()),duration=100)==0
+    assert not os.path.exists(out)
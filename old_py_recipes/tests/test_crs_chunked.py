@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the block-by-block column reduction of CRS_Chunked.py
+
+import os
+from datetime import datetime
+import numpy as np
+import pytest
+
+from conftest import write_impacts
+from CRS_Benchmark import synthetic_fields
+from CRS_Chunked import ColumnReducer, reduce_CRS, EPOCH
+from CRS_Recipe_Functions import CRSCurtain, read_CRS_window
+
+def curtain(nray=1000,ngate=30):
+    """Return CRSCurtain of nray rays every 0.5 s with missing values, and with SpW"""
+    ref,dop = synthetic_fields(nray,ngate)
+    spw = np.abs(synthetic_fields(nray,ngate,seed=2)[1])/4
+    return CRSCurtain(1.5e9+np.arange(nray)*0.5,np.linspace(5,20,ngate),ref,dop,'impacts','synthetic.h5',SpW=spw)
+
+def block(cur,a,b):
+    return CRSCurtain(cur.time[a:b],cur.range,cur.Ref[a:b],cur.DopV[a:b],cur.campaign,cur.fname,SpW=cur.SpW[a:b])
+
+def reduce(cur,ncols,how,bounds):
+    reducer = ColumnReducer(cur.time[0],cur.time[-1],ncols,how)
+    for a,b in zip(bounds[:-1],bounds[1:]):
+        reducer.add(block(cur,a,b))
+    return reducer.result()
+
+@pytest.mark.parametrize('how',['max','mean','physical'])
+@pytest.mark.parametrize('bounds',[[0,1,2,500,1000],[0,333,334,667,999,1000],list(range(0,1001,7))+[1000]])
+def test_blocks_equal_one_shot(how,bounds):
+    cur = curtain()
+    once = reduce(cur,97,how,[0,len(cur)])
+    blocks = reduce(cur,97,how,sorted(set(bounds)))
+    np.testing.assert_array_equal(blocks.time,once.time)
+    for vnm in ('Ref','DopV','SpW'):
+        np.testing.assert_allclose(blocks[vnm],once[vnm],rtol=1e-5,atol=1e-5,equal_nan=True)
+
+@pytest.fixture
+def granule(tmp_path):
+    """IMPACTS granule of 600 rays every 0.25 s, HDF5 chunks of 16 rays"""
+    path = os.path.join(tmp_path,'IMPACTS_CRS_L1B_RevA_20200118T120000_to_20200118T120229.h5')
+    return write_impacts(path,(datetime(2020,1,18,12)-EPOCH).total_seconds()+np.arange(600)*0.25)[0]
+
+@pytest.mark.parametrize('end',[datetime(2020,1,18,12,0,30),datetime(2020,1,18,12,2,30)])
+def test_short_window_equals_full_read(granule,end):
+    start = datetime(2020,1,18,12,0,10)
+    full = read_CRS_window(granule,'impacts',start,end)
+    assert 0<len(full)<=1200
+    cur = reduce_CRS(granule,1200,start,end,max_mem='16K') #<--as CRS_Batch_Render --max-mem, many blocks
+    np.testing.assert_array_equal(cur.time,full.time)
+    np.testing.assert_array_equal(cur.range,full.range)
+    for vnm in ('Ref','DopV'):
+        np.testing.assert_array_equal(cur[vnm],full[vnm])
+
+def test_long_window_reduced(granule):
+    cur = reduce_CRS(granule,100,max_mem='16K')
+    assert len(cur)==100
+    assert not np.isnan(cur.Ref).all(axis=1).any() #<--no empty columns
@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the curtain files written and read back by CRS_Export.py
+
+import os
+from datetime import datetime
+import numpy as np
+import h5py
+
+from conftest import write_impacts
+from CRS_Benchmark import synthetic_fields
+from CRS_Export import CurtainStore, export_curtain, export_flight, load_curtain
+from CRS_Flight import CRSFlight, EPOCH
+from CRS_Recipe_Functions import CRSCurtain
+
+START = (datetime(2020,1,18,12)-EPOCH).total_seconds()
+
+def curtain(nray,t0=START,seed=0,**extra):
+    ref,dop = synthetic_fields(nray,30,seed)
+    return CRSCurtain(t0+np.arange(nray)*0.5,np.linspace(5,20,30),ref,dop,'impacts','synthetic.h5',**extra)
+
+def same(a,b):
+    np.testing.assert_array_equal(a.time,b.time)
+    np.testing.assert_array_equal(a.range,b.range)
+    assert a.variables()==b.variables()
+    for vnm in a.variables():
+        np.testing.assert_array_equal(a[vnm],b[vnm])
+
+def test_round_trip_every_variable(tmp_path):
+    spw,ldr = synthetic_fields(200,30,seed=2)
+    cur = curtain(200,SpW=np.abs(spw)/4,LDR=ldr-40)
+    path = export_curtain(cur,os.path.join(tmp_path,'curtain.nc4'))
+    back = load_curtain(path)
+    same(back,cur)
+    assert back.campaign=='impacts' and os.path.basename(back.fname)=='synthetic.h5'
+
+    start,end = datetime(2020,1,18,12,0,20),datetime(2020,1,18,12,0,40)
+    window = load_curtain(path,start,end)
+    i0,i1 = 40,81
+    np.testing.assert_array_equal(window.time,cur.time[i0:i1])
+    np.testing.assert_array_equal(window.LDR,cur.LDR[i0:i1])
+
+def test_without_optional_variables(tmp_path):
+    cur = curtain(50)
+    back = load_curtain(export_curtain(cur,os.path.join(tmp_path,'curtain.nc4')))
+    assert back.variables()==['Ref','DopV']
+    same(back,cur)
+
+def test_later_curtain_without_variable(tmp_path):
+    spw = np.abs(synthetic_fields(20,30,seed=2)[1])
+    path = os.path.join(tmp_path,'curtain.nc4')
+    with CurtainStore(path) as store:
+        store.append(curtain(20,SpW=spw))
+        store.append(curtain(10,t0=START+10))
+    back = load_curtain(path)
+    assert len(back)==30 and back.variables()==['Ref','DopV','SpW']
+    np.testing.assert_array_equal(back.SpW[:20],spw.astype(np.float32))
+    assert np.isnan(back.SpW[20:]).all()
+
+def test_export_flight_extra(tmp_path):
+    path,ref,dop = write_impacts(os.path.join(tmp_path,'IMPACTS_CRS_L1B_RevA_20200118T120000_to_20200118T120049.h5'),
+                                 START+np.arange(100)*0.5)
+    spw = np.abs(synthetic_fields(100,40,seed=3)[1])
+    with h5py.File(path,'a') as f:
+        f['Products/Data/SpectrumWidth'] = spw
+    flight = CRSFlight([path])
+    out = os.path.join(tmp_path,'flight.nc4')
+    assert export_flight(flight,out,rmin=0,rmax=25,extra=('SpW','LDR'))==100
+    same(load_curtain(out),flight.read(rmin=0,rmax=25,extra=('SpW','LDR')))
+    assert load_curtain(out).LDR is None
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the stitching of overlapping CRS granules by CRS_Flight.py
+
+import os
+from datetime import datetime
+import numpy as np
+import pytest
+
+from conftest import write_impacts
+from CRS_Flight import CRSFlight, EPOCH
+from CRS_Recipe_Functions import time_index_range
+
+START = (datetime(2020,1,18,12)-EPOCH).total_seconds()
+
+@pytest.fixture
+def flight(tmp_path):
+    """
+    Two granules whose overlap repeats the last 3 rays of the first, plus a
+    ray less than a microsecond after its last ray
+    Return CRSFlight (granules given out of order), expected times, Ref rows
+    """
+    a = START+np.arange(100)*0.5
+    b = np.concatenate((a[-3:],[a[-1]+4e-7],a[-1]+0.5+np.arange(50)*0.5))
+    pa,refa,dopa = write_impacts(os.path.join(tmp_path,'IMPACTS_CRS_L1B_RevA_20200118T120000_to_20200118T120049.h5'),a)
+    pb,refb,dopb = write_impacts(os.path.join(tmp_path,'IMPACTS_CRS_L1B_RevA_20200118T120048_to_20200118T120114.h5'),b,seed=1)
+    keep = b>a[-1]+1e-6 #<--the rays of b after the overlap
+    return CRSFlight([pb,pa]),np.concatenate((a,b[keep])),np.concatenate((refa,refb[keep]))
+
+def test_stitched_time(flight):
+    flight,time,ref = flight
+    assert flight.files[0].endswith('120049.h5')
+    np.testing.assert_array_equal(flight.time,time)
+    assert (np.diff(flight.time)>0).all()
+    assert len(flight)==150
+
+def test_time_and_windows_agree(flight):
+    flight,time,ref = flight
+    cur = flight.read(datetime(2020,1,18,12),datetime(2020,1,18,12,2)) #<--through windows()
+    np.testing.assert_array_equal(cur.time,time)
+    (f0,lo0,hi0),(f1,lo1,hi1) = flight.windows(datetime(2020,1,18,12),datetime(2020,1,18,12,2))
+    assert lo1==flight.after(flight.cutoffs[1])
+    np.testing.assert_array_equal(flight.read().time,time) #<--entire flight, by ray index
+
+@pytest.mark.parametrize('i0,i1',[(0,None),(0,1),(98,102),(99,100),(100,101),(37,149),(149,150),(60,60)])
+def test_read_index(flight,i0,i1):
+    flight,time,ref = flight
+    cur = flight.read_index(i0,i1,rmin=0,rmax=25)
+    np.testing.assert_array_equal(cur.time,time[i0:i1])
+    if(len(cur)): np.testing.assert_array_equal(cur.Ref,ref[i0:i1])
+
+def test_subset_window(flight):
+    flight,time,ref = flight
+    start,end = datetime(2020,1,18,12,0,40),datetime(2020,1,18,12,1,0)
+    i0,i1 = time_index_range(flight.time,start,end)
+    np.testing.assert_array_equal(flight.read(start,end).time,time[i0:i1])
+    np.testing.assert_array_equal(flight.read_index(i0,i1).time,time[i0:i1])
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the background image writer FigureWriter of CRS_Recipe_Functions.py
+
+import os
+import numpy as np
+import matplotlib.pyplot as plt
+from PIL import Image
+
+from CRS_Recipe_Functions import FigureWriter
+
+def figure():
+    fig,ax = plt.subplots(figsize=(8,3))
+    ax.pcolormesh(np.random.default_rng(0).normal(size=(20,60)))
+    ax.set_title('CRS curtain')
+    ax.set_ylabel('Range (km)')
+    return fig
+
+def test_tight_crop_matches_savefig(tmp_path):
+    ref = os.path.join(tmp_path,'savefig.png')
+    figure().savefig(ref,dpi=100,bbox_inches='tight')
+    with FigureWriter(dpi=100) as writer:
+        writer.submit(figure(),os.path.join(tmp_path,'writer.png'))
+    with Image.open(ref) as a, Image.open(os.path.join(tmp_path,'writer.png')) as b:
+        assert abs(a.size[0]-b.size[0])<=2 and abs(a.size[1]-b.size[1])<=2
+    plt.close('all')
+
+def test_whole_figure(tmp_path):
+    path = os.path.join(tmp_path,'whole.png')
+    with FigureWriter(dpi=50,tight=False) as writer:
+        path,when = writer.submit(figure(),path).result()
+    with Image.open(path) as im:
+        assert im.size==(400,150)
+
+def test_failed_write_reported(tmp_path,capsys):
+    writer = FigureWriter(dpi=50)
+    good = os.path.join(tmp_path,'good.png')
+    bad = os.path.join(tmp_path,'missing','bad.png') #<--no such directory
+    writer.submit(figure(),good)
+    writer.submit(figure(),bad)
+    failed = writer.close()
+    assert [path for path,err in failed]==[bad]
+    assert isinstance(failed[0][1],OSError)
+    assert os.path.exists(good)
+    assert "Could not save "+bad in capsys.readouterr().out
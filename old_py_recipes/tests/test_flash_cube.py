@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the journaled batches of the flash count cube of Flash_Cube.py
+
+import os
+import numpy as np
+import pytest
+
+from conftest import write_lis
+from Flash_Cube import FlashCube
+from Flash_Granules import lis_files, read_lis_granule
+
+T0 = 933552000. #<--2022-08-01 in TAI93 seconds
+
+@pytest.fixture
+def files(tmp_path):
+    """ISS LIS granules of 30 orbits (about two days), some without flashes"""
+    d = os.path.join(tmp_path,'data')
+    os.makedirs(d)
+    rs = np.random.default_rng(0)
+    for k in range(30):
+        n = 0 if k%7==3 else int(rs.integers(1,200))
+        write_lis(os.path.join(d,'ISS_LIS_SC_V2.1_{:05d}.nc'.format(k)),T0+k*5580.,
+                  rs.uniform(-55,55,n),rs.uniform(-180,180,n),np.sort(rs.uniform(0,5580,n)))
+    return lis_files(d)
+
+def build(path,files,batch=8):
+    cube = FlashCube.create(path,'2022-08-01',step='hour',res=5.0)
+    cube.ingest(files,batch=batch,workers=2)
+    return cube
+
+def test_cube_counts(files,tmp_path):
+    cube = build(os.path.join(tmp_path,'cube'),files)
+    flashes = [read_lis_granule(f) for f in files]
+    assert cube.map().sum()==sum(len(g['lat']) for g in flashes)
+    assert cube.series()[1].sum()==cube.map().sum()
+    assert cube.pending(files)==[]
+
+def test_replay_after_interrupted_add(files,tmp_path,monkeypatch):
+    reference = build(os.path.join(tmp_path,'reference'),files).map()
+    path = os.path.join(tmp_path,'cube')
+    cube = FlashCube.create(path,'2022-08-01',step='hour',res=5.0)
+    cube.ingest(files[:8],workers=2)
+
+    #The run stops after the counts of the next batch were written, before they are recorded
+    def crash(self,index,values,granules):
+        if(len(index)):
+            self.counts.reshape(-1)[index] = values
+            self.counts.flush()
+        raise KeyboardInterrupt
+    with monkeypatch.context() as m:
+        m.setattr(FlashCube,'_apply',crash)
+        with pytest.raises(KeyboardInterrupt):
+            cube.ingest(files[8:16],workers=2)
+    del cube
+    assert os.path.exists(os.path.join(path,'journal.npz'))
+
+    cube = FlashCube(path) #<--replays the journal
+    assert not os.path.exists(os.path.join(path,'journal.npz'))
+    assert cube.pending(files)==files[16:]
+    cube = FlashCube(path) #<--opening again changes nothing
+    cube.ingest(files,workers=2)
+    np.testing.assert_array_equal(cube.map(),reference)
+
+def test_replay_before_counts_written(files,tmp_path,monkeypatch):
+    reference = build(os.path.join(tmp_path,'reference'),files[:16]).map()
+    path = os.path.join(tmp_path,'cube')
+    cube = FlashCube.create(path,'2022-08-01',step='hour',res=5.0)
+    cube.ingest(files[:8],workers=2)
+
+    #The run stops once the journal of the next batch is written
+    def stop(self,*args):
+        raise KeyboardInterrupt
+    with monkeypatch.context() as m:
+        m.setattr(FlashCube,'_apply',stop)
+        with pytest.raises(KeyboardInterrupt):
+            cube.ingest(files[8:16],workers=2)
+    del cube
+    cube = FlashCube(path)
+    assert cube.pending(files)==files[16:]
+    np.testing.assert_array_equal(cube.map(),reference)
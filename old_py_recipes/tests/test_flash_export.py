@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the flash location tables written by Flash_Export.py
+
+import csv
+import io
+import os
+import numpy as np
+import pytest
+
+from Flash_Export import export_flashes, format_rows, load_flashes, write_csv
+
+def flashes(n=1000,seed=0):
+    rs = np.random.default_rng(seed)
+    lat = rs.uniform(-55,55,n).astype(np.float32).astype(np.float64) #<--as the recipes read them
+    lon = rs.uniform(-180,180,n).astype(np.float32).astype(np.float64)
+    return {'flash_lat':lat,'flash_lon':lon}
+
+def csv_writer_text(columns):
+    out = io.StringIO(newline='')
+    w = csv.writer(out)
+    w.writerow(list(columns))
+    for row in zip(*[np.asarray(c).tolist() for c in columns.values()]):
+        w.writerow(row)
+    return out.getvalue()
+
+def test_repr_rows_equal_csv_writer(tmp_path):
+    columns = flashes()
+    columns['flash_lat'][:3] = [np.nan,np.inf,-0.0]
+    path = write_csv(os.path.join(tmp_path,'flashes.csv'),columns,chunk_rows=333)
+    with open(path,newline='') as f:
+        assert f.read()==csv_writer_text(columns)
+
+@pytest.mark.parametrize('decimals',[0,1,5])
+def test_decimals_equal_fixed_format(decimals):
+    values = np.concatenate((flashes()['flash_lon'],[0.,-0.0,-1e-9,0.5,-0.5,1.5,99.99999,-99.999996,123456.,np.nan,np.inf,-np.inf]))
+    rows = format_rows([values],decimals).split('\r\n')[:-1]
+    expected = ['%.{}f'.format(decimals) % v for v in values]
+    expected = [e.lstrip('-') if float(e)==0 and np.isfinite(v) else e for e,v in zip(expected,values)] #<--no '-0.0'
+    assert rows==expected
+
+def test_large_values_use_fixed_format():
+    rows = format_rows([np.array([1e17,-2.5])],2)
+    assert rows=='%.2f\r\n%.2f\r\n' % (1e17,-2.5)
+
+def test_recipe_csv_round_trip(tmp_path):
+    columns = flashes()
+    path = export_flashes(os.path.join(tmp_path,'isslis_flashloc.csv'),columns,decimals=5)
+    back = load_flashes(path)
+    assert list(back)==['flash_lat','flash_lon']
+    for nm in columns:
+        np.testing.assert_allclose(back[nm],columns[nm],rtol=0,atol=5e-6)
+
+def test_npz_round_trip(tmp_path):
+    columns = flashes()
+    back = load_flashes(export_flashes(os.path.join(tmp_path,'flashes.npz'),columns))
+    for nm in columns:
+        np.testing.assert_array_equal(back[nm],columns[nm])
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the per-granule ISS LIS flash cache of Flash_Granules.py
+
+import os
+import numpy as np
+import pytest
+
+from conftest import write_lis
+from Flash_Granules import LISCache, lis_files, read_lis_granule, read_lis_flashes
+
+T0 = 933552000. #<--2022-08-01 in TAI93 seconds
+
+def granule(d,k,n,seed=0):
+    rs = np.random.default_rng(seed)
+    return write_lis(os.path.join(d,'ISS_LIS_SC_V2.1_{:05d}.nc'.format(k)),T0+k*5580.,
+                     rs.uniform(-55,55,n),rs.uniform(-180,180,n),np.sort(rs.uniform(0,5580,n)))
+
+@pytest.fixture
+def data(tmp_path):
+    d = os.path.join(tmp_path,'data')
+    os.makedirs(d)
+    for k,n in enumerate((40,0,25)):
+        granule(d,k,n,seed=k)
+    return d
+
+def same(cached,read):
+    for key in ('start','end'):
+        assert cached[key]==read[key]
+    for key in ('lat','lon','time'):
+        np.testing.assert_array_equal(cached[key],read[key])
+
+def test_update_reads_only_stale_granules(data,tmp_path):
+    files = lis_files(data)
+    with LISCache(data,cacheDir=os.path.join(tmp_path,'cache')) as cache:
+        assert cache.update(files)==3
+        assert cache.update(files)==0
+        for f,g in zip(files,cache.granules(files)): same(g,read_lis_granule(f))
+
+        #A granule rewritten with other flashes is read again, even with the same size and an older mtime
+        st = os.stat(files[0])
+        granule(data,0,40,seed=7)
+        os.utime(files[0],ns=(st.st_atime_ns,st.st_mtime_ns-10**9))
+        assert cache.update(files)==1
+        same(cache.granules(files[:1])[0],read_lis_granule(files[0]))
+
+        #A lost cache file, and a new granule
+        os.remove(os.path.join(cache.root,os.path.basename(files[2])+'.npy'))
+        assert cache.update(files)==1
+        granule(data,3,5)
+        files = lis_files(data)
+        assert cache.update(files)==1
+        assert cache.update(files)==0
+
+        os.remove(files[1])
+        assert cache.prune()==1
+
+def test_cached_flashes_equal_direct_read(data,tmp_path):
+    files = lis_files(data)
+    with LISCache(data,cacheDir=os.path.join(tmp_path,'cache')) as cache:
+        cached = read_lis_flashes(files,workers=2,cache=cache)
+    direct = read_lis_flashes(files,workers=2)
+    for c,d in zip(cached,direct):
+        np.testing.assert_array_equal(c,d)
+    assert len(direct[0])==65
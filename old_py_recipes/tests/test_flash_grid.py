@@ -0,0 +1,36 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the flash counting of Flash_Grid.py
+
+import numpy as np
+
+from Flash_Grid import FlashGrid
+
+def test_edge_cells():
+    grid = FlashGrid(1.0)
+    assert grid.shape==(180,360)
+    lon = [-180.,180.,0.,-0.5,179.999,-180.,180.,10.2]
+    lat = [-90.,90.,0.,-0.5,-89.999,90.,-90.,-90.]
+    counts = grid.count(lon,lat)
+    expected = np.zeros(grid.shape,dtype=np.int64)
+    for row,col in [(0,0),(179,359),(90,180),(89,179),(0,359),(179,0),(0,359),(0,190)]:
+        expected[row,col] += 1
+    np.testing.assert_array_equal(counts,expected)
+
+def test_outside_and_missing_not_counted():
+    grid = FlashGrid(0.5,(-100.,-80.,20.,40.))
+    lon = [-100.,-80.,-100.01,-79.99,-90.,np.nan,-90.]
+    lat = [20.,40.,30.,30.,19.99,30.,np.nan]
+    counts = grid.count(lon,lat)
+    assert counts.sum()==2
+    assert counts[0,0]==1 and counts[-1,-1]==1
+    np.testing.assert_array_equal(grid.cells(lon,lat)[2:],-1)
+
+def test_chunks_equal_histogram():
+    rs = np.random.default_rng(0)
+    lon,lat = rs.uniform(-180,180,100000),rs.uniform(-90,90,100000)
+    grid = FlashGrid(2.5)
+    counts = grid.count(lon,lat,chunk=999)
+    lon_edges,lat_edges = grid.edges()
+    hist = np.histogram2d(lat,lon,bins=(lat_edges,lon_edges))[0]
+    np.testing.assert_array_equal(counts,hist)
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the chunk-aligned hyperslab reads of IMPACTS CRS files of CRS_Recipe_Functions.py
+
+import os
+import numpy as np
+import h5py
+import pytest
+
+from conftest import write_impacts
+from CRS_Recipe_Functions import chunk_blocks, read_impacts_window
+
+@pytest.mark.parametrize('i0,i1,chunk',[(0,100,16),(5,100,16),(16,32,16),(17,18,16),(3,40,None),(7,7,16)])
+def test_chunk_blocks(i0,i1,chunk):
+    blocks = chunk_blocks(i0,i1,chunk)
+    assert [i for a,b in blocks for i in range(a,b)]==list(range(i0,i1))
+    if(chunk): assert len({a//chunk for a,b in blocks})==len(blocks)==len({(b-1)//chunk for a,b in blocks})
+
+@pytest.fixture
+def granule(tmp_path):
+    return write_impacts(os.path.join(tmp_path,'IMPACTS_CRS_L1B_RevA_20200118T120000_to_20200118T120049.h5'),
+                         1.5793488e9+np.arange(100)*0.5)
+
+@pytest.mark.parametrize('i0,i1',[(0,100),(5,37),(16,48),(99,100),(40,40)])
+def test_window_equals_slice(granule,i0,i1):
+    path,ref,dop = granule
+    with h5py.File(path,'r') as ds:
+        rng = ds['Products/Information/Range'][:]/1000
+        cur = read_impacts_window(ds,i0,i1,rmin=5,rmax=20)
+    g = (rng>=5) & (rng<=20)
+    np.testing.assert_array_equal(cur.range,rng[g].astype(np.float32))
+    np.testing.assert_array_equal(cur.time,1.5793488e9+np.arange(i0,i1)*0.5)
+    np.testing.assert_array_equal(cur.Ref,ref[i0:i1][:,g].astype(np.float32))
+    np.testing.assert_array_equal(cur.DopV,dop[i0:i1][:,g].astype(np.float32))
+    assert cur.Ref.dtype==np.float32 and cur.SpW is None
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the index-based subsets of netCDF CRS datasets of CRS_Recipe_Functions.py
+
+import numpy as np
+import xarray as xr
+import pytest
+
+from CRS_Recipe_Functions import CRSsubset, CRSsubset_goesrplt, isel_hours, totime
+
+def dataset(tname):
+    hours = 12+np.arange(720)*5/3600. #<--rays every 5 s from 12:00:00
+    return xr.Dataset({tname:(('time',),hours),
+                       'zku':(('time','range'),np.random.default_rng(0).normal(size=(720,10)))})
+
+def mask_subset(ds,tname,t1,t2):
+    """The subset of the boolean mask the functions used to build"""
+    return ds.where((ds[tname]>=float(t1)) & (ds[tname]<=float(t2)),drop=True)
+
+@pytest.mark.parametrize('t1,t2',[('12:10:00','12:20:00'),('11:00:00','12:00:00'),('12:59:55','14:00:00'),
+                                  ('10:00:00','11:00:00'),('12:30:02','12:30:04'),('12:20:00','12:10:00')])
+def test_subset_equals_mask(t1,t2):
+    for tname,subset in (('timed',CRSsubset),('time',CRSsubset_goesrplt)):
+        ds = dataset(tname)
+        cs = subset(ds,t1,t2)
+        expected = mask_subset(ds,tname,totime(t1),totime(t2))
+        np.testing.assert_array_equal(cs[tname].values,expected[tname].values)
+        np.testing.assert_array_equal(cs['zku'].values,expected['zku'].values)
+
+def test_isel_hours_inclusive():
+    ds = dataset('timed')
+    cs = isel_hours(ds,'timed',ds.timed.values[120],ds.timed.values[192])
+    np.testing.assert_array_equal(cs.timed.values,ds.timed.values[120:193])
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the memory-mapped netCDF-3 datasets kept by open_CRS_nc of CRS_Recipe_Functions.py
+
+import os
+import numpy as np
+import pytest
+from scipy.io import netcdf_file
+
+import CRS_Recipe_Functions
+from CRS_Recipe_Functions import open_CRS_nc, close_CRS_nc
+
+def write_nc3(path,nray=50,ngate=20,seed=0):
+    """Write a netCDF-3 file with a time vector and one (time,range) variable; Return path, values"""
+    ref = np.random.default_rng(seed).normal(10,5,(nray,ngate)).astype(np.float32)
+    with netcdf_file(path,'w') as nc:
+        nc.title = 'CRS test file'
+        nc.createDimension('time',nray)
+        nc.createDimension('range',ngate)
+        t = nc.createVariable('timed','f8',('time',))
+        t[:] = 12+np.arange(nray)/3600.
+        t.units = 'hours UTC'
+        v = nc.createVariable('zku','f4',('time','range'))
+        v[:] = ref
+        v.units,v.long_name = 'dBZ','reflectivity'
+    return path,ref
+
+@pytest.fixture
+def files(tmp_path):
+    yield [write_nc3(os.path.join(tmp_path,'crs_{}.nc'.format(k)),seed=k) for k in range(3)]
+    close_CRS_nc()
+
+def test_values_and_attributes(files):
+    (path,ref),_,_ = files
+    ds = open_CRS_nc(path)
+    np.testing.assert_array_equal(ds['zku'].values,ref)
+    assert ds['zku'].attrs=={'units':'dBZ','long_name':'reflectivity'}
+    assert ds['timed'].attrs['units']=='hours UTC'
+    assert ds.attrs['title']=='CRS test file'
+
+def test_reused_until_changed(files):
+    (path,ref),_,_ = files
+    ds = open_CRS_nc(path)
+    assert open_CRS_nc(path) is ds
+    st = os.stat(path)
+    new = write_nc3(path+'.tmp',seed=9)[1]
+    os.replace(path+'.tmp',path) #<--a new file under the same name
+    os.utime(path,ns=(st.st_atime_ns,st.st_mtime_ns+10**9))
+    again = open_CRS_nc(path)
+    assert again is not ds
+    np.testing.assert_array_equal(again['zku'].values,new)
+    np.testing.assert_array_equal(ds['zku'].values,ref) #<--a dataset in use keeps its own mapping
+
+def test_least_recently_used_dropped(files,monkeypatch):
+    monkeypatch.setattr(CRS_Recipe_Functions,'MAX_NC3_FILES',2)
+    (a,ra),(b,rb),(c,rc) = files
+    da,db = open_CRS_nc(a),open_CRS_nc(b)
+    assert open_CRS_nc(a) is da #<--a is now the most recently used
+    dc = open_CRS_nc(c)
+    assert list(CRS_Recipe_Functions._NC3_FILES)==[os.path.abspath(a),os.path.abspath(c)]
+    assert open_CRS_nc(a) is da and open_CRS_nc(c) is dc
+    assert open_CRS_nc(b) is not db
+    np.testing.assert_array_equal(db['zku'].values,rb)
+
+def test_close(files):
+    (a,ra),(b,rb),_ = files
+    da = open_CRS_nc(a)
+    open_CRS_nc(b)
+    close_CRS_nc(a)
+    assert list(CRS_Recipe_Functions._NC3_FILES)==[os.path.abspath(b)]
+    assert open_CRS_nc(a) is not da
+    close_CRS_nc('not_opened.nc') #<--nothing to drop
+    close_CRS_nc()
+    assert len(CRS_Recipe_Functions._NC3_FILES)==0
+    np.testing.assert_array_equal(da['zku'].values,ra)
@@ -0,0 +1,45 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the pooling to pixel columns of the raster plots of CRS_Recipe_Functions.py
+
+import warnings
+from datetime import datetime, timedelta
+import numpy as np
+import matplotlib.pyplot as plt
+import pytest
+
+from CRS_Benchmark import synthetic_fields
+from CRS_Recipe_Functions import CRSCurtain, cell_edges, group_starts, plot_CRS2D, pool_time
+
+def test_cell_edges():
+    np.testing.assert_allclose(cell_edges([0.,1.,3.]),[-0.5,0.5,2.,4.])
+    np.testing.assert_allclose(cell_edges([2.]),[1.5,2.5])
+
+@pytest.mark.parametrize('how',['max','mean'])
+def test_pool_time_equals_loop(how):
+    var = synthetic_fields(1000,30)[0]
+    xe = np.arange(1001.)
+    pooled,edges = pool_time(var,xe,97,how)
+    starts = group_starts(1000,nrays=97)
+    assert len(pooled)==len(starts)==97 and len(edges)==98
+    bounds = np.append(starts,1000)
+    reduce = np.nanmax if how=='max' else np.nanmean
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore',RuntimeWarning) #<--columns without any value
+        expected = np.array([reduce(var[a:b],axis=0) for a,b in zip(bounds[:-1],bounds[1:])])
+    np.testing.assert_allclose(pooled,expected,rtol=1e-5,atol=1e-5,equal_nan=True)
+    np.testing.assert_array_equal(edges,xe[bounds])
+
+def test_few_rays_not_pooled():
+    var = synthetic_fields(50,30)[0]
+    pooled,edges = pool_time(var,np.arange(51.),97)
+    np.testing.assert_array_equal(pooled,var.astype(np.float32))
+
+@pytest.mark.parametrize('method,pool',[('raster','max'),('raster','physical'),('contour','max')])
+def test_plot_methods(method,pool):
+    ref,dop = synthetic_fields(3000,40)
+    t = datetime(2020,1,18,12)
+    cur = CRSCurtain(1.5793488e9+np.arange(3000)*0.5,np.linspace(5,20,40),ref,dop,'impacts','synthetic.h5')
+    fig = plot_CRS2D(cur,cur.datetimes(),cur.range,t,t+timedelta(minutes=25),method=method,pool=pool,show=False)
+    assert len(fig.axes)>=2
+    plt.close(fig)
@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the CF time unit decoding of Time_Decoding.py
+
+from datetime import datetime
+import numpy as np
+import pytest
+
+from Time_Decoding import (parse_units, to_seconds, to_datetime64, hours_units, julian_day_units,
+                           EPOCH_UNITS, TAI93_UNITS)
+
+def epoch(*args):
+    return (datetime(*args)-datetime(1970,1,1)).total_seconds()
+
+@pytest.mark.parametrize('units,expected',[
+    (EPOCH_UNITS,(1.,0.)),
+    (TAI93_UNITS,(1.,epoch(1993,1,1))),
+    ('seconds since 1993-01-01 00:00:00.000',(1.,epoch(1993,1,1))),
+    ('hours since 2013-09-15T00:00:00Z',(3600.,epoch(2013,9,15))),
+    ('hours since 2013-09-1500:00:00',(3600.,epoch(2013,9,15))),
+    ('minutes since 2020-01-18 12:30:00 UTC',(60.,epoch(2020,1,18,12,30))),
+    ('days since 2019-12-31',(86400.,epoch(2019,12,31))),
+    ('Hour since 2014-05-12',(3600.,epoch(2014,5,12))),
+])
+def test_parse_units(units,expected):
+    assert parse_units(units)==expected
+
+@pytest.mark.parametrize('units',['seconds','fortnights since 2000-01-01','hours after 2000-01-01'])
+def test_parse_units_rejects(units):
+    with pytest.raises(ValueError):
+        parse_units(units)
+
+def test_to_seconds():
+    assert to_seconds(0,TAI93_UNITS)==epoch(1993,1,1)
+    np.testing.assert_array_equal(to_seconds([0,1.5,24],hours_units('2014-05-12')),
+                                  [epoch(2014,5,12),epoch(2014,5,12,1,30),epoch(2014,5,13)])
+    assert to_seconds(1.0,julian_day_units(2020))==epoch(2020,1,1) #<--day 1.0 is January 1 00:00
+    assert to_seconds(np.float32(2.5),'minutes since 1970-01-01').dtype==np.float64
+
+def test_to_datetime64():
+    t = to_datetime64([0.,0.5e-6,1.25],'seconds since 2020-01-18T12:00:00')
+    assert t.dtype==np.dtype('datetime64[us]')
+    assert t.astype(datetime).tolist()==[datetime(2020,1,18,12),datetime(2020,1,18,12),
+                                         datetime(2020,1,18,12,0,1,250000)]
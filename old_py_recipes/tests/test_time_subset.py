@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+#Tests of the binary-search time subsetting of CRS_Recipe_Functions.py
+
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import h5py
+import pytest
+
+from conftest import write_impacts
+from CRS_Recipe_Functions import CRSsubset_impacts, time_index_range, totime_impacts
+
+T0 = datetime(1970,1,1)
+START = (datetime(2020,1,18,12)-T0).total_seconds()
+
+@pytest.fixture
+def granule(tmp_path):
+    """IMPACTS granule of 600 rays every 0.25 s from 12:00:00, with some repeated times"""
+    times = START+np.arange(600)*0.25
+    times[300:303] = times[300] #<--rays sharing a time stamp
+    path,ref,dop = write_impacts(os.path.join(tmp_path,'IMPACTS_CRS_L1B_RevA_20200118T120000_to_20200118T120229.h5'),times)
+    with h5py.File(path,'r') as ds:
+        yield ds
+
+def datetime_filter(ds,t1,d1,t2,d2):
+    """The subset of the datetime-list filter CRSsubset_impacts used to return"""
+    start,end = totime_impacts(t1,d1),totime_impacts(t2,d2)
+    time_utc = [T0+timedelta(seconds=float(s)) for s in ds['Time']['Data']['TimeUTC']]
+    return [t for t in time_utc if t>=start and t<=end]
+
+@pytest.mark.parametrize('t1,t2,expected',[
+    ('12:00:30','12:01:00',(120,241)), #<--inside the flight, both ends on a ray
+    ('11:00:00','11:59:59',(0,0)),     #<--before the first ray
+    ('11:00:00','12:00:00',(0,1)),     #<--ending on the first ray
+    ('12:03:00','13:00:00',(600,600)), #<--after the last ray
+    ('12:02:29','13:00:00',(596,600)),
+    ('12:01:15','12:01:15',(300,303)), #<--the rays sharing a time
+    ('12:00:10','12:00:05',(40,40)),   #<--end before start: empty
+])
+def test_index_range(granule,t1,t2,expected):
+    i0,i1 = CRSsubset_impacts(granule,T0,t1,'2020-01-18',t2,'2020-01-18')
+    assert (i0,i1)==expected
+    time_utc = [T0+timedelta(seconds=float(s)) for s in granule['Time']['Data']['TimeUTC'][i0:i1]]
+    assert time_utc==datetime_filter(granule,t1,'2020-01-18',t2,'2020-01-18')
+
+def test_window_across_dates(granule):
+    assert CRSsubset_impacts(granule,T0,'23:00:00','2020-01-17','00:00:00','2020-01-19')==(0,600)
+
+def test_time_index_range_seconds_and_datetimes():
+    time = START+np.arange(10.)
+    assert time_index_range(time,START+2.5,START+6)==(3,7)
+    assert time_index_range(time,datetime(2020,1,18,12,0,2,500000),datetime(2020,1,18,12,0,6))==(3,7)
+    assert time_index_range(time,START+6,START+2)==(6,6)
+    assert time_index_range(np.empty(0),START,START+1)==(0,0)